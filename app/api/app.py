@@ -1,21 +1,39 @@
 from __future__ import annotations
 
+import asyncio
 import logging
+import time
 from contextlib import asynccontextmanager
+from datetime import date
 from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
-
-
-class UTF8JSONResponse(JSONResponse):
-    # Ensure PowerShell and other clients correctly decode the JSON as UTF-8
-    media_type = "application/json; charset=utf-8"
-
 from fastapi.exceptions import RequestValidationError
 
+from app.api.dependencies import portal_unavailable
+from app.api.responses import UTF8JSONResponse
 from app.core.config import get_settings
 from app.core.exceptions import ErrorCodes, unhandled_exception_handler, validation_exception_handler
+from app.infrastructure.chromedriver import start_driver_service, stop_driver_service
 from app.infrastructure.logging_config import configure_logging
+from app.infrastructure.metrics import HTTP_REQUEST_DURATION
+from app.infrastructure.rate_limit import start_rate_limit_scope
+from app.infrastructure.request_context import REQUEST_ID_HEADER, bind_request_id
+from app.infrastructure.timing import start_timer
+from app.infrastructure.tracing import (
+    TRACE_ID_HEADER,
+    configure_tracing,
+    finish_span,
+    shutdown_tracing,
+    start_trace,
+    traceparent_for,
+)
+from app.infrastructure.webdriver_profiler import start_profile, store_profile
+from app.infrastructure.webhooks import shutdown_webhooks
+from app.smartmedical.circuit_breaker import PortalUnavailable
+from app.smartmedical.refresh import schedule_refresh
+from app.smartmedical.session_pool import get_session_pool, start_keepalive, stop_keepalive
+from app.smartmedical.slot_index import get_slot_index
+from app.smartmedical.snapshot_store import get_snapshot_store, load_latest_into
 
 logger = logging.getLogger(__name__)
 
@@ -23,8 +41,52 @@ logger = logging.getLogger(__name__)
 async def lifespan(app: FastAPI):
     configure_logging()
     s = get_settings()
+    configure_tracing(s)
     logger.info("Service starting", extra={"bind": f"{s.bind_host}:{s.port}", "log_json": s.log_json})
+    if not s.selenium_remote_url:
+        # Resolve ChromeDriver and start its service once, off the event loop
+        try:
+            await asyncio.to_thread(start_driver_service, s)
+        except Exception:
+            logger.warning("ChromeDriver service not started; will retry on first browser use", exc_info=True)
+    if get_snapshot_store() is not None:
+        # Restore the last persisted snapshot and refresh it behind. /timetable answers from it
+        # (marked stale) only while it is within TIMETABLE_MAX_STALE, or while the portal is down.
+        try:
+            index = get_slot_index()
+            loaded = await asyncio.to_thread(load_latest_into, index, date.today().isoformat())
+            logger.info("Timetable snapshot loaded", extra={"slots": loaded})
+            if loaded:
+                if not index.is_fresh(max(s.timetable_cache_ttl, s.timetable_max_stale)):
+                    logger.warning(
+                        "Timetable snapshot is older than TIMETABLE_MAX_STALE; it is only served while the portal is down",
+                        extra={"age_seconds": round(index.age() or 0.0), "max_stale": s.timetable_max_stale},
+                    )
+                schedule_refresh()
+        except Exception:
+            logger.warning("Timetable snapshot load failed", exc_info=True)
+    prewarm = None
+    if s.prewarm_on_startup and s.smartmedical_username and s.smartmedical_password:
+        # In the background: /health/ready reports not ready until it is done
+        prewarm = asyncio.create_task(_prewarm())
+    if s.smartmedical_username and s.smartmedical_password:
+        start_keepalive()
     yield
+    if prewarm is not None:
+        prewarm.cancel()
+    await asyncio.to_thread(stop_keepalive)
+    await asyncio.to_thread(get_session_pool().close)
+    stop_driver_service()
+    shutdown_webhooks()
+    shutdown_tracing()
+
+
+async def _prewarm() -> None:
+    try:
+        await asyncio.to_thread(get_session_pool().prewarm)
+        logger.info("Portal pre-warm finished", extra={"idle_sessions": get_session_pool().idle_count()})
+    except Exception:
+        logger.warning("Portal pre-warm failed", exc_info=True)
 
 app = FastAPI(title="SmartMedical Automation Service", version="0.1.0", lifespan=lifespan, default_response_class=UTF8JSONResponse)
 
@@ -37,6 +99,7 @@ app.add_middleware(
     allow_credentials=False,
     allow_methods=["GET", "POST", "OPTIONS"],
     allow_headers=["*"],
+    expose_headers=["X-RateLimit-Limit", "X-RateLimit-Remaining", "X-RateLimit-Reset", "Retry-After"],
 )
 
 # Exception handlers
@@ -48,7 +111,13 @@ app.add_exception_handler(RequestValidationError, validation_exception_handler)
 @app.exception_handler(HTTPException)
 async def http_exception_to_json(request: Request, exc: HTTPException):
     content = {"error": exc.detail if isinstance(exc.detail, str) else ErrorCodes.INTERNAL_ERROR}
-    return UTF8JSONResponse(status_code=exc.status_code, content=content)
+    return UTF8JSONResponse(status_code=exc.status_code, content=content, headers=exc.headers)
+
+
+# An open portal circuit breaker hit mid-flow: same 503 as the routes' up-front check
+@app.exception_handler(PortalUnavailable)
+async def portal_unavailable_to_json(request: Request, exc: PortalUnavailable):
+    return await http_exception_to_json(request, portal_unavailable(exc.retry_after))
 
 
 # Security headers middleware
@@ -61,11 +130,80 @@ async def add_security_headers(request: Request, call_next):
     return response
 
 
+# Request observability: request id, trace root span, latency histogram, Server-Timing
+# header, optional WebDriver profile and one structured log line per portal-backed request
+@app.middleware("http")
+async def observe_request(request: Request, call_next):
+    s = get_settings()
+    request_id = bind_request_id(request.headers.get(REQUEST_ID_HEADER))
+    root = start_trace(
+        f"{request.method} {request.url.path}",
+        traceparent=request.headers.get("traceparent"),
+        trace_id=request.headers.get(TRACE_ID_HEADER),
+        request_id=request_id,
+    )
+    timer = start_timer()
+    rate_limit = start_rate_limit_scope()
+    profile = start_profile(request_id) if s.webdriver_profile else None
+    start = time.perf_counter()
+    try:
+        response = await call_next(request)
+    except BaseException as e:
+        finish_span(root, e)
+        raise
+    elapsed = time.perf_counter() - start
+    total_ms = elapsed * 1000.0
+
+    route = request.scope.get("route")
+    route_path = getattr(route, "path", "unmatched")
+    HTTP_REQUEST_DURATION.observe(
+        elapsed,
+        route=route_path,
+        method=request.method,
+        status=str(response.status_code),
+    )
+    response.headers[REQUEST_ID_HEADER] = request_id
+    if rate_limit.decision is not None:
+        response.headers.update(rate_limit.decision.headers())
+    if root is not None:
+        root.name = f"{request.method} {route_path}"
+        root.attributes["http.status_code"] = response.status_code
+        finish_span(root)
+        response.headers[TRACE_ID_HEADER] = root.trace_id
+        response.headers["traceparent"] = traceparent_for(root)
+    if profile is not None and profile.total_commands:
+        store_profile(profile)
+        response.headers["X-WebDriver-Profile"] = profile.header_value()
+    if timer.phases():
+        if s.server_timing_enabled:
+            response.headers["Server-Timing"] = timer.server_timing(total_ms)
+        logger.info(
+            "Request timing",
+            extra={
+                "route": request.url.path,
+                "status": response.status_code,
+                "duration_ms": round(total_ms, 1),
+                "phases": timer.as_dict(),
+            },
+        )
+    return response
+
+
 # Routers
 from app.api.routes.health import router as health_router  # noqa: E402
 from app.api.routes.timetable import router as timetable_router  # noqa: E402
+from app.api.routes.stream import router as stream_router  # noqa: E402
 from app.api.routes.booking import router as booking_router  # noqa: E402
+from app.api.routes.watches import router as watches_router  # noqa: E402
+from app.api.routes.waitlist import router as waitlist_router  # noqa: E402
+from app.api.routes.metrics import router as metrics_router  # noqa: E402
+from app.api.routes.debug import router as debug_router  # noqa: E402
 
 app.include_router(health_router)
 app.include_router(timetable_router)
+app.include_router(stream_router)
 app.include_router(booking_router)
+app.include_router(watches_router)
+app.include_router(waitlist_router)
+app.include_router(metrics_router)
+app.include_router(debug_router)
@@ -1,10 +1,53 @@
 from __future__ import annotations
 
+import math
+from typing import Optional
+
+from fastapi import HTTPException, Query
+from starlette import status
+
+from app.core.exceptions import ErrorCodes
+
 # Thin dependency layer to allow future expansion (DB/session, etc.)
-from app.infrastructure.security import API_KEY_HEADER, get_api_key, principal_id  # re-export for routers
+from app.infrastructure.security import API_KEY_HEADER, Tenant, get_tenant, principal_id  # re-export for routers
+from app.smartmedical.calendars import get_calendars
+from app.smartmedical.circuit_breaker import open_phases
+
+
+def check_calendar(calendar: Optional[str]) -> Optional[str]:
+    """Reject calendar keys that are not configured (422)."""
+    if calendar is not None and calendar not in get_calendars():
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=f"Unknown calendar: {calendar}")
+    return calendar
+
+
+def calendar_query(calendar: Optional[str] = Query(default=None, description="Calendar key (CALENDARS); all calendars when omitted")) -> Optional[str]:
+    return check_calendar(calendar)
+
+
+
+def portal_unavailable(retry_after: float) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail=ErrorCodes.PORTAL_UNAVAILABLE,
+        headers={"Retry-After": str(math.ceil(retry_after))},
+    )
+
+
+def ensure_portal_available(*phases: str) -> None:
+    """Fail fast (503) while a circuit breaker of the portal phases a flow needs is open."""
+    down = open_phases(phases)
+    if down:
+        raise portal_unavailable(max(down.values()))
+
 
 __all__ = [
     "API_KEY_HEADER",
-    "get_api_key",
+    "Tenant",
+    "calendar_query",
+    "check_calendar",
+    "ensure_portal_available",
+    "get_tenant",
+    "portal_unavailable",
     "principal_id",
 ]
@@ -0,0 +1,56 @@
+from __future__ import annotations
+
+import json
+from typing import Any, Dict, Iterable, List
+
+from fastapi.responses import JSONResponse
+
+from app.smartmedical.slots import Slot, _to_hhmm
+
+try:  # Optional fast serializer
+    import orjson
+except ImportError:  # pragma: no cover - depends on environment
+    orjson = None
+
+
+class UTF8JSONResponse(JSONResponse):
+    # Ensure PowerShell and other clients correctly decode the JSON as UTF-8
+    media_type = "application/json; charset=utf-8"
+
+
+class FastJSONResponse(UTF8JSONResponse):
+    """UTF-8 JSON response that skips model validation and uses orjson when installed.
+
+    Falls back to compact stdlib json, so the charset contract is the same either way.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def dumps(content: Any) -> bytes:
+    """Compact UTF-8 JSON (orjson when installed)."""
+    if orjson is not None:
+        return orjson.dumps(content)
+    return json.dumps(content, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def slots_to_rows(slots: Iterable[Slot]) -> List[Dict[str, Any]]:
+    """Row format: one object per slot (the TimetableResponse.slots shape)."""
+    return [s.to_dict() for s in slots]
+
+
+def slots_to_columns(slots: Iterable[Slot]) -> Dict[str, List[Any]]:
+    """Columnar format: parallel arrays, one entry per slot."""
+    cols: Dict[str, List[Any]] = {"date": [], "start": [], "end": [], "doctor": [], "interval": [], "calendar": []}
+    date_, start, end, doctor, interval, calendar = (
+        cols[k] for k in ("date", "start", "end", "doctor", "interval", "calendar")
+    )
+    for s in slots:
+        date_.append(s.date)
+        start.append(_to_hhmm(s.start))
+        end.append(_to_hhmm(s.end))
+        doctor.append(s.doctor)
+        interval.append(str(s.interval) if s.interval is not None else None)
+        calendar.append(s.calendar)
+    return cols
@@ -8,8 +8,12 @@ from starlette import status
 from app.core.config import get_settings
 from app.core.exceptions import ErrorCodes
 from app.core.schemas import BookingRequest, BookingResponse, ErrorResponse
-from app.api.dependencies import principal_id
+from app.api.dependencies import check_calendar, ensure_portal_available, portal_unavailable, principal_id
+from app.infrastructure.portal_jobs import run_portal_job
 from app.infrastructure.rate_limit import enforce_rate_limit
+from app.smartmedical.booking_locks import SlotBusy, booking_interval, get_booking_locks
+from app.smartmedical.calendars import resolve_calendar
+from app.smartmedical.circuit_breaker import PHASES, PortalUnavailable
 from app.smartmedical.create_booking import create_booking as sm_create_booking
 
 logger = logging.getLogger(__name__)
@@ -22,40 +26,62 @@ router = APIRouter()
     response_model=BookingResponse,
     responses={
         401: {"model": ErrorResponse},
+        409: {"model": ErrorResponse},
         429: {"model": ErrorResponse},
         501: {"model": ErrorResponse},
         500: {"model": ErrorResponse},
+        503: {"model": ErrorResponse},
     },
 )
 async def book(
     payload: BookingRequest,
     pid: str = Depends(principal_id),
 ):
-    enforce_rate_limit(pid)
+    check_calendar(payload.calendar)
+    await enforce_rate_limit(pid, "booking")
     s = get_settings()
 
     # Enforce credentials presence
     if not (s.smartmedical_username and s.smartmedical_password):
         raise HTTPException(status_code=status.HTTP_501_NOT_IMPLEMENTED, detail="SmartMedical credentials are not provided (username/password).")
 
+    # Portal known to be failing: no point holding the slot or a worker
+    ensure_portal_available(*PHASES)
+
+    # One booking per slot at a time: an overlapping one is rejected before any browser work
+    calendar = resolve_calendar(payload.calendar).key
+    try:
+        start, end = booking_interval(calendar, payload.date, payload.time)
+        lease = get_booking_locks().acquire(calendar, payload.date, start, end)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(e))
+    except SlotBusy as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
+
     try:
         async with asyncio.timeout(s.request_timeout):
-            result = await asyncio.to_thread(
-                sm_create_booking,
+            result = await run_portal_job(
+                lease.guard(sm_create_booking),
                 date=payload.date,
                 time=payload.time,
                 first_name=payload.first_name,
                 last_name=payload.last_name,
                 phone=payload.phone,
                 notes=payload.notes,
+                calendar=payload.calendar,
             )
             return BookingResponse(**result)
     except asyncio.TimeoutError:
         logger.exception("Booking request timeout", extra={"route": "/book", "principal": pid})
         raise HTTPException(status_code=status.HTTP_504_GATEWAY_TIMEOUT, detail=ErrorCodes.TIMEOUT)
+    except PortalUnavailable as e:
+        logger.warning("Booking rejected by portal circuit breaker", extra={"route": "/book", "principal": pid, "phase": e.phase})
+        raise portal_unavailable(e.retry_after)
     except HTTPException:
         logger.exception("Booking failed due to HTTP error", extra={"route": "/book", "principal": pid})
         raise
     except Exception as e:
         logger.exception(f"Booking failed due to unexpected error {e}", extra={"route": "/book", "principal": pid})
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=ErrorCodes.INTERNAL_ERROR)
+    finally:
+        lease.release()
@@ -0,0 +1,35 @@
+from __future__ import annotations
+
+from fastapi import APIRouter, Depends, HTTPException
+from starlette import status
+
+from app.core.config import get_settings
+from app.core.schemas import ErrorResponse
+from app.api.dependencies import principal_id
+from app.infrastructure.webdriver_profiler import get_profile
+from app.smartmedical.waits import get_latency_tracker
+
+router = APIRouter()
+
+
+@router.get(
+    "/debug/profile/{request_id}",
+    responses={
+        401: {"model": ErrorResponse},
+        404: {"model": ErrorResponse},
+    },
+)
+async def get_webdriver_profile(request_id: str, pid: str = Depends(principal_id)) -> dict:
+    """WebDriver command counts/time for a recent request of the caller (needs WEBDRIVER_PROFILE=true)."""
+    if not get_settings().webdriver_profile:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="WebDriver profiling is disabled.")
+    profile = get_profile(request_id, pid)
+    if profile is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="No profile for this request id.")
+    return profile.summary()
+
+
+@router.get("/debug/wait-timeouts", responses={401: {"model": ErrorResponse}})
+async def get_wait_timeouts(pid: str = Depends(principal_id)) -> dict:
+    """Current adaptive timeout and sample count per WebDriver wait point."""
+    return {"enabled": get_settings().adaptive_timeouts_enabled, "points": get_latency_tracker().snapshot()}
@@ -1,10 +1,56 @@
 from __future__ import annotations
 
+import asyncio
+
 from fastapi import APIRouter
+from starlette import status
+
+from app.api.responses import UTF8JSONResponse
+from app.core.config import get_settings
+from app.infrastructure.selenium_client import driver_endpoint_ready
+from app.smartmedical.circuit_breaker import breaker_states
+from app.smartmedical.session_pool import get_session_pool
+from app.smartmedical.slot_index import get_slot_index
 
 router = APIRouter()
 
 
 @router.get("/health")
 async def health() -> dict:
+    """Liveness: the process is up and serving."""
     return {"status": "ok"}
+
+
+@router.get("/health/ready")
+async def ready() -> UTF8JSONResponse:
+    """Readiness: this instance can answer portal requests quickly.
+
+    Requires a reachable WebDriver endpoint and a logged-in session (pooled,
+    or a successful last login; while pre-warming is pending, not ready).
+    Without portal credentials there is no session to check: it is reported as
+    not applicable and readiness rests on the driver alone.
+    """
+    s = get_settings()
+    pool = get_session_pool()
+    driver_ok = await asyncio.to_thread(driver_endpoint_ready, s)
+    if not (s.smartmedical_username and s.smartmedical_password):
+        session_ok = None
+    elif pool.has_session() or pool.last_login_ok:
+        session_ok = True
+    else:
+        # No login attempted yet counts only when we are not waiting for pre-warming
+        session_ok = pool.last_login_ok is None and not s.prewarm_on_startup
+    age = get_slot_index().age()
+    is_ready = driver_ok and session_ok is not False
+    body = {
+        "status": "ready" if is_ready else "not_ready",
+        "checks": {
+            "driver": driver_ok,
+            "session": "not_applicable" if session_ok is None else session_ok,
+            "idle_sessions": pool.idle_count(),
+            "last_scrape_age_s": round(age, 1) if age is not None else None,
+            # Portal circuit breakers per phase (informational: an outage is not this instance's)
+            "portal_circuits": breaker_states(),
+        },
+    }
+    return UTF8JSONResponse(body, status_code=status.HTTP_200_OK if is_ready else status.HTTP_503_SERVICE_UNAVAILABLE)
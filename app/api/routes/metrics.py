@@ -0,0 +1,38 @@
+from __future__ import annotations
+
+import hmac
+from typing import Optional
+
+from fastapi import APIRouter, Header, HTTPException
+from fastapi.responses import PlainTextResponse
+from starlette import status
+
+from app.core.config import get_settings
+from app.infrastructure.metrics import REGISTRY
+from app.infrastructure.security import API_KEY_HEADER, get_key_registry
+
+router = APIRouter()
+
+PROMETHEUS_MEDIA_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _authorized(authorization: Optional[str], api_key: Optional[str]) -> bool:
+    """A scraper presents `Authorization: Bearer <METRICS_TOKEN>`; API clients their API key."""
+    token = get_settings().metrics_token
+    if token and authorization:
+        scheme, _, presented = authorization.partition(" ")
+        if scheme.lower() == "bearer" and hmac.compare_digest(presented.strip().encode("utf-8"), token.encode("utf-8")):
+            return True
+    return get_key_registry().lookup(api_key) is not None
+
+
+@router.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+async def metrics(
+    authorization: Optional[str] = Header(default=None),
+    x_api_key: Optional[str] = Header(default=None, alias=API_KEY_HEADER),
+) -> PlainTextResponse:
+    if not get_settings().metrics_enabled:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+    if not _authorized(authorization, x_api_key):
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Unauthorized")
+    return PlainTextResponse(REGISTRY.render(), media_type=PROMETHEUS_MEDIA_TYPE)
@@ -0,0 +1,104 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+from starlette import status
+
+from app.api.dependencies import principal_id
+from app.api.responses import dumps, slots_to_rows
+from app.core.config import get_settings
+from app.infrastructure.rate_limit import enforce_rate_limit
+from app.smartmedical.refresh import schedule_refresh
+from app.smartmedical.slot_stream import SlotStream, Subscriber, delta_payload, get_slot_stream
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+
+def _sse(event: str, data: Dict[str, Any], event_id: Optional[int] = None) -> bytes:
+    head = f"id: {event_id}\n" if event_id is not None else ""
+    return f"{head}event: {event}\n".encode("utf-8") + b"data: " + dumps(data) + b"\n\n"
+
+
+def _snapshot(stream: SlotStream, doctor: Optional[str], ttl: int) -> bytes:
+    index = stream.index
+    version = index.version
+    body = {
+        "version": version,
+        "stale": not index.is_fresh(ttl),
+        "slots": slots_to_rows(index.query(doctor=doctor)),
+    }
+    return _sse("snapshot", body, version)
+
+
+async def sse_events(
+    stream: SlotStream,
+    sub: Subscriber,
+    *,
+    doctor: Optional[str],
+    heartbeat: float,
+    ttl: int,
+    is_disconnected: Callable[[], Awaitable[bool]],
+) -> AsyncIterator[bytes]:
+    """Snapshot, then deltas as the index changes; heartbeat comments while idle.
+
+    While clients are connected an out-of-date index is refreshed in the
+    background, so one scrape feeds every viewer.
+    """
+    try:
+        if not stream.index.is_fresh(ttl):
+            schedule_refresh()
+        yield _snapshot(stream, doctor, ttl)
+        while not await is_disconnected():
+            try:
+                delta = await asyncio.wait_for(sub.queue.get(), timeout=heartbeat)
+            except asyncio.TimeoutError:
+                if not stream.index.is_fresh(ttl):
+                    schedule_refresh()
+                yield b": heartbeat\n\n"
+                continue
+            if delta is None:
+                # Fell behind; start over from the current state
+                yield _snapshot(stream, doctor, ttl)
+            else:
+                yield _sse("delta", delta_payload(delta), delta[2])
+    finally:
+        stream.unsubscribe(sub)
+
+
+@router.get("/timetable/stream")
+async def timetable_stream(
+    request: Request,
+    doctor: Optional[str] = Query(default=None),
+    pid: str = Depends(principal_id),
+):
+    """Server-Sent Events: `snapshot` on connect, then `delta` events (slots opened/taken)."""
+    await enforce_rate_limit(pid, "cached_read")
+    s = get_settings()
+    stream = get_slot_stream()
+    # Each open stream holds a queue and a connection; one tenant cannot hold them all
+    if stream.subscriber_count(pid) >= s.stream_max_per_tenant:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many open streams",
+            headers={"Retry-After": "5"},
+        )
+    sub = stream.subscribe(maxsize=s.stream_queue_size, doctor=doctor, owner=pid)
+    events = sse_events(
+        stream,
+        sub,
+        doctor=doctor,
+        heartbeat=s.stream_heartbeat_seconds,
+        ttl=s.timetable_cache_ttl,
+        is_disconnected=request.is_disconnected,
+    )
+    return StreamingResponse(
+        events,
+        media_type="text/event-stream; charset=utf-8",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
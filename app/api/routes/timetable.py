@@ -1,50 +1,221 @@
 from __future__ import annotations
 
 import asyncio
+import hashlib
 import logging
+from typing import Literal, Optional, Union
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, Response
 from starlette import status
 
 from app.core.config import get_settings
 from app.core.exceptions import ErrorCodes
-from app.core.schemas import TimetableResponse, ErrorResponse
-from app.api.dependencies import principal_id
+from app.core.schemas import (
+    DATE_PATTERN,
+    TIME_PATTERN,
+    ColumnarTimetableResponse,
+    ErrorResponse,
+    NextAvailableResponse,
+    TimetableResponse,
+    UtilizationResponse,
+)
+from app.api.dependencies import calendar_query, ensure_portal_available, portal_unavailable, principal_id
+from app.api.responses import FastJSONResponse, slots_to_columns, slots_to_rows
+from app.infrastructure.portal_jobs import run_portal_job
 from app.infrastructure.rate_limit import enforce_rate_limit
-from app.smartmedical.scrape_timetable import fetch_timetable
+from app.smartmedical.calendars import get_calendars
+from app.smartmedical.circuit_breaker import PortalUnavailable, open_phases
+from app.smartmedical.refresh import schedule_refresh
+from app.smartmedical.scrape_timetable import fetch_timetable, find_next_available
+from app.smartmedical.slot_index import get_slot_index
+from app.smartmedical.snapshot_store import get_snapshot_store
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
+# Portal phases a scrape goes through (circuit breakers checked before queuing one)
+PORTAL_SCRAPE_PHASES = ("login", "navigation", "scrape")
+
+
+def _etag(digest: str, query: str) -> str:
+    """Weak validator for one filtered view of the index."""
+    h = hashlib.blake2b(f"{digest}?{query}".encode("utf-8"), digest_size=8)
+    return f'W/"{h.hexdigest()}"'
+
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = {c.strip() for c in if_none_match.split(",")}
+    return "*" in candidates or etag in candidates or etag[2:] in candidates
+
 
 @router.get(
     "/timetable",
-    response_model=TimetableResponse,
+    # Rows by default, columns with format=columnar
+    response_model=Union[TimetableResponse, ColumnarTimetableResponse],
     responses={
         401: {"model": ErrorResponse},
         429: {"model": ErrorResponse},
         501: {"model": ErrorResponse},
         500: {"model": ErrorResponse},
+        503: {"model": ErrorResponse},
     },
 )
 async def get_timetable(
+    request: Request,
+    doctor: Optional[str] = Query(default=None),
+    date_from: Optional[str] = Query(default=None, alias="from", pattern=DATE_PATTERN),
+    date_to: Optional[str] = Query(default=None, alias="to", pattern=DATE_PATTERN),
+    after_time: Optional[str] = Query(default=None, pattern=TIME_PATTERN),
+    before_time: Optional[str] = Query(default=None, pattern=TIME_PATTERN),
+    format: Literal["rows", "columnar"] = Query(default="rows"),
+    calendar: Optional[str] = Depends(calendar_query),
+    if_none_match: Optional[str] = Header(default=None, alias="If-None-Match"),
     pid: str = Depends(principal_id)
 ):
-    enforce_rate_limit(pid)
     s = get_settings()
+    index = get_slot_index()
+    query = request.url.query
+
+    # Charge what the request will actually cost: a revalidation, an index read or a scrape
+    fresh = index.is_fresh(s.timetable_cache_ttl)
+    # Past the TTL (e.g. a snapshot loaded at startup): answer now, marked stale, and refresh behind
+    stale = not fresh and index.is_fresh(s.timetable_max_stale)
+    if stale:
+        schedule_refresh()
+    elif not fresh:
+        # Portal down (circuit open): the last snapshot of any age, marked stale, else a fast 503
+        down = open_phases(PORTAL_SCRAPE_PHASES)
+        if down:
+            if index.age() is None:
+                raise portal_unavailable(max(down.values()))
+            stale = True
+    if fresh or stale:
+        etag = _etag(index.digest() or "", query)
+        if _etag_matches(if_none_match, etag):
+            await enforce_rate_limit(pid, "not_modified")
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag, "Cache-Control": "no-cache"})
+        await enforce_rate_limit(pid, "cached_read")
+    else:
+        await enforce_rate_limit(pid, "scrape")
 
     try:
         async with asyncio.timeout(s.request_timeout):
-            # Enforce credentials presence
-            if not (s.smartmedical_username and s.smartmedical_password):
-                raise HTTPException(status_code=status.HTTP_501_NOT_IMPLEMENTED, detail="SmartMedical credentials are not provided (username/password).")
+            # Serve from the slot index while the last scrape is fresh (or stale but usable)
+            if not (fresh or stale):
+                # Enforce credentials presence
+                if not (s.smartmedical_username and s.smartmedical_password):
+                    raise HTTPException(status_code=status.HTTP_501_NOT_IMPLEMENTED, detail="SmartMedical credentials are not provided (username/password).")
 
-            # Scrape timetable via scraping module (run in a thread to avoid blocking loop)
-            resp = await asyncio.to_thread(
-                fetch_timetable
+                # Scrape all calendars into one snapshot (run in a thread to avoid blocking loop)
+                try:
+                    resp = await run_portal_job(
+                        fetch_timetable
+                    )
+                    index.replace(resp["slots"])
+                except PortalUnavailable:
+                    # A breaker opened meanwhile: fall back to the last snapshot if there is one
+                    if index.age() is None:
+                        raise
+                    stale = True
+
+            slots = index.query(
+                doctor=doctor,
+                date_from=date_from,
+                date_to=date_to,
+                after_time=after_time,
+                before_time=before_time,
+                calendar=calendar,
             )
-            return TimetableResponse(**resp)
+            # Slots are already typed; serialize directly instead of re-validating
+            body = {"doctor": doctor, "date": None, "source": "smartmedical", "stale": stale}
+            if format == "columnar":
+                body["format"] = "columnar"
+                body["columns"] = slots_to_columns(slots)
+            else:
+                body["slots"] = slots_to_rows(slots)
+            headers = {"ETag": _etag(index.digest() or "", query), "Cache-Control": "no-cache"}
+            age = index.age()
+            if age is not None:
+                headers["Age"] = str(int(age))
+            return FastJSONResponse(body, headers=headers)
     except asyncio.TimeoutError:
         logger.warning("Timetable request timeout", extra={"route": "/timetable", "principal": pid})
         raise HTTPException(status_code=status.HTTP_504_GATEWAY_TIMEOUT, detail=ErrorCodes.TIMEOUT)
+
+
+@router.get(
+    "/timetable/next-available",
+    response_model=NextAvailableResponse,
+    responses={
+        401: {"model": ErrorResponse},
+        429: {"model": ErrorResponse},
+        501: {"model": ErrorResponse},
+        500: {"model": ErrorResponse},
+        503: {"model": ErrorResponse},
+    },
+)
+async def get_next_available(
+    doctor: Optional[str] = Query(default=None),
+    min_duration: int = Query(default=0, ge=0, le=24 * 60),
+    calendar: Optional[str] = Depends(calendar_query),
+    pid: str = Depends(principal_id)
+):
+    s = get_settings()
+    index = get_slot_index()
+
+    # A fresh index answers without touching the portal
+    if index.is_fresh(s.timetable_cache_ttl):
+        await enforce_rate_limit(pid, "cached_read")
+        slot = index.earliest(doctor, min_duration, calendar)
+        return NextAvailableResponse(slot=slot.to_dict() if slot else None)
+
+    await enforce_rate_limit(pid, "scrape")
+    ensure_portal_available(*PORTAL_SCRAPE_PHASES)
+
+    try:
+        async with asyncio.timeout(s.request_timeout):
+            if not (s.smartmedical_username and s.smartmedical_password):
+                raise HTTPException(status_code=status.HTTP_501_NOT_IMPLEMENTED, detail="SmartMedical credentials are not provided (username/password).")
+
+            if calendar is None and len(get_calendars()) > 1:
+                # Earliest across calendars: scrape them all (concurrently) into the index
+                resp = await run_portal_job(fetch_timetable)
+                index.replace(resp["slots"])
+                slot = index.earliest(doctor, min_duration)
+            else:
+                # Scrape week by week and stop at the first match
+                slot = await run_portal_job(
+                    find_next_available, doctor, min_duration, calendar=calendar
+                )
+            return NextAvailableResponse(slot=slot.to_dict() if slot else None)
+    except asyncio.TimeoutError:
+        logger.warning("Next-available request timeout", extra={"route": "/timetable/next-available", "principal": pid})
+        raise HTTPException(status_code=status.HTTP_504_GATEWAY_TIMEOUT, detail=ErrorCodes.TIMEOUT)
+
+
+@router.get(
+    "/timetable/utilization",
+    response_model=UtilizationResponse,
+    responses={
+        401: {"model": ErrorResponse},
+        429: {"model": ErrorResponse},
+        501: {"model": ErrorResponse},
+    },
+)
+async def get_utilization(
+    doctor: Optional[str] = Query(default=None),
+    date_from: Optional[str] = Query(default=None, alias="from", pattern=DATE_PATTERN),
+    date_to: Optional[str] = Query(default=None, alias="to", pattern=DATE_PATTERN),
+    as_of: Optional[float] = Query(default=None, description="Unix time; use the latest scrape at or before it"),
+    pid: str = Depends(principal_id)
+):
+    """Booked vs. bookable minutes per day and doctor, from stored snapshots (never scrapes)."""
+    store = get_snapshot_store()
+    if store is None:
+        raise HTTPException(status_code=status.HTTP_501_NOT_IMPLEMENTED, detail="Snapshot store is not configured (SNAPSHOT_DB_PATH).")
+    await enforce_rate_limit(pid, "cached_read")
+    days = await asyncio.to_thread(store.utilization, date_from, date_to, doctor, as_of)
+    return UtilizationResponse(days=days)
@@ -0,0 +1,72 @@
+from __future__ import annotations
+
+import logging
+from typing import List
+
+from fastapi import APIRouter, Depends, HTTPException, Response
+from starlette import status
+
+from app.core.config import get_settings
+from app.core.schemas import ErrorResponse, WaitlistRequest, WaitlistResponse
+from app.api.dependencies import principal_id
+from app.infrastructure.rate_limit import enforce_rate_limit
+from app.smartmedical.waitlist import get_waitlist
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+
+@router.post(
+    "/waitlist",
+    response_model=WaitlistResponse,
+    status_code=status.HTTP_201_CREATED,
+    responses={
+        401: {"model": ErrorResponse},
+        409: {"model": ErrorResponse},
+        429: {"model": ErrorResponse},
+        501: {"model": ErrorResponse},
+    },
+)
+async def add_to_waitlist(payload: WaitlistRequest, pid: str = Depends(principal_id)):
+    """Register a waitlist entry; it is booked automatically when a matching slot opens."""
+    await enforce_rate_limit(pid, "booking")
+    s = get_settings()
+    if not (s.smartmedical_username and s.smartmedical_password):
+        raise HTTPException(status_code=status.HTTP_501_NOT_IMPLEMENTED, detail="SmartMedical credentials are not provided (username/password).")
+    waitlist = get_waitlist()
+    if waitlist.count(pid) >= s.waitlist_max_per_tenant:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Waitlist limit reached")
+    entry = waitlist.add(pid, **payload.model_dump())
+    logger.info("Waitlist entry registered", extra={"waitlist_id": entry.id, "principal": pid, "priority": entry.priority})
+    return WaitlistResponse(**entry.to_dict())
+
+
+@router.get("/waitlist", response_model=List[WaitlistResponse], responses={401: {"model": ErrorResponse}})
+async def list_waitlist(pid: str = Depends(principal_id)):
+    await enforce_rate_limit(pid, "cached_read")
+    return [WaitlistResponse(**e.to_dict()) for e in get_waitlist().for_owner(pid)]
+
+
+@router.get("/waitlist/{entry_id}", response_model=WaitlistResponse, responses={401: {"model": ErrorResponse}, 404: {"model": ErrorResponse}})
+async def get_waitlist_entry(entry_id: str, pid: str = Depends(principal_id)):
+    await enforce_rate_limit(pid, "cached_read")
+    entry = get_waitlist().get(entry_id, pid)
+    if entry is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Waitlist entry not found")
+    return WaitlistResponse(**entry.to_dict())
+
+
+@router.delete(
+    "/waitlist/{entry_id}",
+    status_code=status.HTTP_204_NO_CONTENT,
+    responses={401: {"model": ErrorResponse}, 404: {"model": ErrorResponse}, 409: {"model": ErrorResponse}},
+)
+async def cancel_waitlist_entry(entry_id: str, pid: str = Depends(principal_id)):
+    await enforce_rate_limit(pid, "cached_read")
+    removed = get_waitlist().cancel(entry_id, pid)
+    if removed is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Waitlist entry not found")
+    if not removed:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Booking in progress")
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
@@ -0,0 +1,95 @@
+from __future__ import annotations
+
+import logging
+from typing import List, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from starlette import status
+
+from app.core.config import get_settings
+from app.core.schemas import ErrorResponse, WatchEventsResponse, WatchRequest, WatchResponse
+from app.api.dependencies import principal_id
+from app.infrastructure.rate_limit import enforce_rate_limit
+from app.infrastructure.webhooks import UnsafeWebhookTarget, check_callback_url
+from app.smartmedical.watches import Watch, get_watch_registry
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+
+def _owned(watch_id: str, pid: str) -> Watch:
+    watch = get_watch_registry().get(watch_id, pid)
+    if watch is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Watch not found")
+    return watch
+
+
+@router.post(
+    "/watches",
+    response_model=WatchResponse,
+    status_code=status.HTTP_201_CREATED,
+    responses={
+        401: {"model": ErrorResponse},
+        409: {"model": ErrorResponse},
+        422: {"model": ErrorResponse},
+        429: {"model": ErrorResponse},
+    },
+)
+async def create_watch(payload: WatchRequest, pid: str = Depends(principal_id)):
+    """Register a watch; matching free slots are POSTed to `callback_url` or queued for long-polling."""
+    await enforce_rate_limit(pid, "cached_read")
+    s = get_settings()
+    if payload.callback_url and not s.watch_webhook_allow_private:
+        try:
+            check_callback_url(payload.callback_url)
+        except UnsafeWebhookTarget as e:
+            raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(e))
+    registry = get_watch_registry()
+    if registry.count(pid) >= s.watch_max_per_tenant:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Watch limit reached")
+    if payload.callback_url:
+        urls = registry.callback_urls(pid)
+        if payload.callback_url not in urls and len(urls) >= s.watch_max_callback_urls_per_tenant:
+            raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Callback URL limit reached")
+    watch = registry.add(pid, **payload.model_dump())
+    logger.info("Watch registered", extra={"watch_id": watch.id, "principal": pid, "webhook": bool(watch.callback_url)})
+    return WatchResponse(**watch.to_dict())
+
+
+@router.get("/watches", response_model=List[WatchResponse], responses={401: {"model": ErrorResponse}})
+async def list_watches(pid: str = Depends(principal_id)):
+    await enforce_rate_limit(pid, "cached_read")
+    return [WatchResponse(**w.to_dict()) for w in get_watch_registry().for_owner(pid)]
+
+
+@router.get("/watches/{watch_id}", response_model=WatchResponse, responses={401: {"model": ErrorResponse}, 404: {"model": ErrorResponse}})
+async def get_watch(watch_id: str, pid: str = Depends(principal_id)):
+    await enforce_rate_limit(pid, "cached_read")
+    return WatchResponse(**_owned(watch_id, pid).to_dict())
+
+
+@router.delete("/watches/{watch_id}", status_code=status.HTTP_204_NO_CONTENT, responses={401: {"model": ErrorResponse}, 404: {"model": ErrorResponse}})
+async def delete_watch(watch_id: str, pid: str = Depends(principal_id)):
+    await enforce_rate_limit(pid, "cached_read")
+    if not get_watch_registry().remove(watch_id, pid):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Watch not found")
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
+
+
+@router.get(
+    "/watches/{watch_id}/events",
+    response_model=WatchEventsResponse,
+    responses={401: {"model": ErrorResponse}, 404: {"model": ErrorResponse}},
+)
+async def poll_watch(
+    watch_id: str,
+    timeout: Optional[float] = Query(default=None, ge=0),
+    pid: str = Depends(principal_id),
+):
+    """Long-poll: matches queued since the last call, waiting up to `timeout` seconds for one."""
+    await enforce_rate_limit(pid, "cached_read")
+    watch = _owned(watch_id, pid)
+    limit = get_settings().watch_poll_timeout
+    wait = limit if timeout is None else min(timeout, limit)
+    return WatchEventsResponse(events=await get_watch_registry().poll(watch, wait))
@@ -1,7 +1,7 @@
 from __future__ import annotations
 
 from functools import lru_cache
-from typing import List
+from typing import Any, Dict, List, Literal
 import os
 import json
 
@@ -12,12 +12,27 @@ from pydantic_settings import BaseSettings, SettingsConfigDict
 class Settings(BaseSettings):
     # Security
     api_key: str = Field(default="dev-api-key", alias="API_KEY")
+    # Multi-tenant keys (JSON list); when set, API_KEY is ignored. Entries:
+    # {"id", "key_sha256", "rate_limit_per_min", "rate_limit_burst", "max_browser_ops"}
+    api_keys: List[Dict[str, Any]] = Field(default_factory=list, alias="API_KEYS")
     bind_host: str = Field(default="127.0.0.1", alias="BIND_HOST")
     port: int = Field(default=8080, alias="PORT")
 
     # Rate limiting
     rate_limit_per_min: int = Field(default=30, alias="RATE_LIMIT_PER_MIN")
     rate_limit_burst: int = Field(default=60, alias="RATE_LIMIT_BURST")
+    # "memory" (per process) or "sqlite" (shared by all workers on one host)
+    rate_limit_backend: Literal["memory", "sqlite"] = Field(default="memory", alias="RATE_LIMIT_BACKEND")
+    rate_limit_db_path: str = Field(default="/tmp/smartmedical-rate-limit.sqlite3", alias="RATE_LIMIT_DB_PATH")
+    # Longest wait (seconds, in a worker thread) for the shared file's lock; past it the request gets a 503,
+    # or is let through with RATE_LIMIT_FAIL_OPEN
+    rate_limit_db_busy_timeout: float = Field(default=5.0, ge=0, alias="RATE_LIMIT_DB_BUSY_TIMEOUT")
+    rate_limit_fail_open: bool = Field(default=False, alias="RATE_LIMIT_FAIL_OPEN")
+    # Tokens charged per operation; JSON object in the environment
+    rate_limit_costs: Dict[str, float] = Field(
+        default_factory=lambda: {"not_modified": 0.1, "cached_read": 1.0, "scrape": 5.0, "booking": 10.0},
+        alias="RATE_LIMIT_COSTS",
+    )
 
     # CORS
     allowed_origins: List[str] = Field(default_factory=lambda: ["*"], alias="ALLOWED_ORIGINS")
@@ -36,10 +51,38 @@ class Settings(BaseSettings):
     request_timeout: int = Field(default=60, alias="REQUEST_TIMEOUT")
     selenium_pageload_timeout: int = Field(default=30, alias="SELENIUM_PAGELOAD_TIMEOUT")
     selenium_implicit_wait: int = Field(default=5, alias="SELENIUM_IMPLICIT_WAIT")
+    # Adaptive WebDriver wait timeouts: a high percentile of each wait point's recent
+    # durations times a headroom factor, within [floor, ceiling] (ceiling unset = REQUEST_TIMEOUT)
+    adaptive_timeouts_enabled: bool = Field(default=True, alias="ADAPTIVE_TIMEOUTS_ENABLED")
+    adaptive_timeout_percentile: float = Field(default=0.99, gt=0.0, le=1.0, alias="ADAPTIVE_TIMEOUT_PERCENTILE")
+    adaptive_timeout_multiplier: float = Field(default=3.0, ge=1.0, alias="ADAPTIVE_TIMEOUT_MULTIPLIER")
+    adaptive_timeout_floor: float = Field(default=5.0, alias="ADAPTIVE_TIMEOUT_FLOOR")
+    adaptive_timeout_ceiling: float | None = Field(default=None, alias="ADAPTIVE_TIMEOUT_CEILING")
+    adaptive_timeout_window: int = Field(default=200, ge=1, alias="ADAPTIVE_TIMEOUT_WINDOW")
+    # Portal circuit breakers (per phase: login, navigation, scrape, booking): consecutive
+    # failures that open one, seconds before a probe, and the latency counted as a failure (JSON)
+    circuit_breaker_enabled: bool = Field(default=True, alias="CIRCUIT_BREAKER_ENABLED")
+    circuit_failure_threshold: int = Field(default=5, ge=1, alias="CIRCUIT_FAILURE_THRESHOLD")
+    circuit_reset_seconds: float = Field(default=30.0, alias="CIRCUIT_RESET_SECONDS")
+    circuit_slow_call_seconds: Dict[str, float] = Field(
+        default_factory=lambda: {"login": 30.0, "navigation": 30.0, "scrape": 30.0, "booking": 30.0},
+        alias="CIRCUIT_SLOW_CALL_SECONDS",
+    )
 
     # Selenium / Browser
     browser: str = Field(default="headless-chrome", alias="BROWSER")
     selenium_remote_url: str | None = Field(default=None, alias="SELENIUM_REMOTE_URL")
+    # Local mode: explicit chromedriver binary, else the cached/downloaded one
+    chromedriver_path: str | None = Field(default=None, alias="CHROMEDRIVER_PATH")
+    chromedriver_cache_path: str = Field(default="~/.cache/smartmedical-api/chromedriver.json", alias="CHROMEDRIVER_CACHE_PATH")
+    # Logged-in portal sessions kept between requests (0 = one fresh session per request)
+    portal_session_pool_size: int = Field(default=0, alias="PORTAL_SESSION_POOL_SIZE")
+    portal_session_max_idle: int = Field(default=300, alias="PORTAL_SESSION_MAX_IDLE")
+    # Seconds between keepalive checks of idle pooled sessions (re-login in the background; 0 = off).
+    # Keep it below the Selenium node's session timeout (SE_NODE_SESSION_TIMEOUT)
+    portal_keepalive_seconds: float = Field(default=120.0, alias="PORTAL_KEEPALIVE_SECONDS")
+    # Launch a driver, log in and open the calendar at startup
+    prewarm_on_startup: bool = Field(default=False, alias="PREWARM_ON_STARTUP")
 
     # SmartMedical
     smartmedical_base_url: str = Field(default="https://vm528.smartmedical.eu/", alias="SMARTMEDICAL_BASE_URL")
@@ -47,10 +90,61 @@ class Settings(BaseSettings):
     smartmedical_password: str | None = Field(default=None, alias="SMARTMEDICAL_PASSWORD")
     smartmedical_otp_secret: str | None = Field(default=None, alias="SMARTMEDICAL_OTP_SECRET")
     smartmedical_login_on_timetable: bool = Field(default=True, alias="SMARTMEDICAL_LOGIN_ON_TIMETABLE")
+    # Calendars (JSON object): key -> timetable row id, or {"row_id": ...} / {"name": <row label>}.
+    # The first one is the default for requests without `calendar`.
+    calendars: Dict[str, Any] = Field(default_factory=lambda: {"nr10": "item-77-0"}, alias="CALENDARS")
+    # Calendars scraped at once by a full fetch (0 = PORTAL_SESSION_POOL_SIZE, at least 1)
+    calendar_scrape_concurrency: int = Field(default=0, alias="CALENDAR_SCRAPE_CONCURRENCY")
+
+    # Timetable cache (seconds a scrape is served from the in-memory slot index)
+    timetable_cache_ttl: int = Field(default=60, alias="TIMETABLE_CACHE_TTL")
+    # Past the TTL, serve the index marked stale (while refreshing in the background) up to this age; 0 = never
+    timetable_max_stale: int = Field(default=0, ge=0, alias="TIMETABLE_MAX_STALE")
+    # SQLite file persisting every scraped week; unset disables the store
+    snapshot_db_path: str | None = Field(default=None, alias="SNAPSHOT_DB_PATH")
+    snapshot_retention_days: int = Field(default=90, alias="SNAPSHOT_RETENTION_DAYS")
+    # /timetable/stream: idle heartbeat interval, per-connection event buffer and open streams per tenant
+    stream_heartbeat_seconds: float = Field(default=15.0, alias="STREAM_HEARTBEAT_SECONDS")
+    stream_queue_size: int = Field(default=100, alias="STREAM_QUEUE_SIZE")
+    stream_max_per_tenant: int = Field(default=20, alias="STREAM_MAX_PER_TENANT")
+    # Slot watches: per-tenant limit, long-poll cap and webhook batching/retry
+    watch_max_per_tenant: int = Field(default=100, alias="WATCH_MAX_PER_TENANT")
+    watch_poll_timeout: float = Field(default=30.0, alias="WATCH_POLL_TIMEOUT")
+    watch_webhook_batch_seconds: float = Field(default=1.0, alias="WATCH_WEBHOOK_BATCH_SECONDS")
+    watch_webhook_max_attempts: int = Field(default=5, alias="WATCH_WEBHOOK_MAX_ATTEMPTS")
+    watch_webhook_backoff_seconds: float = Field(default=1.0, alias="WATCH_WEBHOOK_BACKOFF_SECONDS")
+    # HMAC key signing webhook bodies (unset: unsigned); private targets are refused unless allowed
+    watch_webhook_secret: str | None = Field(default=None, alias="WATCH_WEBHOOK_SECRET")
+    watch_webhook_allow_private: bool = Field(default=False, alias="WATCH_WEBHOOK_ALLOW_PRIVATE")
+    # Delivery threads (one URL at a time each) and distinct callback URLs per tenant
+    watch_webhook_workers: int = Field(default=4, ge=1, alias="WATCH_WEBHOOK_WORKERS")
+    watch_max_callback_urls_per_tenant: int = Field(default=5, ge=1, alias="WATCH_MAX_CALLBACK_URLS_PER_TENANT")
+    # Waitlist entries (automatic bookings) one tenant may register
+    waitlist_max_per_tenant: int = Field(default=100, alias="WAITLIST_MAX_PER_TENANT")
+    # After submitting a booking, how long to wait for the reservation to show in the calendar
+    booking_confirm_timeout: float = Field(default=10.0, alias="BOOKING_CONFIRM_TIMEOUT")
+    # Booking length assumed for the per-slot booking lock when the slot index does not know the interval
+    booking_lock_minutes: int = Field(default=20, ge=1, alias="BOOKING_LOCK_MINUTES")
+
+    # Observability
+    server_timing_enabled: bool = Field(default=True, alias="SERVER_TIMING_ENABLED")
+    metrics_enabled: bool = Field(default=True, alias="METRICS_ENABLED")
+    # Bearer token for Prometheus scrapes of /metrics (an API key is accepted too)
+    metrics_token: str | None = Field(default=None, alias="METRICS_TOKEN")
+    # Count/time every WebDriver command per request (debug; adds overhead per command)
+    webdriver_profile: bool = Field(default=False, alias="WEBDRIVER_PROFILE")
+    # Span tracing; exported to a JSON-lines file and/or an OTLP/HTTP JSON endpoint
+    tracing_enabled: bool = Field(default=False, alias="TRACING_ENABLED")
+    trace_export_path: str | None = Field(default=None, alias="TRACE_EXPORT_PATH")
+    trace_otlp_url: str | None = Field(default=None, alias="TRACE_OTLP_URL")
 
     # Logging
     log_level: str = Field(default="INFO", alias="LOG_LEVEL")
     log_json: bool = Field(default=False, alias="LOG_JSON")
+    # Records buffered for the background log writer; beyond this they are dropped, never waited for
+    log_queue_size: int = Field(default=10000, alias="LOG_QUEUE_SIZE")
+    # Fraction of DEBUG records kept (1.0 = all)
+    log_debug_sample_rate: float = Field(default=1.0, ge=0.0, le=1.0, alias="LOG_DEBUG_SAMPLE_RATE")
 
     model_config = SettingsConfigDict(env_file=".env", case_sensitive=False, extra="ignore")
 
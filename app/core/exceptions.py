@@ -4,6 +4,7 @@ from fastapi import Request
 from fastapi.responses import JSONResponse
 
 UTF8_MEDIA_TYPE = "application/json; charset=utf-8"
+from fastapi.encoders import jsonable_encoder
 from fastapi.exceptions import RequestValidationError
 from starlette import status
 
@@ -15,6 +16,7 @@ class ErrorCodes:
     NOT_IMPLEMENTED = "not_implemented"
     INTERNAL_ERROR = "internal_error"
     TIMEOUT = "timeout"
+    PORTAL_UNAVAILABLE = "portal_unavailable"
 
 
 def validation_exception_handler(request: Request, exc: RequestValidationError):
@@ -22,7 +24,7 @@ def validation_exception_handler(request: Request, exc: RequestValidationError):
         status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
         content={
             "error": ErrorCodes.BAD_REQUEST,
-            "detail": exc.errors(),
+            "detail": jsonable_encoder(exc.errors()),
         },
         media_type=UTF8_MEDIA_TYPE,
     )
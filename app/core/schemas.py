@@ -1,5 +1,10 @@
-from pydantic import BaseModel
-from typing import Optional, List
+from datetime import date
+from pydantic import BaseModel, Field, field_validator, model_validator
+from typing import List, Literal, Optional
+
+# ISO date and 24-hour HH:MM (H:MM accepted), shared by query parameters and request bodies
+DATE_PATTERN = r"^\d{4}-\d{2}-\d{2}$"
+TIME_PATTERN = r"^([01]?\d|2[0-3]):[0-5]\d$"
 
 
 class TimetableResponse(BaseModel):
@@ -7,23 +12,152 @@ class TimetableResponse(BaseModel):
     date: Optional[str] = None
     slots: List[dict] = []
     source: str = "smartmedical"
+    # Served past TIMETABLE_CACHE_TTL while a refresh runs
+    stale: bool = False
+
+
+class TimetableColumns(BaseModel):
+    """Parallel arrays, one entry per slot."""
+
+    date: List[str] = []
+    start: List[str] = []
+    end: List[str] = []
+    doctor: List[Optional[str]] = []
+    interval: List[Optional[str]] = []
+    # Calendar key of each slot, so rooms stay apart when several calendars are served
+    calendar: List[Optional[str]] = []
+
+
+class ColumnarTimetableResponse(BaseModel):
+    """/timetable?format=columnar."""
+
+    doctor: Optional[str] = None
+    date: Optional[str] = None
+    format: Literal["columnar"] = "columnar"
+    columns: TimetableColumns = TimetableColumns()
+    source: str = "smartmedical"
+    stale: bool = False
+
+
+class NextAvailableResponse(BaseModel):
+    slot: Optional[dict] = None
+    source: str = "smartmedical"
+
+
+class UtilizationResponse(BaseModel):
+    days: List[dict] = []
+    source: str = "snapshot"
 
 
 class BookingRequest(BaseModel):
-    date: str
-    time: str
+    date: str = Field(pattern=DATE_PATTERN)
+    # HH:MM as the portal's form shows it ("9:00" is accepted as "09:00")
+    time: str = Field(pattern=TIME_PATTERN)
     first_name: str
     last_name: str
     phone: str
     notes: Optional[str] = None
+    # Calendar key (CALENDARS); the default calendar when omitted
+    calendar: Optional[str] = None
+
+    @field_validator("time")
+    @classmethod
+    def _zero_padded(cls, v: str) -> str:
+        hours, minutes = v.split(":")
+        return f"{int(hours):02d}:{minutes}"
 
 
 class BookingResponse(BaseModel):
     status: str
     booking_id: Optional[str] = None
+    # Whether the reservation was seen in the calendar after submitting (None = not checked)
+    confirmed: Optional[bool] = None
     message: Optional[str] = None
 
 
+class WatchRequest(BaseModel):
+    doctor: Optional[str] = None
+    date_from: Optional[str] = Field(default=None, pattern=DATE_PATTERN)
+    date_to: Optional[str] = Field(default=None, pattern=DATE_PATTERN)
+    after_time: Optional[str] = Field(default=None, pattern=TIME_PATTERN)
+    before_time: Optional[str] = Field(default=None, pattern=TIME_PATTERN)
+    # Minutes of free time the slot must offer inside the window
+    min_duration: int = Field(default=0, ge=0, le=24 * 60)
+    # Webhook receiving batches of matches; without one, matches wait for the long-poll endpoint
+    callback_url: Optional[str] = None
+
+    @field_validator("callback_url")
+    @classmethod
+    def _http_url(cls, v: Optional[str]) -> Optional[str]:
+        if v is not None and not v.startswith(("http://", "https://")):
+            raise ValueError("callback_url must be an http(s) URL")
+        return v
+
+    @model_validator(mode="after")
+    def _date_range(self) -> "WatchRequest":
+        if self.date_to:
+            start = date.fromisoformat(self.date_from) if self.date_from else date.today()
+            days = (date.fromisoformat(self.date_to) - start).days
+            if days < 0:
+                raise ValueError("date_to is before date_from")
+            if days >= 366:
+                raise ValueError("date range longer than a year; omit date_to instead")
+        return self
+
+
+class WatchResponse(BaseModel):
+    id: str
+    doctor: Optional[str] = None
+    date_from: Optional[str] = None
+    date_to: Optional[str] = None
+    after_time: Optional[str] = None
+    before_time: Optional[str] = None
+    min_duration: int = 0
+    callback_url: Optional[str] = None
+    created_at: float
+
+
+class WatchEventsResponse(BaseModel):
+    events: List[dict] = []
+
+
+class WaitlistRequest(BaseModel):
+    # Booking template: who to book
+    first_name: str
+    last_name: str
+    phone: str
+    notes: Optional[str] = None
+    # What is acceptable (empty lists = any)
+    dates: List[str] = Field(default=[], max_length=366)
+    doctors: List[str] = []
+    after_time: Optional[str] = Field(default=None, pattern=TIME_PATTERN)
+    before_time: Optional[str] = Field(default=None, pattern=TIME_PATTERN)
+    min_duration: int = Field(default=0, ge=0, le=24 * 60)
+    # Higher is booked first when entries of the same tenant compete for a slot
+    priority: int = 0
+
+    @field_validator("dates")
+    @classmethod
+    def _iso_dates(cls, v: List[str]) -> List[str]:
+        return sorted({date.fromisoformat(d).isoformat() for d in v})
+
+
+class WaitlistResponse(BaseModel):
+    id: str
+    dates: List[str] = []
+    doctors: List[str] = []
+    after_time: Optional[str] = None
+    before_time: Optional[str] = None
+    min_duration: int = 0
+    priority: int = 0
+    created_at: float
+    # waiting, booking, booked or failed
+    status: str
+    attempts: int = 0
+    slot: Optional[dict] = None
+    result: Optional[dict] = None
+
+
 class ErrorResponse(BaseModel):
     error: str
     detail: Optional[str] = None
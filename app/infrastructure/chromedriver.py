@@ -0,0 +1,115 @@
+"""Local ChromeDriver resolution and a long-lived chromedriver service.
+
+Resolution (explicit path, webdriver-manager, cached path, PATH) runs once, at
+startup. webdriver-manager goes first so the driver follows the installed
+Chrome's version; the path it resolves is remembered on disk so a restart
+without network access (where webdriver-manager fails) still finds a binary. One chromedriver process is then
+started and shared: each browser session is a `webdriver.Remote` against its
+local URL, so per-request cost is the Chrome launch only.
+"""
+from __future__ import annotations
+
+import atexit
+import json
+import logging
+import os
+import shutil
+import threading
+from typing import Optional
+
+from selenium.webdriver.chrome.service import Service as ChromeService
+
+logger = logging.getLogger(__name__)
+
+
+def _usable(path: Optional[str]) -> bool:
+    return bool(path) and os.path.isfile(path) and os.access(path, os.X_OK)
+
+
+def _read_cache(cache_path: str) -> Optional[str]:
+    try:
+        with open(cache_path, "r", encoding="utf-8") as fh:
+            return json.load(fh).get("path")
+    except (OSError, ValueError):
+        return None
+
+
+def _write_cache(cache_path: str, driver_path: str) -> None:
+    try:
+        os.makedirs(os.path.dirname(os.path.abspath(cache_path)), exist_ok=True)
+        tmp = f"{cache_path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as fh:
+            json.dump({"path": driver_path}, fh)
+        os.replace(tmp, cache_path)
+    except OSError:
+        logger.warning("Could not cache ChromeDriver path", extra={"cache_path": cache_path})
+
+
+def resolve_chromedriver(settings) -> str:
+    """Find a chromedriver binary matching the installed Chrome, falling back to the last one found."""
+    if settings.chromedriver_path:
+        if not _usable(settings.chromedriver_path):
+            raise RuntimeError(f"CHROMEDRIVER_PATH is not an executable file: {settings.chromedriver_path}")
+        return settings.chromedriver_path
+
+    cache_path = os.path.expanduser(settings.chromedriver_cache_path)
+    try:
+        from webdriver_manager.chrome import ChromeDriverManager
+
+        path = ChromeDriverManager().install()
+    except Exception:
+        cached = _read_cache(cache_path)
+        if _usable(cached):
+            logger.warning("ChromeDriver resolution failed; using the cached driver", exc_info=True)
+            return cached  # type: ignore[return-value]
+        logger.warning("ChromeDriver resolution failed; falling back to PATH", exc_info=True)
+        path = shutil.which("chromedriver")
+        if not path:
+            raise RuntimeError("No ChromeDriver available (download failed, nothing cached, none on PATH)")
+        return path
+    if path != _read_cache(cache_path):
+        _write_cache(cache_path, path)
+    return path
+
+
+_lock = threading.Lock()
+_service: Optional[ChromeService] = None
+
+
+def start_driver_service(settings) -> ChromeService:
+    """Start (or return the running) shared chromedriver service."""
+    global _service
+    with _lock:
+        process = getattr(_service, "process", None)
+        if process is not None and process.poll() is None:
+            return _service  # type: ignore[return-value]
+        if _service is not None:
+            logger.warning("ChromeDriver service exited; restarting")
+        service = ChromeService(resolve_chromedriver(settings))
+        service.start()
+        _service = service
+        logger.info("ChromeDriver service started", extra={"url": service.service_url})
+        return service
+
+
+def get_driver_service() -> Optional[ChromeService]:
+    return _service
+
+
+def driver_service_running() -> bool:
+    process = getattr(_service, "process", None)
+    return process is not None and process.poll() is None
+
+
+def stop_driver_service() -> None:
+    global _service
+    with _lock:
+        service, _service = _service, None
+    if service is not None:
+        try:
+            service.stop()
+        except Exception:
+            logger.warning("ChromeDriver service stop failed", exc_info=True)
+
+
+atexit.register(stop_driver_service)
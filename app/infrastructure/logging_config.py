@@ -1,29 +1,126 @@
+"""Logging setup: records are queued by the caller and written by a background thread.
+
+Request, worker and Selenium threads only run the (cheap) filters and put the
+record on a bounded queue; formatting and the write to stdout happen in a
+QueueListener thread. The filters (sampling, trace ids, PII redaction) are
+attached to the queue handler, so they run in the calling thread before the
+record is queued: that is where the caller's context (the active span) is
+visible. When the queue is full, records are dropped and counted
+rather than stalling the caller.
+"""
 from __future__ import annotations
 
+import atexit
 import json
 import logging
+import logging.handlers
+import queue
+import random
 import sys
-from typing import Any, Dict
+from typing import Any, Dict, Optional
 
 from app.core.config import get_settings
+from app.infrastructure.metrics import LOG_RECORDS_DROPPED
+from app.infrastructure.tracing import TraceContextFilter
+
+# Attributes every LogRecord has; anything else on a record came from `extra=`
+_RESERVED = frozenset(logging.LogRecord("", 0, "", 0, "", (), None).__dict__) | {"message", "asctime"}
+# Emitted by TraceContextFilter on every record; "-" means no active span
+_TRACE_FIELDS = ("trace_id", "span_id")
+
+REDACTED = "***"
+
+
+def _redact(value: Any, keys: frozenset) -> Any:
+    if isinstance(value, dict):
+        return {k: (REDACTED if k in keys else _redact(v, keys)) for k, v in value.items()}
+    return value
 
 
 class PiiSafeFilter(logging.Filter):
-    """Filter to prevent logging of sensitive fields in extra dicts."""
+    """Masks sensitive `extra=` fields (and keys of dict-valued fields) on the record itself."""
 
-    SENSITIVE_KEYS = {"patient_name", "patient_id", "phone", "email", "personal_code"}
+    # Patient details of BookingRequest/WaitlistRequest and other identifiers
+    SENSITIVE_KEYS = frozenset({
+        "first_name", "last_name", "phone", "notes",
+        "patient_name", "patient_id", "email", "personal_code",
+    })
 
     def filter(self, record: logging.LogRecord) -> bool:  # type: ignore[override]
-        try:
-            if hasattr(record, "extra") and isinstance(record.extra, dict):
-                record.extra = {k: ("***" if k in self.SENSITIVE_KEYS else v) for k, v in record.extra.items()}
-        except Exception:
-            pass
+        d = record.__dict__
+        for key in d.keys() - _RESERVED:
+            if key in self.SENSITIVE_KEYS:
+                d[key] = REDACTED
+            elif isinstance(d[key], dict):
+                d[key] = _redact(d[key], self.SENSITIVE_KEYS)
         return True
 
 
+class DebugSamplingFilter(logging.Filter):
+    """Keeps a `rate` fraction of DEBUG (and lower) records; other levels always pass."""
+
+    def __init__(self, rate: float):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:  # type: ignore[override]
+        if record.levelno > logging.DEBUG or self.rate >= 1.0:
+            return True
+        return random.random() < self.rate
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record: standard fields plus every `extra=` attribute."""
+
+    def format(self, record: logging.LogRecord) -> str:  # type: ignore[override]
+        payload: Dict[str, Any] = {
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "time": self.formatTime(record, datefmt="%Y-%m-%dT%H:%M:%S%z"),
+        }
+        for key, value in record.__dict__.items():
+            if key in _RESERVED or key in payload:
+                continue
+            if key in _TRACE_FIELDS and value in (None, "-"):
+                continue
+            payload[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            payload["exc_info"] = record.exc_text
+        if record.stack_info:
+            payload["stack_info"] = record.stack_info
+        return json.dumps(payload, ensure_ascii=False, default=str)
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """Never blocks: a full queue drops the record. Keeps `extra=` attributes intact."""
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            LOG_RECORDS_DROPPED.inc()
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Resolve what cannot cross threads (args, traceback) but leave formatting to the listener
+        record = logging.makeLogRecord(record.__dict__)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
 def configure_logging() -> None:
+    global _listener
     settings = get_settings()
+    shutdown_logging()
 
     root = logging.getLogger()
     if root.handlers:
@@ -34,29 +131,36 @@ def configure_logging() -> None:
     level = getattr(logging, settings.log_level.upper(), logging.INFO)
 
     handler = logging.StreamHandler(sys.stdout)
-
     if settings.log_json:
-        class JsonFormatter(logging.Formatter):
-            def format(self, record: logging.LogRecord) -> str:  # type: ignore[override]
-                payload: Dict[str, Any] = {
-                    "level": record.levelname,
-                    "logger": record.name,
-                    "message": record.getMessage(),
-                    "time": self.formatTime(record, datefmt="%Y-%m-%dT%H:%M:%S%z"),
-                }
-                if hasattr(record, "extra") and isinstance(getattr(record, "extra"), dict):
-                    payload.update(record.extra)
-                if record.exc_info:
-                    payload["exc_info"] = self.formatException(record.exc_info)
-                return json.dumps(payload, ensure_ascii=False)
-        formatter = JsonFormatter()
+        formatter: logging.Formatter = JsonFormatter()
     else:
+        trace = " %(trace_id)s |" if settings.tracing_enabled else ""
         formatter = logging.Formatter(
-            fmt="%(asctime)s | %(levelname)s | %(name)s | %(message)s",
+            fmt=f"%(asctime)s | %(levelname)s | %(name)s |{trace} %(message)s",
             datefmt="%Y-%m-%d %H:%M:%S",
         )
-
     handler.setFormatter(formatter)
-    handler.addFilter(PiiSafeFilter())
-    root.addHandler(handler)
+
+    records: "queue.Queue[logging.LogRecord]" = queue.Queue(maxsize=settings.log_queue_size)
+    queue_handler = _QueueHandler(records)
+    # Run in the caller's thread before the record is queued (TraceContextFilter needs its
+    # context): sampling first (cheapest exit), then context and redaction
+    queue_handler.addFilter(DebugSamplingFilter(settings.log_debug_sample_rate))
+    queue_handler.addFilter(TraceContextFilter())
+    queue_handler.addFilter(PiiSafeFilter())
+    root.addHandler(queue_handler)
     root.setLevel(level)
+
+    _listener = logging.handlers.QueueListener(records, handler, respect_handler_level=True)
+    _listener.start()
+
+
+def shutdown_logging() -> None:
+    """Stop the writer thread after it has written everything queued."""
+    global _listener
+    listener, _listener = _listener, None
+    if listener is not None:
+        listener.stop()
+
+
+atexit.register(shutdown_logging)
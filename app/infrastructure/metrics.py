@@ -0,0 +1,282 @@
+from __future__ import annotations
+
+import threading
+from bisect import bisect_left
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[n]) for n in self.labelnames)
+
+    def samples(self) -> Iterable[str]:  # pragma: no cover - abstract
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self.samples())
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def samples(self) -> Iterable[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, v in items:
+            yield f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(v)}"
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+        if not self.labelnames:
+            self._values[()] = 0.0
+
+    def set(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels: str) -> None:
+        self.inc(-amount, **labels)
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def samples(self) -> Iterable[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, v in items:
+            yield f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(v)}"
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = ()):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        # label values -> (per-bucket counts, sum, count)
+        self._values: Dict[LabelValues, Tuple[List[int], float, int]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        idx = bisect_left(self.buckets, value)
+        with self._lock:
+            counts, total, n = self._values.get(key) or ([0] * len(self.buckets), 0.0, 0)
+            counts[idx] += 1
+            self._values[key] = (counts, total + value, n + 1)
+
+    def count(self, **labels: str) -> int:
+        entry = self._values.get(self._key(labels))
+        return entry[2] if entry else 0
+
+    def samples(self) -> Iterable[str]:
+        with self._lock:
+            items = sorted((k, (list(c), s, n)) for k, (c, s, n) in self._values.items())
+        for key, (counts, total, n) in items:
+            cumulative = 0
+            for bound, c in zip(self.buckets, counts):
+                cumulative += c
+                le = f'le="{_format_value(bound)}"'
+                yield f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}"
+            yield f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(total)}"
+            yield f"{self.name}_count{_format_labels(self.labelnames, key)} {n}"
+
+
+class MetricsRegistry:
+    """In-process registry rendered in the Prometheus text exposition format."""
+
+    def __init__(self) -> None:
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} already registered")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))  # type: ignore[return-value]
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames))  # type: ignore[return-value]
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = ()) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))  # type: ignore[return-value]
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return "\n".join(m.render() for m in metrics) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120)
+BROWSER_BUCKETS = (0.1, 0.25, 0.5, 1, 2, 5, 10, 20, 30, 60, 120, 300)
+
+# API
+HTTP_REQUEST_DURATION = REGISTRY.histogram(
+    "smartmedical_http_request_duration_seconds",
+    "HTTP request latency by route template, method and status.",
+    ("route", "method", "status"),
+    LATENCY_BUCKETS,
+)
+RATE_LIMIT_DECISIONS = REGISTRY.counter(
+    "smartmedical_rate_limit_decisions_total",
+    "Rate limiter decisions.",
+    ("decision",),
+)
+
+# Browser layer
+BROWSER_SESSION_EVENTS = REGISTRY.counter(
+    "smartmedical_browser_session_events_total",
+    "WebDriver session lifecycle events (create, quit, failure).",
+    ("event",),
+)
+BROWSER_SESSION_DURATION = REGISTRY.histogram(
+    "smartmedical_browser_session_duration_seconds",
+    "Time to create or quit a WebDriver session, and how long sessions lived.",
+    ("operation",),
+    BROWSER_BUCKETS,
+)
+
+# Portal flows
+PORTAL_AUTH = REGISTRY.counter(
+    "smartmedical_portal_auth_total",
+    "Login and TFA step outcomes.",
+    ("step", "outcome"),
+)
+SCRAPE_WEEK_DURATION = REGISTRY.histogram(
+    "smartmedical_scrape_week_duration_seconds",
+    "Time to scrape one calendar week.",
+    (),
+    BROWSER_BUCKETS,
+)
+SCRAPE_WEEK_SLOTS = REGISTRY.histogram(
+    "smartmedical_scrape_week_slots",
+    "Free slots found per scraped calendar week.",
+    (),
+    (0, 5, 10, 25, 50, 100, 250, 500, 1000),
+)
+PORTAL_JOBS_IN_FLIGHT = REGISTRY.gauge(
+    "smartmedical_portal_jobs_in_flight",
+    "Browser-backed portal jobs currently running in worker threads.",
+)
+PORTAL_JOBS_QUEUED = REGISTRY.gauge(
+    "smartmedical_portal_jobs_queued",
+    "Browser-backed portal jobs waiting for a worker thread.",
+)
+PORTAL_SESSIONS_IDLE = REGISTRY.gauge(
+    "smartmedical_portal_sessions_idle",
+    "Logged-in browser sessions waiting in the session pool.",
+)
+PORTAL_SESSION_ACQUIRE = REGISTRY.counter(
+    "smartmedical_portal_session_acquire_total",
+    "Portal sessions handed to flows, by source (pooled, created).",
+    ("source",),
+)
+PORTAL_KEEPALIVE = REGISTRY.counter(
+    "smartmedical_portal_keepalive_total",
+    "Keepalive checks of idle pooled sessions, by outcome (alive, relogin, replaced, failed).",
+    ("outcome",),
+)
+PORTAL_QUOTA_REJECTIONS = REGISTRY.counter(
+    "smartmedical_portal_quota_rejections_total",
+    "Portal jobs rejected because the tenant was at its concurrency quota.",
+)
+WEBHOOK_DELIVERIES = REGISTRY.counter(
+    "smartmedical_webhook_deliveries_total",
+    "Webhook batch deliveries, by outcome (delivered, retried, failed, rejected, dropped).",
+    ("outcome",),
+)
+WAITLIST_BOOKINGS = REGISTRY.counter(
+    "smartmedical_waitlist_bookings_total",
+    "Automatic waitlist booking attempts, by resulting entry status (booked, waiting, failed).",
+    ("outcome",),
+)
+PORTAL_WAIT_DURATION = REGISTRY.histogram(
+    "smartmedical_portal_wait_duration_seconds",
+    "Successful WebDriver waits by wait point (input to the adaptive timeouts).",
+    ("point",),
+    LATENCY_BUCKETS,
+)
+PORTAL_WAIT_TIMEOUTS = REGISTRY.counter(
+    "smartmedical_portal_wait_timeouts_total",
+    "WebDriver waits that ran into their (adaptive) timeout, by wait point.",
+    ("point",),
+)
+PORTAL_CIRCUIT_STATE = REGISTRY.gauge(
+    "smartmedical_portal_circuit_state",
+    "Portal circuit breaker state by phase (0 closed, 1 half-open, 2 open).",
+    ("phase",),
+)
+PORTAL_CIRCUIT_REJECTIONS = REGISTRY.counter(
+    "smartmedical_portal_circuit_rejections_total",
+    "Portal calls rejected by an open circuit breaker, by phase.",
+    ("phase",),
+)
+BOOKING_LOCK_CONFLICTS = REGISTRY.counter(
+    "smartmedical_booking_lock_conflicts_total",
+    "Bookings rejected because a booking of an overlapping slot was already in progress.",
+)
+LOG_RECORDS_DROPPED = REGISTRY.counter(
+    "smartmedical_log_records_dropped_total",
+    "Log records dropped because the background writer's queue was full.",
+)
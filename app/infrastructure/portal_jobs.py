@@ -0,0 +1,131 @@
+from __future__ import annotations
+
+import asyncio
+import threading
+from typing import Any, Callable, Dict, Optional, TypeVar
+
+from fastapi import HTTPException, status
+
+from app.infrastructure.metrics import PORTAL_JOBS_IN_FLIGHT, PORTAL_JOBS_QUEUED, PORTAL_QUOTA_REJECTIONS
+from app.infrastructure.security import Tenant, current_tenant
+from app.infrastructure.tracing import finish_span, span, start_span
+
+T = TypeVar("T")
+
+
+class _JobState:
+    __slots__ = ("lock", "started", "abandoned")
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.started = False
+        self.abandoned = False
+
+
+class TenantQuota:
+    """Concurrent browser-backed operations per tenant.
+
+    Only touched from the event loop, so plain counters suffice. A tenant at its
+    `max_browser_ops` is rejected immediately rather than queued, so one busy
+    integration cannot occupy every Selenium session.
+    """
+
+    def __init__(self) -> None:
+        self._in_flight: Dict[str, int] = {}
+
+    def try_acquire(self, tenant: Tenant) -> bool:
+        n = self._in_flight.get(tenant.id, 0)
+        if tenant.max_browser_ops is not None and n >= tenant.max_browser_ops:
+            return False
+        self._in_flight[tenant.id] = n + 1
+        return True
+
+    def release(self, tenant: Tenant) -> None:
+        n = self._in_flight.get(tenant.id, 0) - 1
+        if n > 0:
+            self._in_flight[tenant.id] = n
+        else:
+            self._in_flight.pop(tenant.id, None)
+
+    def in_flight(self, tenant_id: str) -> int:
+        return self._in_flight.get(tenant_id, 0)
+
+
+_quota = TenantQuota()
+
+
+def get_tenant_quota() -> TenantQuota:
+    return _quota
+
+
+async def run_portal_job(func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """Run a browser-backed flow in a worker thread, tracking queue and in-flight gauges.
+
+    Same semantics as `asyncio.to_thread` (context is copied into the worker).
+    A job cancelled while still queued is dropped without running. Requests of a
+    tenant already at its concurrency quota get a 429; a slot of the quota is held
+    until the worker thread is done with the browser, not just until the request
+    ends (a timed-out request's job keeps running).
+    """
+    tenant = current_tenant()
+    if tenant is None:
+        return await _run_job(func, args, kwargs)
+    if not _quota.try_acquire(tenant):
+        PORTAL_QUOTA_REJECTIONS.inc()
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many concurrent portal operations",
+            headers={"Retry-After": "1"},
+        )
+    loop = asyncio.get_running_loop()
+
+    def release() -> None:
+        try:
+            loop.call_soon_threadsafe(_quota.release, tenant)
+        except RuntimeError:  # loop already closed, nothing left to throttle
+            pass
+
+    return await _run_job(func, args, kwargs, on_done=release)
+
+
+async def _run_job(
+    func: Callable[..., T],
+    args: tuple,
+    kwargs: Dict[str, Any],
+    on_done: Optional[Callable[[], None]] = None,
+) -> T:
+    """`on_done` is called exactly once: by the worker when the job ends, or here if it never started."""
+    state = _JobState()
+    name = getattr(func, "__name__", "job")
+    PORTAL_JOBS_QUEUED.inc()
+    # Ends in the worker thread, when the job leaves the executor queue
+    queue_span = start_span("executor.queue", job=name)
+
+    def _run() -> T:
+        with state.lock:
+            if state.abandoned:
+                raise asyncio.CancelledError()
+            state.started = True
+        finish_span(queue_span)
+        PORTAL_JOBS_QUEUED.dec()
+        PORTAL_JOBS_IN_FLIGHT.inc()
+        try:
+            with span(f"portal_job {name}"):
+                return func(*args, **kwargs)
+        finally:
+            PORTAL_JOBS_IN_FLIGHT.dec()
+            if on_done is not None:
+                on_done()
+
+    try:
+        return await asyncio.to_thread(_run)
+    except BaseException as e:
+        with state.lock:
+            dropped = not state.started and not state.abandoned
+            if dropped:
+                state.abandoned = True
+                PORTAL_JOBS_QUEUED.dec()
+                finish_span(queue_span, e)
+        if dropped and on_done is not None:
+            on_done()
+        raise
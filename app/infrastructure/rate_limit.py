@@ -1,60 +1,311 @@
 from __future__ import annotations
 
+import asyncio
+import logging
+import math
+import os
+import sqlite3
 import threading
 import time
-from dataclasses import dataclass
-from typing import Dict
+from contextvars import ContextVar
+from typing import Dict, Optional, Protocol
 
 from fastapi import HTTPException, status
 
 from app.core.config import get_settings
+from app.infrastructure.metrics import RATE_LIMIT_DECISIONS
+from app.infrastructure.security import current_tenant
+from app.infrastructure.tracing import span
+
+logger = logging.getLogger(__name__)
+
+class Decision:
+    """Outcome of one limiter call, with enough bucket state for response headers."""
+
+    __slots__ = ("allowed", "capacity", "remaining", "refill_rate_per_sec", "cost")
+
+    def __init__(self, allowed: bool, capacity: float, remaining: float, refill_rate_per_sec: float, cost: float):
+        self.allowed = allowed
+        self.capacity = capacity
+        self.remaining = remaining
+        self.refill_rate_per_sec = refill_rate_per_sec
+        self.cost = cost
+
+    def retry_after(self) -> int:
+        """Whole seconds until `cost` tokens are available again."""
+        missing = self.cost - self.remaining
+        if missing <= 0 or self.refill_rate_per_sec <= 0:
+            return 0
+        return max(1, math.ceil(missing / self.refill_rate_per_sec))
+
+    def reset_after(self) -> int:
+        """Whole seconds until the bucket is full again."""
+        missing = self.capacity - self.remaining
+        if missing <= 0 or self.refill_rate_per_sec <= 0:
+            return 0
+        return math.ceil(missing / self.refill_rate_per_sec)
+
+    def headers(self) -> Dict[str, str]:
+        out = {
+            "X-RateLimit-Limit": str(int(self.capacity)),
+            "X-RateLimit-Remaining": str(max(0, int(self.remaining))),
+            "X-RateLimit-Reset": str(self.reset_after()),
+        }
+        if not self.allowed:
+            out["Retry-After"] = str(self.retry_after())
+        return out
+
+
+class RateLimiterUnavailable(Exception):
+    """The limiter could not make a decision (e.g. its shared database stayed locked)."""
+
+
+class RateLimiter(Protocol):
+    # True when acquire() may wait on I/O, so callers on the event loop run it in a thread
+    blocking: bool
+
+    def acquire(self, key: str, cost: float = 1.0, capacity: Optional[int] = None, per_minute: Optional[int] = None) -> Decision: ...
+
+    def allow(self, key: str, cost: float = 1.0) -> bool: ...
 
 
-@dataclass
 class Bucket:
-    capacity: int
-    refill_rate_per_sec: float
-    tokens: float
-    last_refill: float
+    __slots__ = ("tokens", "last_refill", "capacity", "refill_rate_per_sec")
+
+    def __init__(self, tokens: float, last_refill: float, capacity: float, refill_rate_per_sec: float):
+        self.tokens = tokens
+        self.last_refill = last_refill
+        self.capacity = capacity
+        self.refill_rate_per_sec = refill_rate_per_sec
 
 
 class InMemoryRateLimiter:
+    """Per-process token buckets.
+
+    Buckets that have been idle long enough to refill completely hold no
+    information, so they are dropped by an amortized sweep instead of
+    accumulating one entry per key forever.
+    """
+
+    blocking = False
+
     def __init__(self, capacity: int, per_minute: int):
         self.capacity = capacity
         self.refill_rate_per_sec = per_minute / 60.0
         self._buckets: Dict[str, Bucket] = {}
         self._lock = threading.Lock()
+        # Time for an empty bucket to refill; no bucket can stay non-full longer
+        self._sweep_interval = capacity / self.refill_rate_per_sec if self.refill_rate_per_sec > 0 else 60.0
+        self._next_sweep = time.monotonic() + self._sweep_interval
 
-    def allow(self, key: str, cost: int = 1) -> bool:
+    def acquire(self, key: str, cost: float = 1.0, capacity: Optional[int] = None, per_minute: Optional[int] = None) -> Decision:
+        """Take `cost` tokens from `key`'s bucket; `capacity`/`per_minute` override the defaults for this key."""
+        capacity = self.capacity if capacity is None else capacity
+        rate = self.refill_rate_per_sec if per_minute is None else per_minute / 60.0
+        # A cost above the burst size could never be paid
+        cost = min(cost, capacity)
         now = time.monotonic()
         with self._lock:
+            if now >= self._next_sweep:
+                self._evict_full(now)
             bucket = self._buckets.get(key)
             if bucket is None:
-                bucket = Bucket(self.capacity, self.refill_rate_per_sec, self.capacity, now)
+                bucket = Bucket(capacity, now, capacity, rate)
                 self._buckets[key] = bucket
+            else:
+                bucket.capacity, bucket.refill_rate_per_sec = capacity, rate
             # Refill tokens
             elapsed = now - bucket.last_refill
             if elapsed > 0:
-                bucket.tokens = min(bucket.capacity, bucket.tokens + elapsed * bucket.refill_rate_per_sec)
+                bucket.tokens = min(capacity, bucket.tokens + elapsed * rate)
                 bucket.last_refill = now
-            if bucket.tokens >= cost:
+            allowed = bucket.tokens >= cost
+            if allowed:
                 bucket.tokens -= cost
-                return True
-            return False
+            return Decision(allowed, capacity, bucket.tokens, rate, cost)
+
+    def allow(self, key: str, cost: float = 1.0) -> bool:
+        return self.acquire(key, cost).allowed
+
+    def _evict_full(self, now: float) -> None:
+        idle = [
+            k for k, b in self._buckets.items()
+            if b.tokens + (now - b.last_refill) * b.refill_rate_per_sec >= b.capacity
+        ]
+        for k in idle:
+            del self._buckets[k]
+        self._next_sweep = now + self._sweep_interval
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+
+class SqliteRateLimiter:
+    """Token buckets in a SQLite database (WAL mode) shared by all worker processes.
+
+    Each decision is one `BEGIN IMMEDIATE` transaction, so the read-refill-take
+    update is atomic across processes. Uses wall-clock time, since monotonic
+    clocks are not comparable between processes. The file must be on local disk.
+
+    Decisions block on the file, so `enforce_rate_limit` runs them in a worker
+    thread. When another process holds the write lock for longer than
+    `busy_timeout`, `RateLimiterUnavailable` is raised (fail closed), or, with
+    `fail_open`, the request is let through.
+    """
+
+    blocking = True
+
+    def __init__(self, path: str, capacity: int, per_minute: int, busy_timeout: float = 5.0, fail_open: bool = False):
+        self.path = path
+        self.capacity = capacity
+        self.refill_rate_per_sec = per_minute / 60.0
+        self.busy_timeout = busy_timeout
+        self.fail_open = fail_open
+        self._local = threading.local()
+        self._sweep_interval = capacity / self.refill_rate_per_sec if self.refill_rate_per_sec > 0 else 60.0
+        self._next_sweep = time.time() + self._sweep_interval
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        conn = self._conn()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS buckets ("
+            " key TEXT PRIMARY KEY, tokens REAL NOT NULL, last_refill REAL NOT NULL,"
+            " capacity REAL NOT NULL, refill_rate REAL NOT NULL)"
+        )
+        # Databases from before per-tenant limits: existing rows get the defaults
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(buckets)")}
+        for column, default in (("capacity", float(capacity)), ("refill_rate", self.refill_rate_per_sec)):
+            if column not in columns:
+                conn.execute(f"ALTER TABLE buckets ADD COLUMN {column} REAL NOT NULL DEFAULT {default!r}")
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # Autocommit mode; transactions are opened explicitly in acquire()
+            conn = sqlite3.connect(self.path, timeout=self.busy_timeout, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def acquire(self, key: str, cost: float = 1.0, capacity: Optional[int] = None, per_minute: Optional[int] = None) -> Decision:
+        capacity = self.capacity if capacity is None else capacity
+        rate = self.refill_rate_per_sec if per_minute is None else per_minute / 60.0
+        cost = min(cost, capacity)
+        conn = self._conn()
+        now = time.time()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+        except sqlite3.OperationalError as e:
+            if not self.fail_open:
+                RATE_LIMIT_DECISIONS.inc(decision="unavailable")
+                logger.warning("Rate limit database busy; request refused", extra={"path": self.path})
+                raise RateLimiterUnavailable(str(e)) from e
+            RATE_LIMIT_DECISIONS.inc(decision="fail_open")
+            logger.warning("Rate limit database busy; request let through", extra={"path": self.path})
+            return Decision(True, capacity, float(capacity), rate, cost)
+        try:
+            row = conn.execute("SELECT tokens, last_refill FROM buckets WHERE key = ?", (key,)).fetchone()
+            tokens, last_refill = row if row is not None else (float(capacity), now)
+            elapsed = now - last_refill
+            if elapsed > 0:
+                tokens = min(capacity, tokens + elapsed * rate)
+                last_refill = now
+            allowed = tokens >= cost
+            if allowed:
+                tokens -= cost
+            conn.execute(
+                "INSERT INTO buckets (key, tokens, last_refill, capacity, refill_rate) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET tokens = excluded.tokens, last_refill = excluded.last_refill,"
+                " capacity = excluded.capacity, refill_rate = excluded.refill_rate",
+                (key, tokens, last_refill, capacity, rate),
+            )
+            if now >= self._next_sweep:
+                # Idle rows that have refilled completely carry no state
+                conn.execute(
+                    "DELETE FROM buckets WHERE tokens + (? - last_refill) * refill_rate >= capacity",
+                    (now,),
+                )
+                self._next_sweep = now + self._sweep_interval
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return Decision(allowed, capacity, tokens, rate, cost)
+
+    def allow(self, key: str, cost: float = 1.0) -> bool:
+        return self.acquire(key, cost).allowed
 
 
 # Singleton configured from settings
-_limiter: InMemoryRateLimiter | None = None
+_limiter: RateLimiter | None = None
 
-def get_rate_limiter() -> InMemoryRateLimiter:
+def get_rate_limiter() -> RateLimiter:
     global _limiter
     if _limiter is None:
         s = get_settings()
-        _limiter = InMemoryRateLimiter(capacity=s.rate_limit_burst, per_minute=s.rate_limit_per_min)
+        if s.rate_limit_backend == "sqlite":
+            _limiter = SqliteRateLimiter(
+                s.rate_limit_db_path,
+                capacity=s.rate_limit_burst,
+                per_minute=s.rate_limit_per_min,
+                busy_timeout=s.rate_limit_db_busy_timeout,
+                fail_open=s.rate_limit_fail_open,
+            )
+        else:
+            _limiter = InMemoryRateLimiter(capacity=s.rate_limit_burst, per_minute=s.rate_limit_per_min)
     return _limiter
 
 
-def enforce_rate_limit(key: str) -> None:
+class RateLimitScope:
+    """Holds the request's last limiter decision so the middleware can emit headers."""
+
+    __slots__ = ("decision",)
+
+    def __init__(self) -> None:
+        self.decision: Optional[Decision] = None
+
+
+_current_scope: ContextVar[Optional[RateLimitScope]] = ContextVar("rate_limit_scope", default=None)
+
+
+def start_rate_limit_scope() -> RateLimitScope:
+    scope = RateLimitScope()
+    _current_scope.set(scope)
+    return scope
+
+
+async def enforce_rate_limit(key: str, operation: str = "cached_read") -> None:
+    """Charge `key` the configured cost of `operation` (see RATE_LIMIT_COSTS); 429 when short.
+
+    Uses the calling tenant's own rate and burst when its API key entry sets them.
+    A blocking limiter runs in a worker thread; one that cannot decide gives a 503.
+    """
+    cost = get_settings().rate_limit_costs.get(operation, 1.0)
     limiter = get_rate_limiter()
-    if not limiter.allow(key):
-        raise HTTPException(status_code=status.HTTP_429_TOO_MANY_REQUESTS, detail="Rate limit exceeded")
+    tenant = current_tenant()
+    capacity = tenant.rate_limit_burst if tenant is not None else None
+    per_minute = tenant.rate_limit_per_min if tenant is not None else None
+    with span("rate_limit", operation=operation, cost=cost):
+        try:
+            if limiter.blocking:
+                decision = await asyncio.to_thread(limiter.acquire, key, cost, capacity=capacity, per_minute=per_minute)
+            else:
+                decision = limiter.acquire(key, cost, capacity=capacity, per_minute=per_minute)
+        except RateLimiterUnavailable:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Rate limiter unavailable",
+                headers={"Retry-After": "1"},
+            )
+    scope = _current_scope.get()
+    if scope is not None:
+        scope.decision = decision
+    if not decision.allowed:
+        RATE_LIMIT_DECISIONS.inc(decision="reject")
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Rate limit exceeded",
+            headers=decision.headers(),
+        )
+    RATE_LIMIT_DECISIONS.inc(decision="accept")
@@ -0,0 +1,22 @@
+from __future__ import annotations
+
+import re
+import uuid
+from contextvars import ContextVar
+from typing import Optional
+
+REQUEST_ID_HEADER = "X-Request-ID"
+
+_REQUEST_ID_RE = re.compile(r"^[A-Za-z0-9._-]{1,64}$")
+_request_id: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+
+
+def bind_request_id(incoming: Optional[str] = None) -> str:
+    """Set the current request id, reusing a well-formed incoming header value."""
+    rid = incoming if incoming and _REQUEST_ID_RE.match(incoming) else uuid.uuid4().hex
+    _request_id.set(rid)
+    return rid
+
+
+def current_request_id() -> Optional[str]:
+    return _request_id.get()
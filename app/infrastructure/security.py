@@ -1,22 +1,120 @@
 from __future__ import annotations
 
 import hashlib
-from typing import Optional
+import logging
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, Optional
 
 from fastapi import Depends, Header, HTTPException, status
 
-from app.core.config import get_settings
+from app.core.config import Settings, get_settings
+from app.infrastructure.tracing import span
+from app.infrastructure.webdriver_profiler import bind_profile_owner
+
+logger = logging.getLogger(__name__)
 
 API_KEY_HEADER = "X-API-Key"
 
 
-def get_api_key(x_api_key: Optional[str] = Header(default=None, alias=API_KEY_HEADER)) -> str:
-    settings = get_settings()
-    if not x_api_key or x_api_key != settings.api_key:
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Unauthorized")
-    return x_api_key
+@dataclass(slots=True, frozen=True)
+class Tenant:
+    """An API client. Limits left as None fall back to the global settings."""
+
+    id: str
+    rate_limit_per_min: Optional[int] = None
+    rate_limit_burst: Optional[int] = None
+    # Concurrent browser-backed operations (scrapes, bookings); None = unlimited
+    max_browser_ops: Optional[int] = None
+
+
+def _digest(api_key: str) -> bytes:
+    return hashlib.sha256(api_key.encode("utf-8")).digest()
+
+
+class ApiKeyRegistry:
+    """SHA-256 digests of the accepted keys, built once per settings object.
+
+    A presented key is hashed once and looked up by digest. No plaintext key is
+    kept or compared, so lookup timing depends only on the hash of the presented
+    key and leaks nothing about stored keys.
+    """
+
+    def __init__(self, entries: Dict[bytes, Tenant], settings: Optional[Settings] = None):
+        self._by_digest = entries
+        self.settings = settings
+
+    @classmethod
+    def from_settings(cls, settings: Settings) -> "ApiKeyRegistry":
+        entries: Dict[bytes, Tenant] = {}
+        if settings.api_keys:
+            for raw in settings.api_keys:
+                tenant, digests = _parse_entry(raw)
+                for d in digests:
+                    entries[d] = tenant
+        elif settings.api_key:
+            # Single-key deployments: one tenant named after the key digest, as before
+            d = _digest(settings.api_key)
+            entries[d] = Tenant(id=d.hex()[:16])
+        return cls(entries, settings)
+
+    def lookup(self, api_key: Optional[str]) -> Optional[Tenant]:
+        if not api_key:
+            return None
+        return self._by_digest.get(_digest(api_key))
+
+    def tenants(self) -> Iterable[Tenant]:
+        return {t.id: t for t in self._by_digest.values()}.values()
+
+
+def _parse_entry(raw: Dict[str, Any]):
+    """One API_KEYS entry: {"id", "key_sha256" (hex, or a list of them), optional limits}."""
+    hashes = raw.get("key_sha256")
+    if isinstance(hashes, str):
+        hashes = [hashes]
+    if not raw.get("id") or not hashes:
+        raise ValueError("API_KEYS entries need an 'id' and at least one 'key_sha256'")
+    tenant = Tenant(
+        id=str(raw["id"]),
+        rate_limit_per_min=raw.get("rate_limit_per_min"),
+        rate_limit_burst=raw.get("rate_limit_burst"),
+        max_browser_ops=raw.get("max_browser_ops"),
+    )
+    return tenant, [bytes.fromhex(h) for h in hashes]
+
+
+_registry: ApiKeyRegistry | None = None
+
+
+def get_key_registry() -> ApiKeyRegistry:
+    """Registry for the current settings; rebuilt only when settings are reloaded."""
+    global _registry
+    s = get_settings()
+    if _registry is None or _registry.settings is not s:
+        _registry = ApiKeyRegistry.from_settings(s)
+        logger.info("API key registry loaded", extra={"tenants": len(list(_registry.tenants()))})
+    return _registry
+
+
+_current_tenant: ContextVar[Optional[Tenant]] = ContextVar("tenant", default=None)
+
+
+def current_tenant() -> Optional[Tenant]:
+    return _current_tenant.get()
+
+
+# Async so the tenant is bound in the endpoint's own context (sync dependencies
+# run in a threadpool copy) and reaches run_portal_job for quota checks
+async def get_tenant(x_api_key: Optional[str] = Header(default=None, alias=API_KEY_HEADER)) -> Tenant:
+    with span("auth"):
+        tenant = get_key_registry().lookup(x_api_key)
+        if tenant is None:
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Unauthorized")
+    _current_tenant.set(tenant)
+    bind_profile_owner(tenant.id)
+    return tenant
 
 
-def principal_id(api_key: str = Depends(get_api_key)) -> str:
-    """Return a stable identifier derived from the API key for rate limiting and logging."""
-    return hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:16]
+async def principal_id(tenant: Tenant = Depends(get_tenant)) -> str:
+    """Return a stable identifier of the caller for rate limiting and logging."""
+    return tenant.id
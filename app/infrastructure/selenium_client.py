@@ -1,14 +1,22 @@
 from __future__ import annotations
 
+import json
+import logging
+import time
+import urllib.request
 from contextlib import contextmanager
 from typing import Generator
 
 from selenium import webdriver
 from selenium.webdriver.chrome.options import Options as ChromeOptions
-from selenium.webdriver.chrome.service import Service as ChromeService
-from webdriver_manager.chrome import ChromeDriverManager
 
 from app.core.config import get_settings
+from app.infrastructure.chromedriver import driver_service_running, get_driver_service, start_driver_service
+from app.infrastructure.metrics import BROWSER_SESSION_DURATION, BROWSER_SESSION_EVENTS
+from app.infrastructure.timing import phase
+from app.infrastructure.webdriver_profiler import instrument_driver
+
+logger = logging.getLogger(__name__)
 
 
 def _build_chrome_options(settings) -> ChromeOptions:
@@ -28,32 +36,79 @@ def browser() -> Generator[webdriver.Chrome, None, None]:
     """Context manager that yields a configured Chrome WebDriver.
 
     - If SELENIUM_REMOTE_URL is provided, connects to a remote Selenium node (Docker/Grid).
-    - Otherwise, starts a local ChromeDriver instance with auto-managed driver.
+    - Otherwise, opens a session on the shared local chromedriver service
+      (started in lifespan, or lazily on first use).
     """
+    driver = open_browser()
+    try:
+        yield driver
+    finally:
+        close_browser(driver)
+
+
+def open_browser() -> webdriver.Remote:
+    """Start a configured WebDriver session; pair with close_browser()."""
     settings = get_settings()
     options = _build_chrome_options(settings)
 
-    driver = None
+    start = time.monotonic()
+    with phase("browser_start"):
+        try:
+            driver = _create_driver(settings, options)
+            driver.set_page_load_timeout(settings.selenium_pageload_timeout)
+            driver.implicitly_wait(settings.selenium_implicit_wait)
+        except Exception:
+            BROWSER_SESSION_EVENTS.inc(event="failure")
+            raise
+        if settings.webdriver_profile or settings.tracing_enabled:
+            instrument_driver(driver)
+        BROWSER_SESSION_EVENTS.inc(event="create")
+        BROWSER_SESSION_DURATION.observe(time.monotonic() - start, operation="create")
+    driver._sm_created_at = time.monotonic()
+    return driver
+
+
+def close_browser(driver) -> None:
+    """Quit a session from open_browser(), recording quit time and lifetime."""
+    quit_start = time.monotonic()
     try:
-        if getattr(settings, "selenium_remote_url", None):
-            # Remote WebDriver for Docker containers / Selenium Grid
-            driver = webdriver.Remote(
-                command_executor=settings.selenium_remote_url,
-                options=options,
-            )
-        else:
-            # Auto-install and manage ChromeDriver
-            service = ChromeService(ChromeDriverManager().install())
-            driver = webdriver.Chrome(service=service, options=options)
-
-        driver.set_page_load_timeout(settings.selenium_pageload_timeout)
-        driver.implicitly_wait(settings.selenium_implicit_wait)
-        yield driver
-    finally:
-        if driver is not None:
-            try:
-                driver.quit()
-            except Exception as e:
-                print(f"Exceptions: {e}")
-                pass
+        with phase("browser_quit"):
+            driver.quit()
+        BROWSER_SESSION_EVENTS.inc(event="quit")
+    except Exception:
+        BROWSER_SESSION_EVENTS.inc(event="failure")
+        logger.warning("Browser quit failed", exc_info=True)
+    BROWSER_SESSION_DURATION.observe(time.monotonic() - quit_start, operation="quit")
+    created_at = getattr(driver, "_sm_created_at", None)
+    if created_at is not None:
+        BROWSER_SESSION_DURATION.observe(quit_start - created_at, operation="lifetime")
+
+
+def driver_endpoint_ready(settings, timeout: float = 2.0) -> bool:
+    """Whether the WebDriver endpoint (remote node or local chromedriver) reports ready.
+
+    Blocking; does not start anything.
+    """
+    if getattr(settings, "selenium_remote_url", None):
+        url = settings.selenium_remote_url
+    elif driver_service_running():
+        url = get_driver_service().service_url
+    else:
+        return False
+    try:
+        with urllib.request.urlopen(f"{url.rstrip('/')}/status", timeout=timeout) as resp:
+            return bool(json.load(resp).get("value", {}).get("ready"))
+    except Exception:
+        return False
+
 
+def _create_driver(settings, options: ChromeOptions) -> webdriver.Remote:
+    if getattr(settings, "selenium_remote_url", None):
+        # Remote WebDriver for Docker containers / Selenium Grid
+        return webdriver.Remote(
+            command_executor=settings.selenium_remote_url,
+            options=options,
+        )
+    # Session on the long-lived local chromedriver; quitting it leaves the service running
+    service = start_driver_service(settings)
+    return webdriver.Remote(command_executor=service.service_url, options=options)
@@ -0,0 +1,79 @@
+from __future__ import annotations
+
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from app.infrastructure.tracing import span
+
+
+class PhaseTimer:
+    """Collects named phase durations for one request.
+
+    Lives in a ContextVar, so it follows the request into `asyncio.to_thread`
+    workers (which copy the caller's context) and the flow functions there.
+    """
+
+    __slots__ = ("_phases", "_lock")
+
+    def __init__(self) -> None:
+        self._phases: List[Tuple[str, float]] = []
+        self._lock = threading.Lock()
+
+    def record(self, name: str, duration_ms: float) -> None:
+        with self._lock:
+            self._phases.append((name, duration_ms))
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, (time.perf_counter() - start) * 1000.0)
+
+    def phases(self) -> List[Tuple[str, float]]:
+        with self._lock:
+            return list(self._phases)
+
+    def as_dict(self) -> Dict[str, float]:
+        """Phase name -> total milliseconds (repeated names are summed)."""
+        out: Dict[str, float] = {}
+        for name, ms in self.phases():
+            out[name] = round(out.get(name, 0.0) + ms, 1)
+        return out
+
+    def server_timing(self, total_ms: Optional[float] = None) -> str:
+        """Render as a `Server-Timing` header value."""
+        parts = [f"{name};dur={ms:.1f}" for name, ms in self.phases()]
+        if total_ms is not None:
+            parts.append(f"total;dur={total_ms:.1f}")
+        return ", ".join(parts)
+
+
+_current_timer: ContextVar[Optional[PhaseTimer]] = ContextVar("phase_timer", default=None)
+
+
+def start_timer() -> PhaseTimer:
+    """Install a fresh timer for the current request context."""
+    timer = PhaseTimer()
+    _current_timer.set(timer)
+    return timer
+
+
+def current_timer() -> Optional[PhaseTimer]:
+    return _current_timer.get()
+
+
+@contextmanager
+def phase(name: str) -> Iterator[None]:
+    """Time a block under `name` if a request timer is active, as a trace span too."""
+    timer = _current_timer.get()
+    with span(name):
+        if timer is None:
+            yield
+            return
+        with timer.phase(name):
+            yield
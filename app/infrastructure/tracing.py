@@ -0,0 +1,278 @@
+"""Request-scoped span tracing.
+
+A trace starts at the API edge (new id, or continued from an incoming W3C
+`traceparent` / `X-Trace-Id` header). The current span lives in a ContextVar,
+so spans opened inside `asyncio.to_thread` workers (which copy the caller's
+context) become children of the request span. Finished spans are batched by a
+background thread and exported to a JSON-lines file and/or an OTLP/HTTP JSON
+endpoint (`/v1/traces` of a collector).
+"""
+from __future__ import annotations
+
+import json
+import logging
+import queue
+import secrets
+import threading
+import time
+import urllib.request
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+TRACE_ID_HEADER = "X-Trace-Id"
+SERVICE_NAME = "smartmedical-api"
+
+
+class Span:
+    __slots__ = ("trace_id", "span_id", "parent_id", "name", "start_ns", "end_ns", "attributes", "status")
+
+    def __init__(self, trace_id: str, name: str, parent_id: Optional[str] = None, attributes: Optional[Dict[str, Any]] = None):
+        self.trace_id = trace_id
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.name = name
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.attributes: Dict[str, Any] = dict(attributes or {})
+        self.status = "ok"
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start_ns": self.start_ns,
+            "end_ns": self.end_ns,
+            "duration_ms": round(((self.end_ns or self.start_ns) - self.start_ns) / 1e6, 3),
+            "status": self.status,
+            "attributes": self.attributes,
+        }
+
+    def to_otlp(self) -> Dict[str, Any]:
+        span: Dict[str, Any] = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": 1,
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns or self.start_ns),
+            "attributes": [{"key": k, "value": {"stringValue": str(v)}} for k, v in self.attributes.items()],
+            "status": {"code": 2 if self.status == "error" else 1},
+        }
+        if self.parent_id:
+            span["parentSpanId"] = self.parent_id
+        return span
+
+
+# ----- Exporters -----
+
+class JsonLinesExporter:
+    def __init__(self, path: str):
+        self.path = path
+
+    def export(self, spans: List[Span]) -> None:
+        with open(self.path, "a", encoding="utf-8") as fh:
+            for s in spans:
+                fh.write(json.dumps(s.to_dict(), ensure_ascii=False, default=str) + "\n")
+
+
+class OtlpHttpExporter:
+    """POSTs OTLP/HTTP JSON to a collector's traces endpoint."""
+
+    def __init__(self, url: str, timeout: float = 5.0):
+        self.url = url
+        self.timeout = timeout
+
+    def export(self, spans: List[Span]) -> None:
+        body = {
+            "resourceSpans": [{
+                "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": SERVICE_NAME}}]},
+                "scopeSpans": [{"scope": {"name": "app"}, "spans": [s.to_otlp() for s in spans]}],
+            }]
+        }
+        req = urllib.request.Request(
+            self.url,
+            data=json.dumps(body).encode("utf-8"),
+            headers={"Content-Type": "application/json"},
+            method="POST",
+        )
+        with urllib.request.urlopen(req, timeout=self.timeout):
+            pass
+
+
+class BatchSpanProcessor:
+    """Queues finished spans and exports them in batches from a daemon thread.
+
+    Never blocks the caller: spans are dropped when the queue is full.
+    """
+
+    def __init__(self, exporters: List[Any], max_queue: int = 10000, batch_size: int = 256, interval: float = 1.0):
+        self.exporters = exporters
+        self.batch_size = batch_size
+        self.interval = interval
+        self.dropped = 0
+        self._queue: "queue.Queue[Optional[Span]]" = queue.Queue(maxsize=max_queue)
+        self._thread = threading.Thread(target=self._worker, name="span-exporter", daemon=True)
+        self._thread.start()
+
+    def on_end(self, span: Span) -> None:
+        try:
+            self._queue.put_nowait(span)
+        except queue.Full:
+            self.dropped += 1
+
+    def _export(self, batch: List[Span]) -> None:
+        for exporter in self.exporters:
+            try:
+                exporter.export(batch)
+            except Exception:
+                logger.warning("Span export failed", exc_info=True)
+
+    def _worker(self) -> None:
+        batch: List[Span] = []
+        deadline = time.monotonic() + self.interval
+        while True:
+            try:
+                item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                item = None
+                if batch:
+                    self._export(batch)
+                    batch = []
+                deadline = time.monotonic() + self.interval
+                continue
+            if item is None:  # shutdown sentinel
+                if batch:
+                    self._export(batch)
+                return
+            batch.append(item)
+            if len(batch) >= self.batch_size:
+                self._export(batch)
+                batch = []
+                deadline = time.monotonic() + self.interval
+
+    def shutdown(self, timeout: float = 5.0) -> None:
+        self._queue.put(None)
+        self._thread.join(timeout)
+
+
+# ----- Context -----
+
+_current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+_processor: Optional[BatchSpanProcessor] = None
+
+
+def configure_tracing(settings) -> None:
+    """(Re)build the span processor from settings; tracing stays off without exporters."""
+    global _processor
+    shutdown_tracing()
+    if not settings.tracing_enabled:
+        return
+    exporters: List[Any] = []
+    if settings.trace_export_path:
+        exporters.append(JsonLinesExporter(settings.trace_export_path))
+    if settings.trace_otlp_url:
+        exporters.append(OtlpHttpExporter(settings.trace_otlp_url))
+    if exporters:
+        _processor = BatchSpanProcessor(exporters)
+
+
+def shutdown_tracing() -> None:
+    global _processor
+    if _processor is not None:
+        _processor.shutdown()
+        _processor = None
+
+
+def tracing_active() -> bool:
+    return _processor is not None
+
+
+def _parse_traceparent(value: Optional[str]):
+    # version-traceid-parentid-flags
+    parts = (value or "").strip().split("-")
+    if len(parts) == 4 and len(parts[1]) == 32 and len(parts[2]) == 16:
+        try:
+            int(parts[1], 16), int(parts[2], 16)
+        except ValueError:
+            return None, None
+        if parts[1] != "0" * 32:
+            return parts[1], parts[2]
+    return None, None
+
+
+def start_trace(name: str, traceparent: Optional[str] = None, trace_id: Optional[str] = None, **attributes: Any) -> Optional[Span]:
+    """Open the root (edge) span for a request and make it current. None when tracing is off."""
+    if _processor is None:
+        return None
+    tid, parent = _parse_traceparent(traceparent)
+    if tid is None and trace_id and len(trace_id) == 32:
+        try:
+            int(trace_id, 16)
+            tid = trace_id.lower()
+        except ValueError:
+            pass
+    root = Span(tid or secrets.token_hex(16), name, parent, attributes)
+    _current_span.set(root)
+    return root
+
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+def start_span(name: str, parent: Optional[Span] = None, **attributes: Any) -> Optional[Span]:
+    """Create a child span without making it current (for spans that end in another thread)."""
+    parent = parent or _current_span.get()
+    if parent is None or _processor is None:
+        return None
+    return Span(parent.trace_id, name, parent.span_id, attributes)
+
+
+def finish_span(span: Optional[Span], error: Optional[BaseException] = None) -> None:
+    if span is None:
+        return
+    span.end_ns = time.time_ns()
+    if error is not None:
+        span.status = "error"
+        span.attributes.setdefault("error", type(error).__name__)
+    processor = _processor
+    if processor is not None:
+        processor.on_end(span)
+
+
+@contextmanager
+def span(name: str, **attributes: Any) -> Iterator[Optional[Span]]:
+    """Child span of the current one, current for the duration of the block."""
+    s = start_span(name, **attributes)
+    if s is None:
+        yield None
+        return
+    token = _current_span.set(s)
+    error: Optional[BaseException] = None
+    try:
+        yield s
+    except BaseException as e:
+        error = e
+        raise
+    finally:
+        _current_span.reset(token)
+        finish_span(s, error)
+
+
+def traceparent_for(s: Span) -> str:
+    return f"00-{s.trace_id}-{s.span_id}-01"
+
+
+class TraceContextFilter(logging.Filter):
+    """Adds trace_id/span_id of the current span to every log record."""
+
+    def filter(self, record: logging.LogRecord) -> bool:  # type: ignore[override]
+        s = _current_span.get()
+        record.trace_id = s.trace_id if s is not None else "-"
+        record.span_id = s.span_id if s is not None else "-"
+        return True
@@ -0,0 +1,155 @@
+"""Opt-in WebDriver command profiler (and per-command trace spans).
+
+Every Selenium call is an HTTP round trip to the driver/node, and all of them
+(element commands included) go through `WebDriver.execute`. `instrument_driver`
+wraps that method on a driver instance to count and time each command by type
+and by the calling function in the `app.smartmedical` package, attributing it
+to the profile of the current request (a ContextVar that follows the request
+into worker threads).
+"""
+from __future__ import annotations
+
+import sys
+import threading
+import time
+from collections import OrderedDict
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.infrastructure.tracing import current_span, span
+
+_PACKAGE_PREFIX = "app.smartmedical"
+_MAX_STORED_PROFILES = 256
+
+
+class CommandProfile:
+    """Per-request command counts and time, by command and by call site."""
+
+    __slots__ = ("request_id", "owner", "_stats", "_lock")
+
+    def __init__(self, request_id: str) -> None:
+        self.request_id = request_id
+        # Principal of the request; only it may read the profile back
+        self.owner: Optional[str] = None
+        # (command, call site) -> [count, total ms]
+        self._stats: Dict[Tuple[str, str], List[float]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, command: str, call_site: str, duration_ms: float) -> None:
+        key = (command, call_site)
+        with self._lock:
+            entry = self._stats.get(key)
+            if entry is None:
+                self._stats[key] = [1, duration_ms]
+            else:
+                entry[0] += 1
+                entry[1] += duration_ms
+
+    @property
+    def total_commands(self) -> int:
+        with self._lock:
+            return int(sum(c for c, _ in self._stats.values()))
+
+    def summary(self) -> Dict[str, Any]:
+        with self._lock:
+            items = [(k, list(v)) for k, v in self._stats.items()]
+        by_command: Dict[str, Dict[str, float]] = {}
+        by_call_site: Dict[str, Dict[str, float]] = {}
+        for (command, site), (count, ms) in items:
+            for bucket, key in ((by_command, command), (by_call_site, site)):
+                agg = bucket.setdefault(key, {"count": 0, "ms": 0.0})
+                agg["count"] += count
+                agg["ms"] += ms
+
+        def _sorted(d: Dict[str, Dict[str, float]]) -> Dict[str, Dict[str, float]]:
+            return {k: {"count": int(v["count"]), "ms": round(v["ms"], 1)}
+                    for k, v in sorted(d.items(), key=lambda kv: -kv[1]["count"])}
+
+        return {
+            "request_id": self.request_id,
+            "total_commands": int(sum(c for _, (c, _) in items)),
+            "total_ms": round(sum(ms for _, (_, ms) in items), 1),
+            "by_command": _sorted(by_command),
+            "by_call_site": _sorted(by_call_site),
+        }
+
+    def header_value(self, top: int = 5) -> str:
+        """Compact form for a debug response header."""
+        s = self.summary()
+        top_cmds = ",".join(f"{k}:{v['count']}" for k, v in list(s["by_command"].items())[:top])
+        return f"commands={s['total_commands']}; ms={s['total_ms']}; top={top_cmds}"
+
+
+_current_profile: ContextVar[Optional[CommandProfile]] = ContextVar("webdriver_profile", default=None)
+# Keyed by (owner, request id): request ids are client-supplied and may collide across tenants
+_profiles: "OrderedDict[Tuple[Optional[str], str], CommandProfile]" = OrderedDict()
+_profiles_lock = threading.Lock()
+
+
+def start_profile(request_id: str) -> CommandProfile:
+    profile = CommandProfile(request_id)
+    _current_profile.set(profile)
+    return profile
+
+
+def current_profile() -> Optional[CommandProfile]:
+    return _current_profile.get()
+
+
+def bind_profile_owner(owner: str) -> None:
+    """Attribute the current request's profile (if any) to the authenticated principal."""
+    profile = _current_profile.get()
+    if profile is not None and profile.owner is None:
+        profile.owner = owner
+
+
+def store_profile(profile: CommandProfile) -> None:
+    """Keep a finished profile for /debug/profile lookups (bounded, oldest evicted)."""
+    key = (profile.owner, profile.request_id)
+    with _profiles_lock:
+        _profiles[key] = profile
+        _profiles.move_to_end(key)
+        while len(_profiles) > _MAX_STORED_PROFILES:
+            _profiles.popitem(last=False)
+
+
+def get_profile(request_id: str, owner: str) -> Optional[CommandProfile]:
+    with _profiles_lock:
+        return _profiles.get((owner, request_id))
+
+
+def _call_site() -> str:
+    """First caller frame inside app.smartmedical, as module.function:line."""
+    frame = sys._getframe(2)
+    while frame is not None:
+        module = frame.f_globals.get("__name__", "")
+        if module.startswith(_PACKAGE_PREFIX):
+            return f"{module[len(_PACKAGE_PREFIX) + 1:]}.{frame.f_code.co_name}:{frame.f_lineno}"
+        frame = frame.f_back
+    return "other"
+
+
+def instrument_driver(driver):
+    """Wrap `driver.execute` to record commands into the current request's
+    profile and, when a trace is active, as `webdriver <command>` spans.
+    """
+    if getattr(driver, "_sm_profiled", False):
+        return driver
+    original = driver.execute
+
+    def execute(driver_command: str, params: Optional[dict] = None):
+        profile = _current_profile.get()
+        if profile is None and current_span() is None:
+            return original(driver_command, params)
+        site = _call_site()
+        start = time.perf_counter()
+        try:
+            with span(f"webdriver {driver_command}", call_site=site):
+                return original(driver_command, params)
+        finally:
+            if profile is not None:
+                profile.record(driver_command, site, (time.perf_counter() - start) * 1000.0)
+
+    driver.execute = execute
+    driver._sm_profiled = True
+    return driver
@@ -0,0 +1,293 @@
+"""Batched, retried webhook delivery.
+
+Events are queued per callback URL and batched by a daemon thread into one
+JSON body per URL and flush (`{"events": [...]}`), so a scrape that matches many
+watches of one client costs that client one request. Batches are POSTed by a
+small pool of delivery threads, at most one per URL at a time, so a slow or
+hanging target holds one delivery thread and delays only its own events. A
+failed batch is retried with exponential backoff and dropped after
+`max_attempts`; delivery never blocks the caller.
+
+Callback URLs are client-supplied, so delivery only connects to public
+addresses: the address actually connected to is checked, for the first request
+and every redirect, and private, loopback, link-local (cloud metadata) and
+reserved targets are refused (WATCH_WEBHOOK_ALLOW_PRIVATE lifts this for
+development). With WATCH_WEBHOOK_SECRET set, each body is signed:
+`X-Webhook-Signature: sha256=<HMAC-SHA256 of "<X-Webhook-Timestamp>.<body>">`.
+"""
+from __future__ import annotations
+
+import hashlib
+import heapq
+import hmac
+import http.client
+import ipaddress
+import json
+import logging
+import queue
+import socket
+import threading
+import time
+import urllib.request
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+from app.core.config import get_settings
+from app.infrastructure.metrics import WEBHOOK_DELIVERIES
+
+logger = logging.getLogger(__name__)
+
+
+class UnsafeWebhookTarget(ValueError):
+    pass
+
+
+def is_public_address(address: str) -> bool:
+    ip = ipaddress.ip_address(address.split("%", 1)[0])
+    if ip.version == 6 and ip.ipv4_mapped is not None:
+        ip = ip.ipv4_mapped
+    return ip.is_global and not ip.is_multicast
+
+
+def check_callback_url(url: str) -> None:
+    """Reject callback URLs that are not http(s) or name a non-public host literally (no DNS lookup)."""
+    parts = urlsplit(url)
+    if parts.scheme not in ("http", "https") or not parts.hostname:
+        raise UnsafeWebhookTarget("callback_url must be an http(s) URL")
+    host = parts.hostname.rstrip(".").lower()
+    if host == "localhost" or host.endswith(".localhost"):
+        raise UnsafeWebhookTarget("callback_url must not point to a local address")
+    try:
+        public = is_public_address(host)
+    except ValueError:
+        return  # a name; checked against what it resolves to at delivery
+    if not public:
+        raise UnsafeWebhookTarget("callback_url must not point to a private address")
+
+
+def _connect_public(address, timeout=socket._GLOBAL_DEFAULT_TIMEOUT, source_address=None):
+    sock = socket.create_connection(address, timeout, source_address)
+    peer = sock.getpeername()[0]
+    if not is_public_address(peer):
+        sock.close()
+        raise UnsafeWebhookTarget(f"Webhook target {address[0]} resolves to non-public address {peer}")
+    return sock
+
+
+class _PublicHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, *args: Any, **kwargs: Any):
+        super().__init__(*args, **kwargs)
+        self._create_connection = _connect_public
+
+
+class _PublicHTTPSConnection(http.client.HTTPSConnection):
+    def __init__(self, *args: Any, **kwargs: Any):
+        super().__init__(*args, **kwargs)
+        self._create_connection = _connect_public
+
+
+class _PublicHTTPHandler(urllib.request.HTTPHandler):
+    def http_open(self, req):
+        return self.do_open(_PublicHTTPConnection, req)
+
+
+class _PublicHTTPSHandler(urllib.request.HTTPSHandler):
+    def https_open(self, req):
+        return self.do_open(_PublicHTTPSConnection, req, context=self._context)
+
+
+# No proxies from the environment: the peer check must see the real target
+_public_opener = urllib.request.build_opener(urllib.request.ProxyHandler({}), _PublicHTTPHandler, _PublicHTTPSHandler)
+_any_opener = urllib.request.build_opener(urllib.request.ProxyHandler({}))
+
+
+def sign_body(secret: str, timestamp: str, data: bytes) -> str:
+    return "sha256=" + hmac.new(secret.encode("utf-8"), timestamp.encode("ascii") + b"." + data, hashlib.sha256).hexdigest()
+
+
+def post_json(
+    url: str,
+    body: Dict[str, Any],
+    timeout: float,
+    secret: Optional[str] = None,
+    allow_private: bool = False,
+) -> None:
+    data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+    headers = {"Content-Type": "application/json", "User-Agent": "smartmedical-api-webhooks"}
+    if secret:
+        timestamp = str(int(time.time()))
+        headers["X-Webhook-Timestamp"] = timestamp
+        headers["X-Webhook-Signature"] = sign_body(secret, timestamp, data)
+    if not allow_private:
+        check_callback_url(url)
+    req = urllib.request.Request(url, data=data, headers=headers, method="POST")
+    opener = _any_opener if allow_private else _public_opener
+    with opener.open(req, timeout=timeout):
+        pass
+
+
+class WebhookDispatcher:
+    def __init__(
+        self,
+        interval: float = 1.0,
+        batch_size: int = 100,
+        max_attempts: int = 5,
+        backoff: float = 1.0,
+        timeout: float = 5.0,
+        max_queue: int = 10000,
+        secret: Optional[str] = None,
+        allow_private: bool = False,
+        workers: int = 4,
+    ):
+        self.interval = interval
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.timeout = timeout
+        self.secret = secret
+        self.allow_private = allow_private
+        self.dropped = 0
+        self._queue: "queue.Queue[Optional[Tuple[str, Dict[str, Any]]]]" = queue.Queue(maxsize=max_queue)
+        # (due, seq, url, events, attempt)
+        self._retries: List[Tuple[float, int, str, List[Dict[str, Any]], int]] = []
+        self._retries_lock = threading.Lock()
+        self._seq = 0
+        # url -> batches waiting for it, as (events, attempt); a URL is in here while a delivery thread owns it
+        self._lanes: Dict[str, Deque[Tuple[List[Dict[str, Any]], int]]] = {}
+        self._lanes_lock = threading.Lock()
+        self._ready: "queue.Queue[Optional[str]]" = queue.Queue()
+        self._thread = threading.Thread(target=self._worker, name="webhook-dispatcher", daemon=True)
+        self._thread.start()
+        self._senders = [
+            threading.Thread(target=self._sender, name=f"webhook-delivery-{i}", daemon=True)
+            for i in range(max(1, workers))
+        ]
+        for t in self._senders:
+            t.start()
+
+    def enqueue(self, url: str, event: Dict[str, Any]) -> None:
+        try:
+            self._queue.put_nowait((url, event))
+        except queue.Full:
+            self.dropped += 1
+            WEBHOOK_DELIVERIES.inc(outcome="dropped")
+
+    def _deliver(self, url: str, events: List[Dict[str, Any]], attempt: int) -> None:
+        try:
+            post_json(url, {"events": events}, self.timeout, self.secret, self.allow_private)
+        except UnsafeWebhookTarget as e:
+            # Not retried: the target will not become public by waiting
+            WEBHOOK_DELIVERIES.inc(outcome="rejected")
+            logger.warning("Webhook target rejected", extra={"url": url, "events": len(events), "error": str(e)})
+            return
+        except Exception as e:
+            if attempt >= self.max_attempts:
+                WEBHOOK_DELIVERIES.inc(outcome="failed")
+                logger.warning("Webhook delivery abandoned", extra={"url": url, "events": len(events), "attempts": attempt, "error": str(e)})
+                return
+            WEBHOOK_DELIVERIES.inc(outcome="retried")
+            due = time.monotonic() + self.backoff * (2 ** (attempt - 1))
+            with self._retries_lock:
+                self._seq += 1
+                heapq.heappush(self._retries, (due, self._seq, url, events, attempt + 1))
+            return
+        WEBHOOK_DELIVERIES.inc(outcome="delivered")
+
+    def _submit(self, url: str, events: List[Dict[str, Any]], attempt: int) -> None:
+        """Queue a batch behind the URL's earlier ones; hand the URL to a delivery thread if none has it."""
+        with self._lanes_lock:
+            lane = self._lanes.get(url)
+            if lane is not None:
+                lane.append((events, attempt))
+                return
+            self._lanes[url] = deque([(events, attempt)])
+        self._ready.put(url)
+
+    def _sender(self) -> None:
+        while True:
+            url = self._ready.get()
+            if url is None:  # shutdown sentinel
+                return
+            while True:
+                with self._lanes_lock:
+                    lane = self._lanes[url]
+                    if not lane:
+                        del self._lanes[url]
+                        break
+                    events, attempt = lane.popleft()
+                self._deliver(url, events, attempt)
+
+    def _flush(self, pending: Dict[str, List[Dict[str, Any]]]) -> None:
+        for url, events in pending.items():
+            for i in range(0, len(events), self.batch_size):
+                self._submit(url, events[i:i + self.batch_size], 1)
+        pending.clear()
+
+    def _run_due_retries(self) -> None:
+        now = time.monotonic()
+        while True:
+            with self._retries_lock:
+                if not self._retries or self._retries[0][0] > now:
+                    return
+                _, _, url, events, attempt = heapq.heappop(self._retries)
+            self._submit(url, events, attempt)
+
+    def _worker(self) -> None:
+        pending: Dict[str, List[Dict[str, Any]]] = {}
+        deadline = time.monotonic() + self.interval
+        while True:
+            with self._retries_lock:
+                wake = deadline if not self._retries else min(deadline, self._retries[0][0])
+            try:
+                item = self._queue.get(timeout=max(0.0, wake - time.monotonic()))
+            except queue.Empty:
+                item = ()
+            if item is None:  # shutdown sentinel
+                self._flush(pending)
+                return
+            if item:
+                url, event = item
+                pending.setdefault(url, []).append(event)
+            if time.monotonic() >= deadline:
+                self._flush(pending)
+                deadline = time.monotonic() + self.interval
+            self._run_due_retries()
+
+    def shutdown(self, timeout: float = 5.0) -> None:
+        """Flush what is queued (pending retries are abandoned) and stop the threads."""
+        deadline = time.monotonic() + timeout
+        self._queue.put(None)
+        self._thread.join(timeout)
+        for _ in self._senders:
+            self._ready.put(None)
+        for t in self._senders:
+            t.join(max(0.0, deadline - time.monotonic()))
+
+
+_dispatcher: WebhookDispatcher | None = None
+_dispatcher_lock = threading.Lock()
+
+
+def get_webhook_dispatcher() -> WebhookDispatcher:
+    global _dispatcher
+    with _dispatcher_lock:
+        if _dispatcher is None:
+            s = get_settings()
+            _dispatcher = WebhookDispatcher(
+                interval=s.watch_webhook_batch_seconds,
+                max_attempts=s.watch_webhook_max_attempts,
+                backoff=s.watch_webhook_backoff_seconds,
+                secret=s.watch_webhook_secret,
+                allow_private=s.watch_webhook_allow_private,
+                workers=s.watch_webhook_workers,
+            )
+        return _dispatcher
+
+
+def shutdown_webhooks() -> None:
+    global _dispatcher
+    with _dispatcher_lock:
+        dispatcher, _dispatcher = _dispatcher, None
+    if dispatcher is not None:
+        dispatcher.shutdown()
@@ -1,9 +1,10 @@
 """SmartMedical domain package."""
 
-from .navigation import navigate_to_timetable_nr10  # re-export for convenience
+from .navigation import navigate_to_calendar, navigate_to_timetable_nr10  # re-export for convenience
 from . import selectors  # keep selectors importable via package
 
 __all__ = [
+    "navigate_to_calendar",
     "navigate_to_timetable_nr10",
     "selectors",
 ]
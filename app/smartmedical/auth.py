@@ -9,73 +9,86 @@ from __future__ import annotations
 from typing import Optional
 
 from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.common.exceptions import TimeoutException
 
 from app.core.config import get_settings
+from app.infrastructure.metrics import PORTAL_AUTH
 from app.infrastructure.selenium_client import browser
+from app.infrastructure.timing import phase
+from app.smartmedical.circuit_breaker import guarded
 from app.smartmedical import selectors as sm_sel
 from app.smartmedical.otp import generate_otp
+from app.smartmedical.waits import wait_until
 
+@guarded("login")
 def perform_login(driver, username: str, password: str, timeout: Optional[int] = None) -> bool:
     """Log in using a provided driver and credentials. Returns True on success.
 
     Handles two-factor authentication by generating and entering an OTP code.
+    Waits are adaptive (see waits.py); `timeout` caps each of them.
     Raises RuntimeError on timeout or unexpected page state.
     """
     settings = get_settings()
-    wait_timeout = timeout or settings.request_timeout
-
-    wait = WebDriverWait(driver, wait_timeout)
-    driver.get(settings.smartmedical_base_url)
 
+    step = "login"
     try:
-        # Wait for inputs
-        wait.until(EC.presence_of_element_located((By.XPATH, sm_sel.XPATH_USERNAME_INPUT)))
-
-        u_input = driver.find_element(By.XPATH, sm_sel.XPATH_USERNAME_INPUT)
-        p_input = driver.find_element(By.XPATH, sm_sel.XPATH_PASSWORD_INPUT)
-        try:
-            u_input.clear()
-            p_input.clear()
-        except Exception:
-            # Some inputs may not support clear(); continue
-            pass
-
-        u_input.send_keys(username)
-        p_input.send_keys(password)
-        driver.find_element(By.XPATH, sm_sel.XPATH_LOGIN_BUTTON).click()
-        
-        # Wait for TFA code input to be clickable
-        wait.until(EC.element_to_be_clickable((By.XPATH, sm_sel.XPATH_TFA_CODE_INPUT)))
-
-        # Generate OTP if secret is available
-        if settings.smartmedical_otp_secret:
-            otp_code = generate_otp(settings.smartmedical_otp_secret)
-
-            # Enter OTP code
-            tfa_input = driver.find_element(By.XPATH, sm_sel.XPATH_TFA_CODE_INPUT)
-            tfa_input.clear()
-            tfa_input.send_keys(otp_code)
-
-            # Click continue button
-            driver.find_element(By.XPATH, sm_sel.XPATH_CONTINUE_TFA_BUTTON).click()
-        else:
-            raise RuntimeError("OTP secret key not provided but TFA is enabled")
-
-        # # Handle pop-up in a separate iFrame
-        # try:
-        #     wait.until(EC.frame_to_be_available_and_switch_to_it((By.XPATH, sm_sel.XPATH_POPUP_IFRAME)))
-        #     wait.until(EC.element_to_be_clickable((By.XPATH, sm_sel.XPATH_CLOSE_POPUP))).click()
-        # except Exception:
-        #     pass
-
-        driver.switch_to.default_content()
-        wait.until(EC.presence_of_element_located((By.XPATH, sm_sel.XPATH_TIMETABLE_MENU_LINK)))
+        with phase("login"):
+            driver.get(settings.smartmedical_base_url)
+
+            # Wait for inputs
+            wait_until(driver, "login_form", EC.presence_of_element_located((By.XPATH, sm_sel.XPATH_USERNAME_INPUT)), timeout)
+
+            u_input = driver.find_element(By.XPATH, sm_sel.XPATH_USERNAME_INPUT)
+            p_input = driver.find_element(By.XPATH, sm_sel.XPATH_PASSWORD_INPUT)
+            try:
+                u_input.clear()
+                p_input.clear()
+            except Exception:
+                # Some inputs may not support clear(); continue
+                pass
+
+            u_input.send_keys(username)
+            p_input.send_keys(password)
+            driver.find_element(By.XPATH, sm_sel.XPATH_LOGIN_BUTTON).click()
+
+            # Wait for TFA code input to be clickable
+            wait_until(driver, "tfa_input", EC.element_to_be_clickable((By.XPATH, sm_sel.XPATH_TFA_CODE_INPUT)), timeout)
+        PORTAL_AUTH.inc(step="login", outcome="success")
+
+        step = "tfa"
+        with phase("tfa"):
+            # Generate OTP if secret is available
+            if settings.smartmedical_otp_secret:
+                otp_code = generate_otp(settings.smartmedical_otp_secret)
+
+                # Enter OTP code
+                tfa_input = driver.find_element(By.XPATH, sm_sel.XPATH_TFA_CODE_INPUT)
+                tfa_input.clear()
+                tfa_input.send_keys(otp_code)
+
+                # Click continue button
+                driver.find_element(By.XPATH, sm_sel.XPATH_CONTINUE_TFA_BUTTON).click()
+            else:
+                raise RuntimeError("OTP secret key not provided but TFA is enabled")
+
+            # # Handle pop-up in a separate iFrame
+            # try:
+            #     wait.until(EC.frame_to_be_available_and_switch_to_it((By.XPATH, sm_sel.XPATH_POPUP_IFRAME)))
+            #     wait.until(EC.element_to_be_clickable((By.XPATH, sm_sel.XPATH_CLOSE_POPUP))).click()
+            # except Exception:
+            #     pass
+
+            driver.switch_to.default_content()
+            wait_until(driver, "post_login_menu", EC.presence_of_element_located((By.XPATH, sm_sel.XPATH_TIMETABLE_MENU_LINK)), timeout)
+        PORTAL_AUTH.inc(step="tfa", outcome="success")
         return True
     except TimeoutException as e:
+        PORTAL_AUTH.inc(step=step, outcome="failure")
         raise RuntimeError("Login timed out before reaching the post-login page.") from e
+    except Exception:
+        PORTAL_AUTH.inc(step=step, outcome="failure")
+        raise
 
 
 def login(
@@ -91,13 +104,12 @@ def login(
     settings = get_settings()
     user = username or settings.smartmedical_username
     pwd = password or settings.smartmedical_password
-    wait_timeout = timeout or settings.request_timeout
 
     if not user or not pwd:
         raise ValueError("SmartMedical credentials are not provided (username/password).")
 
     if driver is not None:
-        return perform_login(driver, user, pwd, wait_timeout)
+        return perform_login(driver, user, pwd, timeout)
     # Manage driver automatically
     with browser() as drv:
-        return perform_login(drv, user, pwd, wait_timeout)
\ No newline at end of file
+        return perform_login(drv, user, pwd, timeout)
\ No newline at end of file
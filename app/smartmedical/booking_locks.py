@@ -0,0 +1,120 @@
+"""In-process locks on the slots being booked, so concurrent bookings of one slot do not race in the portal.
+
+A lease covers [start, end) minutes of one (calendar, date); a second booking
+whose interval overlaps a held lease is rejected at once (`SlotBusy`) instead
+of running its own browser flow. The lease is taken before the portal job is
+queued and released when the request ends (completion, timeout, cancellation);
+if the job's worker thread is still driving the browser at that point, the
+lease is kept until that thread finishes.
+"""
+from __future__ import annotations
+
+import threading
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from app.core.config import get_settings
+from app.infrastructure.metrics import BOOKING_LOCK_CONFLICTS
+from app.smartmedical.scrape_timetable import _to_minutes
+from app.smartmedical.slot_index import SlotIndex, get_slot_index
+
+class SlotBusy(RuntimeError):
+    pass
+
+
+@dataclass(slots=True, eq=False)
+class SlotLease:
+    key: Tuple[str, str]
+    start: int
+    end: int
+    owner: "BookingLocks" = field(repr=False)
+    # Route plus a running worker thread
+    holders: int = 1
+
+    def release(self) -> None:
+        self.owner._release(self)
+
+    def guard(self, func: Callable[..., Dict[str, Any]]) -> Callable[..., Dict[str, Any]]:
+        """Wrap a portal job so the lease also stays held while it runs in its worker thread.
+
+        A job that only starts after the lease was released (the request gave up
+        while it was queued) does not run: another booking may hold the slot by now.
+        """
+
+        def run(*args, **kwargs) -> Dict[str, Any]:
+            if not self.owner._retain(self):
+                return {"status": "unavailable", "message": "Booking abandoned before it started; the slot lock was released."}
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.owner._release(self)
+
+        run.__name__ = getattr(func, "__name__", "job")
+        return run
+
+
+class BookingLocks:
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._held: Dict[Tuple[str, str], List[SlotLease]] = {}
+
+    def acquire(self, calendar: str, date: str, start: int, end: int) -> SlotLease:
+        """Lease [start, end) of `date` in `calendar`; raises SlotBusy if it overlaps a held lease."""
+        key = (calendar, date)
+        with self._lock:
+            held = self._held.setdefault(key, [])
+            for lease in held:
+                if lease.start < end and start < lease.end:
+                    BOOKING_LOCK_CONFLICTS.inc()
+                    raise SlotBusy(f"A booking for {date} overlapping this time is already in progress")
+            lease = SlotLease(key, start, end, self)
+            held.append(lease)
+            return lease
+
+    def _retain(self, lease: SlotLease) -> bool:
+        with self._lock:
+            if lease.holders <= 0:
+                return False
+            lease.holders += 1
+            return True
+
+    def _release(self, lease: SlotLease) -> None:
+        with self._lock:
+            if lease.holders <= 0:
+                return
+            lease.holders -= 1
+            if lease.holders:
+                return
+            held = self._held.get(lease.key, [])
+            if lease in held:
+                held.remove(lease)
+            if not held:
+                self._held.pop(lease.key, None)
+
+    def held(self, calendar: str, date: str) -> List[Tuple[int, int]]:
+        with self._lock:
+            return [(lease.start, lease.end) for lease in self._held.get((calendar, date), [])]
+
+
+def booking_interval(calendar: str, date: str, time: str, index: Optional[SlotIndex] = None) -> Tuple[int, int]:
+    """Minutes [start, end) a booking at `time` occupies.
+
+    The length is the slot interval the index knows for that time, else BOOKING_LOCK_MINUTES.
+    """
+    start = _to_minutes(time)
+    if start is None:
+        raise ValueError(f"Invalid time format: {time}")
+    length = get_settings().booking_lock_minutes
+    index = index if index is not None else get_slot_index()
+    for slot in index.query(date_from=date, date_to=date, calendar=calendar):
+        if slot.start <= start < slot.end and slot.interval:
+            length = slot.interval
+            break
+    return start, start + max(1, length)
+
+
+_locks = BookingLocks()
+
+
+def get_booking_locks() -> BookingLocks:
+    return _locks
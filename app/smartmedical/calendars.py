@@ -0,0 +1,77 @@
+"""Registry of portal calendars (timetable rows) the service scrapes and books in.
+
+Configured with CALENDARS, a JSON object from a short key (used as `calendar=`
+in the API and on every slot) to the calendar's row in the portal's timetable
+list: its row id, or its visible label. The first entry is the default.
+"""
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+from app.core.config import get_settings
+from app.smartmedical import selectors as sm_sel
+
+
+@dataclass(slots=True, frozen=True)
+class Calendar:
+    key: str
+    row_id: Optional[str] = None
+    name: Optional[str] = None
+
+    @property
+    def row_xpath(self) -> str:
+        if self.row_id:
+            return sm_sel.XPATH_CALENDAR_ROW_BY_ID.format(row_id=self.row_id)
+        return sm_sel.XPATH_CALENDAR_ROW_BY_NAME.format(name=self.name)
+
+
+class UnknownCalendar(ValueError):
+    pass
+
+
+def _parse(key: str, spec: Any) -> Calendar:
+    if isinstance(spec, str):
+        spec = {"row_id": spec}
+    if not isinstance(spec, dict) or not (spec.get("row_id") or spec.get("name")):
+        raise ValueError(f"CALENDARS[{key!r}] needs a row id or {{\"row_id\": ...}} / {{\"name\": ...}}")
+    for value in (spec.get("row_id"), spec.get("name")):
+        if value and "'" in value:
+            raise ValueError(f"CALENDARS[{key!r}] must not contain quotes")
+    return Calendar(key=key, row_id=spec.get("row_id"), name=spec.get("name"))
+
+
+_cache: Optional[tuple] = None
+
+
+def get_calendars() -> Dict[str, Calendar]:
+    """Configured calendars in configuration order (rebuilt when settings change)."""
+    global _cache
+    s = get_settings()
+    if _cache is None or _cache[0] is not s:
+        calendars = {key: _parse(key, spec) for key, spec in s.calendars.items()}
+        if not calendars:
+            raise ValueError("CALENDARS is empty")
+        _cache = (s, calendars)
+    return _cache[1]
+
+
+def default_calendar() -> Calendar:
+    return next(iter(get_calendars().values()))
+
+
+def resolve_calendar(key: Optional[str]) -> Calendar:
+    """The calendar for `key` (None = the default); raises UnknownCalendar."""
+    if key is None:
+        return default_calendar()
+    try:
+        return get_calendars()[key]
+    except KeyError:
+        raise UnknownCalendar(f"Unknown calendar: {key}") from None
+
+
+def resolve_calendars(keys: Optional[List[str]] = None) -> List[Calendar]:
+    """Calendars for `keys`, or all of them."""
+    if keys is None:
+        return list(get_calendars().values())
+    return [resolve_calendar(k) for k in keys]
@@ -0,0 +1,186 @@
+"""Circuit breakers around the portal, one per phase (login, navigation, scrape, booking).
+
+Each breaker counts consecutive failed calls of its phase; a call slower than
+the phase's CIRCUIT_SLOW_CALL_SECONDS counts as failed too. At
+CIRCUIT_FAILURE_THRESHOLD the breaker opens and calls of that phase raise
+`PortalUnavailable` at once instead of waiting out the portal's timeouts.
+After CIRCUIT_RESET_SECONDS one call is let through as a probe (half-open):
+its success closes the breaker, its failure opens it again.
+
+Routes check `open_phases()` before queuing portal work, so an outage costs a
+fast 503 (or, for /timetable, the last snapshot marked stale) rather than a
+worker thread.
+"""
+from __future__ import annotations
+
+import functools
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from typing import Any, Callable, ContextManager, Dict, Iterable, Iterator, Optional, TypeVar
+
+from app.core.config import get_settings
+from app.infrastructure.metrics import PORTAL_CIRCUIT_REJECTIONS, PORTAL_CIRCUIT_STATE
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+PHASES = ("login", "navigation", "scrape", "booking")
+_STATE_VALUE = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+T = TypeVar("T")
+
+
+class PortalUnavailable(RuntimeError):
+    def __init__(self, phase: str, retry_after: float):
+        super().__init__(f"SmartMedical portal unavailable ({phase} failing); retry in {retry_after:.0f}s")
+        self.phase = phase
+        self.retry_after = retry_after
+
+
+class _Call:
+    """Handle of one guarded call; `failed()` marks an outcome that raised no exception as a failure."""
+
+    __slots__ = ("ok",)
+
+    def __init__(self) -> None:
+        self.ok = True
+
+    def failed(self) -> None:
+        self.ok = False
+
+
+class CircuitBreaker:
+    def __init__(self, phase: str, failure_threshold: int, reset_timeout: float, slow_call: Optional[float] = None):
+        self.phase = phase
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.slow_call = slow_call
+        self.state = CLOSED
+        self.failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def retry_after(self) -> Optional[float]:
+        """Seconds until calls are let through again, or None if a call would be allowed now."""
+        with self._lock:
+            if self.state == CLOSED:
+                return None
+            remaining = self._opened_at + self.reset_timeout - time.monotonic()
+            if self.state == OPEN and remaining <= 0:
+                return None
+            # Open, or half-open with its probe in flight
+            return max(remaining, 1.0)
+
+    def allow(self) -> None:
+        """Admit one call or raise PortalUnavailable; the caller must `record` its outcome."""
+        with self._lock:
+            if self.state == CLOSED:
+                return
+            remaining = self._opened_at + self.reset_timeout - time.monotonic()
+            if self.state == OPEN and remaining <= 0:
+                self._set(HALF_OPEN)
+            if self.state == HALF_OPEN and not self._probing:
+                self._probing = True
+                return
+        PORTAL_CIRCUIT_REJECTIONS.inc(phase=self.phase)
+        raise PortalUnavailable(self.phase, max(remaining, 1.0))
+
+    def record(self, ok: bool, duration: float) -> None:
+        if ok and self.slow_call is not None and duration > self.slow_call:
+            ok = False
+        with self._lock:
+            self._probing = False
+            if ok:
+                self.failures = 0
+                self._set(CLOSED)
+                return
+            self.failures += 1
+            if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+                self._set(OPEN)
+
+    def reset(self) -> None:
+        with self._lock:
+            self.failures = 0
+            self._probing = False
+            self._set(CLOSED)
+
+    def _set(self, state: str) -> None:
+        self.state = state
+        PORTAL_CIRCUIT_STATE.set(_STATE_VALUE[state], phase=self.phase)
+
+    @contextmanager
+    def call(self) -> Iterator[_Call]:
+        """Guard a block: raise if open, record failure on exception, slowness or `failed()`."""
+        self.allow()
+        handle = _Call()
+        started = time.monotonic()
+        ok = False
+        try:
+            yield handle
+            ok = handle.ok
+        finally:
+            self.record(ok, time.monotonic() - started)
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(phase: str) -> CircuitBreaker:
+    breaker = _breakers.get(phase)
+    if breaker is None:
+        with _breakers_lock:
+            breaker = _breakers.get(phase)
+            if breaker is None:
+                s = get_settings()
+                breaker = CircuitBreaker(
+                    phase,
+                    s.circuit_failure_threshold,
+                    s.circuit_reset_seconds,
+                    s.circuit_slow_call_seconds.get(phase),
+                )
+                _breakers[phase] = breaker
+    return breaker
+
+
+def portal_circuit(phase: str) -> ContextManager[_Call]:
+    """`with portal_circuit("scrape") as call:` guards one portal call of `phase`."""
+    if not get_settings().circuit_breaker_enabled:
+        return nullcontext(_Call())
+    return get_breaker(phase).call()
+
+
+def guarded(phase: str) -> Callable[[Callable[..., T]], Callable[..., T]]:
+    """Decorator form of `portal_circuit`: the whole function is one call of `phase`."""
+
+    def decorate(func: Callable[..., T]) -> Callable[..., T]:
+        @functools.wraps(func)
+        def wrapper(*args: Any, **kwargs: Any) -> T:
+            with portal_circuit(phase):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorate
+
+
+def open_phases(phases: Iterable[str] = PHASES) -> Dict[str, float]:
+    """Phases whose breaker currently rejects calls -> seconds until it probes again."""
+    if not get_settings().circuit_breaker_enabled:
+        return {}
+    out: Dict[str, float] = {}
+    for p in phases:
+        retry = get_breaker(p).retry_after()
+        if retry is not None:
+            out[p] = retry
+    return out
+
+
+def breaker_states() -> Dict[str, str]:
+    return {p: get_breaker(p).state for p in PHASES}
+
+
+def reset_breakers() -> None:
+    with _breakers_lock:
+        _breakers.clear()
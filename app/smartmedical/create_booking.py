@@ -1,16 +1,32 @@
 from __future__ import annotations
-from typing import Any, Dict, Optional
+import logging
+import re
+import time
+from typing import Any, Dict, List, Optional, Tuple
 
 from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 
 from app.core.config import get_settings
-from app.infrastructure.selenium_client import browser
-from app.smartmedical.auth import login as sm_login
-from app.smartmedical.navigation import navigate_to_timetable_nr10
+from app.infrastructure.timing import phase
 from app.smartmedical import selectors as sm_sel
-from app.smartmedical.scrape_timetable import _scrape_week, _to_minutes, _parse_time_range_and_doctor_from_work
+from app.smartmedical.calendars import UnknownCalendar, resolve_calendar
+from app.smartmedical.circuit_breaker import portal_circuit
+from app.smartmedical.navigation import enter_calendar_frame
+from app.smartmedical.scrape_timetable import (
+    _compute_week_intervals,
+    _parse_time_range_and_doctor_from_res,
+    _parse_time_range_and_doctor_from_work,
+    _read_day_elements,
+    _scrape_week,
+    _to_minutes,
+)
+from app.smartmedical.session_pool import portal_session
+from app.smartmedical.slot_index import get_slot_index
+from app.smartmedical.snapshot_store import record_snapshot
+from app.smartmedical.waits import wait_until
+
+logger = logging.getLogger(__name__)
 
 
 def _find_clickable_timeslot_for(driver, want_date: str, want_time: str):
@@ -45,6 +61,130 @@ def _find_clickable_timeslot_for(driver, want_date: str, want_time: str):
     return None
 
 
+def _match_reservation(
+    reservations: List[Tuple[str, Optional[str]]],
+    reservation_ids: List[str],
+    want_min: int,
+    last_name: str,
+) -> Optional[str]:
+    """Element id of the reservation starting at `want_min` whose title carries the patient's last name, or None.
+
+    Another reservation at that minute (someone else's, made concurrently) never confirms this booking.
+    """
+    if not last_name:
+        return None
+    want = last_name.casefold()
+    for (title, _date), elem_id in zip(reservations, reservation_ids):
+        start_s, _end, _doc = _parse_time_range_and_doctor_from_res(title)
+        if start_s is not None and _to_minutes(start_s) == want_min and want in title.casefold():
+            return elem_id
+    return None
+
+
+def _booking_id(elem_id: str) -> Optional[str]:
+    # e.g. "res_101000" -> "101000"
+    m = re.search(r"\d+", elem_id or "")
+    return m.group(0) if m else None
+
+
+def _confirm_booking(driver, calendar: str, date: str, want_min: int, last_name: str, timeout: float) -> Tuple[bool, Optional[str]]:
+    """Re-read the booked day until the new reservation shows up; patch that day into the slot index.
+
+    Returns (confirmed, booking_id).
+    """
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            enter_calendar_frame(driver)
+            work, reservations, reservation_ids = _read_day_elements(driver, date)
+        except Exception:
+            work, reservations, reservation_ids = [], [], []
+        elem_id = _match_reservation(reservations, reservation_ids, want_min, last_name)
+        if elem_id is not None:
+            break
+        if time.monotonic() >= deadline:
+            return False, None
+        time.sleep(0.5)
+
+    # Write-through: readers see the booking without waiting for the next full scrape
+    if work:
+        week = _compute_week_intervals(work, reservations, calendar)
+        get_slot_index().patch_day(date, calendar, week.free)
+        record_snapshot(week)
+    return True, _booking_id(elem_id)
+
+
+def _submit_reservation(
+    driver, call, date: str, time: str, first_name: str, last_name: str, phone: str, notes: Optional[str]
+) -> Optional[Dict[str, Any]]:
+    """Open the reservation form of the slot at date/time, fill it in and save. Returns an error dict or None.
+
+    Only the portal misbehaving (form not opening, fields or button missing) is
+    reported to the circuit breaker `call`; a slot that is not there or not at
+    the requested time is about the request, not the portal.
+    """
+    # Click a suitable timeslot element that covers the desired time
+    el = _find_clickable_timeslot_for(driver, date, time)
+    if el is None:
+        return {"status": "error", "message": "Could not locate a clickable timeslot element."}
+    try:
+        try:
+            el.click()
+        except Exception:
+            driver.execute_script("arguments[0].click();", el)
+    except Exception:
+        call.failed()
+        return {"status": "error", "message": "Failed to click on the timeslot element."}
+
+    # Wait for reservation iframe and switch to it
+    with phase("reservation_iframe"):
+        try:
+            # Ensure we are in top-level context where the popup iframe is usually injected
+            try:
+                driver.switch_to.default_content()
+            except Exception:
+                pass
+            wait_until(driver, "reservation_iframe", EC.frame_to_be_available_and_switch_to_it((By.XPATH, sm_sel.XPATH_RESERVATION_IFRAME)))
+        except Exception:
+            call.failed()
+            return {"status": "error", "message": "Reservation iframe did not appear."}
+
+    # Locate the time_from field in the reservation form and verify it matches
+    time_from_field = wait_until(driver, "reservation_form", EC.presence_of_element_located((By.XPATH, sm_sel.XPATH_TIME_FROM)))
+    time_from_value = time_from_field.get_attribute("value")
+
+    if _to_minutes(time_from_value) != _to_minutes(time): return {"status": "error", "message": "Reservation form time_from field does not match."}
+
+    # Fill in name, surname, and notes
+    with phase("fill_form"):
+        try:
+            fn = wait_until(driver, "reservation_field", EC.presence_of_element_located((By.XPATH, sm_sel.XPATH_INPUT_FIRST_NAME)))
+            ln = wait_until(driver, "reservation_field", EC.presence_of_element_located((By.XPATH, sm_sel.XPATH_INPUT_LAST_NAME)))
+            pn = wait_until(driver, "reservation_field", EC.presence_of_element_located((By.XPATH, sm_sel.XPATH_INPUT_PHONE)))
+            nt = wait_until(driver, "reservation_field", EC.presence_of_element_located((By.XPATH, sm_sel.XPATH_TEXTAREA_NOTES)))
+            try:
+                pn.clear(); fn.clear(); ln.clear(); nt.clear()
+            except Exception:
+                pass
+            fn.send_keys(first_name)
+            ln.send_keys(last_name)
+            pn.send_keys(phone)
+            if notes: nt.send_keys(notes)
+        except Exception:
+            call.failed()
+            return {"status": "error", "message": "Failed to fill reservation form fields."}
+
+    # Press submit
+    with phase("submit"):
+        try:
+            save_btn = wait_until(driver, "save_button", EC.presence_of_element_located((By.XPATH, sm_sel.XPATH_SAVE_BUTTON)))
+            driver.execute_script("arguments[0].click();", save_btn)
+        except Exception:
+            call.failed()
+            return {"status": "error", "message": "Failed to submit the reservation form."}
+    return None
+
+
 def create_booking(
     *,
     date: str,
@@ -53,49 +193,50 @@ def create_booking(
     last_name: str,
     phone: str,
     notes: Optional[str] = None,
+    calendar: Optional[str] = None,
 ) -> Dict[str, Any]:
     """Create a booking at SmartMedical calendar for the given date/time.
 
     Steps:
-    - Login and navigate to the timetable (Nr_10)
+    - Login and navigate to the timetable of `calendar` (default calendar if None)
     - Ensure the week containing `date` is visible (advance up to 5 weeks)
     - Check availability using scraping helpers (no overlapping Reservation)
     - Click the corresponding WorkTimeNotEditable slot
     - Switch to reservation iframe and fill patient details (name, surname, notes)
+    - Submit, then re-read the day until the reservation appears (BOOKING_CONFIRM_TIMEOUT)
+      and patch the day into the slot index
 
-    Returns a dict compatible with BookingResponse: {status, booking_id?, message?}
+    Returns a dict compatible with BookingResponse: {status, booking_id?, confirmed?, message?}
     """
     settings = get_settings()
 
     if not (settings.smartmedical_username and settings.smartmedical_password):
         return {"status": "error", "message": "SmartMedical credentials are not provided (username/password)."}
 
-    with browser() as driver:
-        # Authenticate and navigate
-        sm_login(driver=driver)
-        navigate_to_timetable_nr10(driver)
+    try:
+        cal = resolve_calendar(calendar)
+    except UnknownCalendar as e:
+        return {"status": "error", "message": str(e)}
 
+    # Logged in and on the calendar (pooled session when enabled)
+    with portal_session(cal) as driver:
         # Try up to 5 weeks to locate the requested date
         found_week = False
         available = False
         for i in range(5):
-            free_slots, week_dates = _scrape_week(driver, settings)
-            if date in week_dates:
+            with phase(f"scrape_week_{i}"):
+                week = _scrape_week(driver, settings, cal.key)
+            record_snapshot(week)
+            if date in week.dates:
                 found_week = True
                 # Determine if requested time is within a free interval for the date
                 want_min = _to_minutes(time)
                 if want_min is None:
                     return {"status": "error", "message": f"Invalid time format: {time}"}
-                for s in free_slots:
-                    try:
-                        if s.get("date") == date:
-                            s_min = _to_minutes(s.get("start"))
-                            e_min = _to_minutes(s.get("end"))
-                            if s_min is not None and e_min is not None and s_min <= want_min < e_min:
-                                available = True
-                                break
-                    except Exception:
-                        continue
+                for s in week.free:
+                    if s.date == date and s.start <= want_min < s.end:
+                        available = True
+                        break
                 break
             # Advance to next week if not yet found
             try:
@@ -110,59 +251,17 @@ def create_booking(
         if not available:
             return {"status": "unavailable", "message": f"No free slot at {date} {time}."}
 
-        # Click a suitable timeslot element that covers the desired time
-        el = _find_clickable_timeslot_for(driver, date, time)
-        if el is None:
-            return {"status": "error", "message": "Could not locate a clickable timeslot element."}
-        try:
-            try:
-                el.click()
-            except Exception:
-                driver.execute_script("arguments[0].click();", el)
-        except Exception:
-            return {"status": "error", "message": "Failed to click on the timeslot element."}
-
-        # Wait for reservation iframe and switch to it
-        wait = WebDriverWait(driver, settings.request_timeout)
-        try:
-            # Ensure we are in top-level context where the popup iframe is usually injected
-            try:
-                driver.switch_to.default_content()
-            except Exception:
-                pass
-            wait.until(EC.frame_to_be_available_and_switch_to_it((By.XPATH, sm_sel.XPATH_RESERVATION_IFRAME)))
-        except Exception:
-            return {"status": "error", "message": "Reservation iframe did not appear."}
-
-        # Locate the time_from field in the reservation form and verify it matches
-        time_from_field = wait.until(EC.presence_of_element_located((By.XPATH, sm_sel.XPATH_TIME_FROM)))
-        time_from_value = time_from_field.get_attribute("value")
-
-        if time_from_value != time: return {"status": "error", "message": "Reservation form time_from field does not match."}
-
-        # Fill in name, surname, and notes
-        try:
-            fn = wait.until(EC.presence_of_element_located((By.XPATH, sm_sel.XPATH_INPUT_FIRST_NAME)))
-            ln = wait.until(EC.presence_of_element_located((By.XPATH, sm_sel.XPATH_INPUT_LAST_NAME)))
-            pn = wait.until(EC.presence_of_element_located((By.XPATH, sm_sel.XPATH_INPUT_PHONE)))
-            nt = wait.until(EC.presence_of_element_located((By.XPATH, sm_sel.XPATH_TEXTAREA_NOTES)))
-            try:
-                pn.clear(); fn.clear(); ln.clear(); nt.clear()
-            except Exception:
-                pass
-            fn.send_keys(first_name)
-            ln.send_keys(last_name)
-            pn.send_keys(phone)
-            if notes: nt.send_keys(notes)
-        except Exception:
-            return {"status": "error", "message": "Failed to fill reservation form fields."}
-
-        # Press submit
-        try:
-            save_btn = wait.until(EC.presence_of_element_located((By.XPATH, sm_sel.XPATH_SAVE_BUTTON)))
-            driver.execute_script("arguments[0].click();", save_btn)
-        except Exception:
-            return {"status": "error", "message": "Failed to submit the reservation form."}
+        # The portal part of the booking; its failures count towards the booking circuit breaker
+        with portal_circuit("booking") as call:
+            error = _submit_reservation(driver, call, date, time, first_name, last_name, phone, notes)
+            if error is not None:
+                return error
 
-        # Consider the booking initiated
-        return {"status": "ok", "message": "Reservation form submitted successfully."}
+        with phase("confirm"):
+            confirmed, booking_id = _confirm_booking(
+                driver, cal.key, date, _to_minutes(time), last_name, settings.booking_confirm_timeout
+            )
+        if not confirmed:
+            # Submitted, but not (yet) visible in the calendar
+            return {"status": "ok", "confirmed": False, "message": "Reservation form submitted; reservation not yet visible in the calendar."}
+        return {"status": "ok", "booking_id": booking_id, "confirmed": True, "message": "Reservation confirmed."}
@@ -5,7 +5,7 @@ view for a specific department/doctor entry.
 
 Current flow implemented:
 - Directly click the hidden Timetable link with id `sm-31` (no hover required).
-- Click the Nr_10 row (id `item-77-0`) to reach the calendar.
+- Click the calendar's row (see `calendars`; the default Nr_10 row is `item-77-0`).
 
 These functions expect that authentication has already been performed and that the
 post-login page is loaded.
@@ -16,26 +16,32 @@ import time
 from typing import Optional
 
 from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.common.exceptions import TimeoutException
 
-from app.core.config import get_settings
+from app.infrastructure.timing import phase
+from app.smartmedical.circuit_breaker import guarded
 from app.smartmedical import selectors as sm_sel
+from app.smartmedical.calendars import Calendar, resolve_calendar
+from app.smartmedical.waits import observe_wait, wait_timeout, wait_until
 
 
-def _wait_for_calendar_loaded(driver, timeout: int) -> bool:
+def _wait_for_calendar_loaded(driver, timeout: Optional[float] = None) -> bool:
     """Heuristic wait until a calendar/timetable view seems loaded.
 
     Tries multiple known calendar container XPaths and also checks URL hints.
+    The wait is adaptive (wait point "calendar_loaded"), capped by `timeout`.
     """
-    end = time.time() + timeout
+    limit = wait_timeout("calendar_loaded", timeout)
+    started = time.time()
+    end = started + limit
     last_url = None
     while time.time() < end:
         # Element candidates
         for xp in getattr(sm_sel, "XPATH_CALENDAR_CONTAINER_CANDIDATES", []):
             try:
                 if driver.find_elements(By.XPATH, xp):
+                    observe_wait("calendar_loaded", time.time() - started)
                     return True
             except Exception:
                 pass
@@ -45,33 +51,39 @@ def _wait_for_calendar_loaded(driver, timeout: int) -> bool:
             if current_url != last_url:
                 last_url = current_url
                 if any(k in current_url.lower() for k in ["calendar", "reservations", "timetable", "agenda"]):
+                    observe_wait("calendar_loaded", time.time() - started)
                     return True
         except Exception:
             pass
         time.sleep(0.5)
+    observe_wait("calendar_loaded", limit, timed_out=True)
     return False
 
 
 def navigate_to_timetable_nr10(driver, timeout: Optional[int] = None) -> bool:
-    """Navigate from the SmartMedical main page to the timetable (calendar) page for Nr_10.
+    """Navigate to the default calendar (Nr_10 unless CALENDARS says otherwise)."""
+    return navigate_to_calendar(driver, None, timeout)
+
+
+@phase("navigate")
+@guarded("navigation")
+def navigate_to_calendar(driver, calendar: Optional[Calendar] = None, timeout: Optional[int] = None) -> bool:
+    """Navigate from the SmartMedical main page to the timetable (calendar) page of `calendar`.
 
     This function:
     - Waits for the post-login header container (ensuring we are logged in)
     - Clicks the hidden timetable link (id sm-31) via JavaScript to avoid hover
-    - Clicks the Nr_10 row (tr id item-77-0)
+    - Clicks the calendar's row (default calendar when None)
     - If a new window is opened, switches to it
     - Waits for the calendar page to be loaded using heuristics
 
     Returns True on success, otherwise raises RuntimeError on timeout.
     """
-    settings = get_settings()
-    wait_timeout = timeout or settings.request_timeout
-
-    wait = WebDriverWait(driver, wait_timeout)
+    calendar = calendar or resolve_calendar(None)
 
     try:
         # Click the hidden menu link directly (no hover): //a[@id='sm-31'] in default content
-        menu_link = wait.until(EC.presence_of_element_located((By.XPATH, sm_sel.XPATH_TIMETABLE_MENU_LINK)))
+        menu_link = wait_until(driver, "timetable_menu_link", EC.presence_of_element_located((By.XPATH, sm_sel.XPATH_TIMETABLE_MENU_LINK)), timeout)
         try:
             driver.execute_script("arguments[0].click();", menu_link)
         except Exception:
@@ -81,30 +93,30 @@ def navigate_to_timetable_nr10(driver, timeout: Optional[int] = None) -> bool:
             except Exception:
                 pass
 
-        # Switch into the main content iframe before clicking Nr_10
+        # Switch into the main content iframe before clicking the calendar row
         try:
             driver.switch_to.default_content()
         except Exception:
             pass
-        wait.until(EC.frame_to_be_available_and_switch_to_it((By.XPATH, sm_sel.XPATH_MAIN_IFRAME)))
+        wait_until(driver, "main_iframe", EC.frame_to_be_available_and_switch_to_it((By.XPATH, sm_sel.XPATH_MAIN_IFRAME)), timeout)
         # Inside main iframe there is a frameset with left and right frames; go to right content frame
         try:
-            wait.until(EC.frame_to_be_available_and_switch_to_it((By.XPATH, sm_sel.XPATH_RIGHT_FRAME)))
+            wait_until(driver, "right_frame", EC.frame_to_be_available_and_switch_to_it((By.XPATH, sm_sel.XPATH_RIGHT_FRAME)), timeout)
         except Exception:
             # If right frame not available immediately, try brief fallback wait then proceed
             try:
-                WebDriverWait(driver, 2).until(EC.frame_to_be_available_and_switch_to_it((By.XPATH, sm_sel.XPATH_RIGHT_FRAME)))
+                wait_until(driver, "right_frame_retry", EC.frame_to_be_available_and_switch_to_it((By.XPATH, sm_sel.XPATH_RIGHT_FRAME)), 2)
             except Exception:
                 pass
 
-        # Wait for the Nr_10 row and click it
+        # Wait for the calendar's row and click it
         pre_handles = set(driver.window_handles)
-        nr10_row = wait.until(EC.presence_of_element_located((By.XPATH, sm_sel.XPATH_NR10_ROW)))
+        row = wait_until(driver, "calendar_row", EC.presence_of_element_located((By.XPATH, calendar.row_xpath)), timeout)
         try:
-            nr10_row.click()
+            row.click()
         except Exception:
             try:
-                driver.execute_script("arguments[0].click();", nr10_row)
+                driver.execute_script("arguments[0].click();", row)
             except Exception:
                 pass
 
@@ -120,9 +132,9 @@ def navigate_to_timetable_nr10(driver, timeout: Optional[int] = None) -> bool:
             # After switching window, reset and try to switch into iframe -> right content frame again if present
             try:
                 driver.switch_to.default_content()
-                WebDriverWait(driver, 5).until(EC.frame_to_be_available_and_switch_to_it((By.XPATH, sm_sel.XPATH_MAIN_IFRAME)))
+                wait_until(driver, "popup_main_iframe", EC.frame_to_be_available_and_switch_to_it((By.XPATH, sm_sel.XPATH_MAIN_IFRAME)), 5)
                 try:
-                    WebDriverWait(driver, 5).until(EC.frame_to_be_available_and_switch_to_it((By.XPATH, sm_sel.XPATH_RIGHT_FRAME)))
+                    wait_until(driver, "popup_right_frame", EC.frame_to_be_available_and_switch_to_it((By.XPATH, sm_sel.XPATH_RIGHT_FRAME)), 5)
                 except Exception:
                     pass
             except Exception:
@@ -130,9 +142,23 @@ def navigate_to_timetable_nr10(driver, timeout: Optional[int] = None) -> bool:
                 pass
 
         # Final wait for calendar content
-        if not _wait_for_calendar_loaded(driver, wait_timeout):
-            raise RuntimeError("Calendar view did not load in time after navigating to Nr_10.")
+        if not _wait_for_calendar_loaded(driver, timeout):
+            raise RuntimeError(f"Calendar view did not load in time after navigating to {calendar.key}.")
 
         return True
     except TimeoutException as e:
-        raise RuntimeError("Navigation to timetable Nr_10 timed out.") from e
+        raise RuntimeError(f"Navigation to calendar {calendar.key} timed out.") from e
+
+
+def enter_calendar_frame(driver, timeout: float = 5) -> None:
+    """Switch from any frame (e.g. the reservation popup) back to the frame showing the calendar."""
+    driver.switch_to.default_content()
+    try:
+        wait_until(driver, "main_iframe", EC.frame_to_be_available_and_switch_to_it((By.XPATH, sm_sel.XPATH_MAIN_IFRAME)), timeout)
+    except Exception:
+        # No main iframe: the calendar is in the top-level document
+        return
+    try:
+        wait_until(driver, "right_frame", EC.frame_to_be_available_and_switch_to_it((By.XPATH, sm_sel.XPATH_RIGHT_FRAME)), timeout)
+    except Exception:
+        pass
@@ -0,0 +1,51 @@
+"""Background timetable refresh (stale-while-revalidate).
+
+At most one refresh runs at a time. It runs in a fresh context, so it is not
+attributed to (or limited by the quota of) the request that triggered it.
+"""
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import logging
+from typing import Optional
+
+from app.core.config import get_settings
+from app.infrastructure.portal_jobs import run_portal_job
+from app.smartmedical.scrape_timetable import fetch_timetable
+from app.smartmedical.slot_index import get_slot_index
+
+logger = logging.getLogger(__name__)
+
+_task: Optional[asyncio.Task] = None
+
+
+async def refresh_timetable() -> None:
+    """Scrape the timetable and replace the slot index."""
+    resp = await run_portal_job(fetch_timetable)
+    get_slot_index().replace(resp["slots"])
+
+
+async def _run() -> None:
+    try:
+        async with asyncio.timeout(get_settings().request_timeout):
+            await refresh_timetable()
+        logger.info("Background timetable refresh finished")
+    except Exception:
+        logger.warning("Background timetable refresh failed", exc_info=True)
+
+
+def schedule_refresh() -> bool:
+    """Start a background refresh unless one is running. Must be called on the event loop."""
+    global _task
+    s = get_settings()
+    if not (s.smartmedical_username and s.smartmedical_password):
+        return False
+    if _task is not None and not _task.done():
+        return False
+    _task = asyncio.get_running_loop().create_task(_run(), context=contextvars.Context())
+    return True
+
+
+def refresh_in_progress() -> bool:
+    return _task is not None and not _task.done()
@@ -6,56 +6,66 @@ slots. Actual table scraping is not implemented yet.
 """
 from __future__ import annotations
 
+import contextvars
+import logging
 import re
+import sys
 import time
-from typing import Any, Dict, List, Optional, Tuple
-from datetime import date
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import replace
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from datetime import date, datetime
 from math import gcd
 
 from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 
 from app.core.config import get_settings
-from app.infrastructure.selenium_client import browser
-from app.smartmedical.auth import login as sm_login
-from app.smartmedical.navigation import navigate_to_timetable_nr10
+from app.infrastructure.metrics import SCRAPE_WEEK_DURATION, SCRAPE_WEEK_SLOTS
+from app.infrastructure.timing import phase
 from app.smartmedical import selectors as sm_sel
+from app.smartmedical.calendars import Calendar, resolve_calendar, resolve_calendars
+from app.smartmedical.circuit_breaker import guarded
+from app.smartmedical.session_pool import portal_session
+from app.smartmedical.slots import Slot, WeekIntervals
+from app.smartmedical.snapshot_store import record_snapshot
+from app.smartmedical.waits import wait_until
 
-def fetch_timetable() -> Dict[str, Any]:
+logger = logging.getLogger(__name__)
+
+
+def fetch_timetable(calendars: Optional[List[str]] = None) -> Dict[str, Any]:
     """Fetch free timetable slots for the next 5 weeks from SmartMedical.
 
-    Simplified per requirements: just scrape the current week and then click
-    "next week" 4 times. No filters, no signatures, no placeholders.
+    Scrapes every configured calendar (or those in `calendars`), several at a
+    time on separate portal sessions (CALENDAR_SCRAPE_CONCURRENCY), and merges
+    them into one list. Any calendar failing fails the whole fetch, so the
+    result is always a complete snapshot.
     """
     settings = get_settings()
-    scraped_slots: List[Dict[str, Any]] = []
 
     if not (settings.smartmedical_username and settings.smartmedical_password):
         raise ValueError("SmartMedical credentials are not provided (username/password).")
 
-    with browser() as driver:
-        sm_login(driver=driver)
-        navigate_to_timetable_nr10(driver)
-
-        for i in range(5):
-            week_free, _ = _scrape_week(driver, settings)
-            scraped_slots.extend(week_free)
-
-            if i < 4:
-                try:
-                    next_btn = driver.find_element(By.XPATH, sm_sel.XPATH_WEEK_NEXT_BUTTON)
-                    try:
-                        driver.execute_script("arguments[0].click();", next_btn)
-                    except Exception:
-                        next_btn.click()
-                    time.sleep(1.0)
-                except Exception:
-                    break
+    targets = resolve_calendars(calendars)
+    workers = min(len(targets), _scrape_concurrency(settings))
+    scraped_slots: List[Slot] = []
+    if workers <= 1:
+        for calendar in targets:
+            scraped_slots.extend(_fetch_calendar(calendar, settings))
+    else:
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="calendar-scrape") as executor:
+            # Each worker runs in a copy of this context: same request timer and trace
+            futures = [
+                executor.submit(contextvars.copy_context().run, _fetch_calendar, calendar, settings)
+                for calendar in targets
+            ]
+            for future in futures:
+                scraped_slots.extend(future.result())
 
     # Filter out slots with dates that have already passed
     today_iso = date.today().isoformat()
-    future_slots = [s for s in scraped_slots if isinstance(s, dict) and s.get("date") and s["date"] >= today_iso]
+    future_slots = [s for s in scraped_slots if s.date >= today_iso]
 
     return {
         "doctor": None,
@@ -65,7 +75,99 @@ def fetch_timetable() -> Dict[str, Any]:
     }
 
 
-def _scrape_week(driver, settings) -> Tuple[List[Dict[str, Any]], List[str]]:
+def _scrape_concurrency(settings) -> int:
+    return max(1, settings.calendar_scrape_concurrency or settings.portal_session_pool_size)
+
+
+def _fetch_calendar(calendar: Calendar, settings) -> List[Slot]:
+    """Scrape the current and next 4 weeks of one calendar."""
+    slots: List[Slot] = []
+    with portal_session(calendar) as driver:
+        for i in range(5):
+            with phase(f"scrape_week_{i}"):
+                week = _scrape_week(driver, settings, calendar.key)
+            record_snapshot(week)
+            slots.extend(week.free)
+
+            if i < 4 and not _advance_week(driver):
+                break
+    return slots
+
+
+def find_next_available(
+    doctor: Optional[str] = None,
+    min_minutes: int = 0,
+    weeks: int = 5,
+    calendar: Optional[str] = None,
+) -> Optional[Slot]:
+    """Return the earliest free slot of one calendar, scraping week by week from today.
+
+    Stops at the first week that contains a match, so most lookups need a
+    single `_scrape_week`. Returns None if nothing matches within `weeks`.
+    """
+    settings = get_settings()
+
+    if not (settings.smartmedical_username and settings.smartmedical_password):
+        raise ValueError("SmartMedical credentials are not provided (username/password).")
+
+    cal = resolve_calendar(calendar)
+    with portal_session(cal) as driver:
+        for i in range(weeks):
+            with phase(f"scrape_week_{i}"):
+                week = _scrape_week(driver, settings, cal.key)
+            record_snapshot(week)
+            match = _earliest_slot(week.free, doctor, min_minutes)
+            if match is not None:
+                return match
+            if i < weeks - 1 and not _advance_week(driver):
+                break
+    return None
+
+
+def _earliest_slot(
+    slots: List[Slot],
+    doctor: Optional[str] = None,
+    min_minutes: int = 0,
+) -> Optional[Slot]:
+    """Pick the earliest slot that is not in the past, optionally for one doctor
+    and with at least `min_minutes` of free time left. Today's slots are clipped
+    to the current minute.
+    """
+    now = datetime.now()
+    today_iso = now.date().isoformat()
+    now_m = now.hour * 60 + now.minute
+    want_doc = (doctor or "").strip().casefold() or None
+
+    best: Optional[Slot] = None
+    for s in slots:
+        if s.date < today_iso:
+            continue
+        if want_doc is not None and (s.doctor or "").strip().casefold() != want_doc:
+            continue
+        start_m = max(s.start, now_m) if s.date == today_iso else s.start
+        if s.end - start_m < max(min_minutes, 1):
+            continue
+        if best is None or (s.date, start_m) < (best.date, best.start):
+            best = s if start_m == s.start else replace(s, start=start_m)
+    return best
+
+
+def _advance_week(driver) -> bool:
+    """Click the calendar's "next week" arrow. Returns False if it is missing."""
+    try:
+        next_btn = driver.find_element(By.XPATH, sm_sel.XPATH_WEEK_NEXT_BUTTON)
+        try:
+            driver.execute_script("arguments[0].click();", next_btn)
+        except Exception:
+            next_btn.click()
+        time.sleep(1.0)
+        return True
+    except Exception:
+        return False
+
+
+@guarded("scrape")
+def _scrape_week(driver, settings, calendar: Optional[str] = None) -> WeekIntervals:
     """Scrape a single week and compute free intervals per day.
 
     Algorithm per requirements:
@@ -73,47 +175,43 @@ def _scrape_week(driver, settings) -> Tuple[List[Dict[str, Any]], List[str]]:
     - Occupied intervals per day come from elements //div[@class='Reservation'].
     - Free intervals = union(Potential) minus union(Occupied), computed per day.
     """
-    wait = WebDriverWait(driver, settings.request_timeout)
+    started = time.monotonic()
     try:
         # Wait for at least the potential work time elements to appear (best-effort)
-        wait.until(EC.presence_of_all_elements_located((By.XPATH, sm_sel.XPATH_ALL_TIMESLOTS)))
+        wait_until(driver, "timeslots", EC.presence_of_all_elements_located((By.XPATH, sm_sel.XPATH_ALL_TIMESLOTS)))
     except Exception:
         pass
 
-    all_elems = driver.find_elements(By.XPATH, sm_sel.XPATH_ALL_TIMESLOTS)
-    res_elems = driver.find_elements(By.XPATH, sm_sel.XPATH_ALL_RESERVATIONS)
+    work, reservations = _read_week_elements(driver)
+    week = _compute_week_intervals(work, reservations, calendar)
+    SCRAPE_WEEK_DURATION.observe(time.monotonic() - started)
+    SCRAPE_WEEK_SLOTS.observe(len(week.free))
+    return week
 
-    # Keyed by (date, doctor)
-    pot_map: Dict[Tuple[str, Optional[str]], List[Tuple[int, int]]] = {}
-    res_map: Dict[Tuple[str, Optional[str]], List[Tuple[int, int]]] = {}
-    # Reservations with no doctor parsed will be subtracted from all doctors on that date
-    res_unknown_by_date: Dict[str, List[Tuple[int, int]]] = {}
 
-    week_dates: set[str] = set()
+def _read_week_elements(driver) -> Tuple[List[Tuple[str, Optional[str]]], List[Tuple[str, Optional[str]]]]:
+    """Read (title, date) pairs for the visible week's work-time and reservation elements.
 
-    # Collect potential intervals from WorkTimeNotEditable
+    This is the only part of week scraping that talks to the browser; the rest
+    is the pure `_compute_week`.
+    """
+    all_elems = driver.find_elements(By.XPATH, sm_sel.XPATH_ALL_TIMESLOTS)
+    res_elems = driver.find_elements(By.XPATH, sm_sel.XPATH_ALL_RESERVATIONS)
+
+    work: List[Tuple[str, Optional[str]]] = []
     for el in all_elems:
         try:
             title = el.get_attribute("title") or ""
             elem_id = el.get_attribute("id") or ""
-            start_s, end_s, doc = _parse_time_range_and_doctor_from_work(title)
             date = _extract_date_from_id(elem_id) or _closest_date_via_dom(driver, el)
-            if not (start_s and end_s and date):
-                continue
-            start_m, end_m = _to_minutes(start_s), _to_minutes(end_s)
-            if start_m is None or end_m is None or end_m <= start_m:
-                continue
-            doc = (doc or "").strip() or None
-            week_dates.add(date)
-            pot_map.setdefault((date, doc), []).append((start_m, end_m))
+            work.append((title, date))
         except Exception:
             continue
 
-    # Collect occupied intervals from Reservation
+    reservations: List[Tuple[str, Optional[str]]] = []
     for el in res_elems:
         try:
             title = el.get_attribute("title") or ""
-            start_s, end_s, doc = _parse_time_range_and_doctor_from_res(title)
             # Try to resolve date via DOM proximity
             date = _closest_date_via_dom(driver, el)
             if not date:
@@ -122,20 +220,97 @@ def _scrape_week(driver, settings) -> Tuple[List[Dict[str, Any]], List[str]]:
                     date = _extract_date_from_id(container.get_attribute("id"))
                 except Exception:
                     date = None
-            if not (start_s and end_s and date):
-                continue
-            start_m, end_m = _to_minutes(start_s), _to_minutes(end_s)
-            if start_m is None or end_m is None or end_m <= start_m:
-                continue
-            week_dates.add(date)
-            doc = (doc or "").strip() or None
-            if doc is None:
-                res_unknown_by_date.setdefault(date, []).append((start_m, end_m))
-            else:
-                res_map.setdefault((date, doc), []).append((start_m, end_m))
+            reservations.append((title, date))
         except Exception:
             continue
 
+    return work, reservations
+
+
+# Title and id of every work-time/reservation element of one day (date from the element or an ancestor id)
+_READ_DAY_JS = """
+var day = arguments[0], out = [];
+var els = document.querySelectorAll("div.WorkTimeNotEditable, div.Reservation");
+for (var i = 0; i < els.length; i++) {
+  var el = els[i], p = el;
+  for (var j = 0; j < 10 && p; j++, p = p.parentElement) {
+    var m = p.id && p.id.match(/(\\d{4}-\\d{2}-\\d{2})/);
+    if (m) { if (m[1] === day) out.push([el.className, el.getAttribute("title") || "", el.id || ""]); break; }
+  }
+}
+return out;
+"""
+
+
+def _read_day_elements(driver, day: str) -> Tuple[List[Tuple[str, Optional[str]]], List[Tuple[str, Optional[str]]], List[str]]:
+    """Work-time and reservation (title, date) pairs of one visible day, in one browser round trip.
+
+    Also returns the reservation element ids, parallel to the reservations.
+    """
+    work: List[Tuple[str, Optional[str]]] = []
+    reservations: List[Tuple[str, Optional[str]]] = []
+    reservation_ids: List[str] = []
+    for cls, title, elem_id in driver.execute_script(_READ_DAY_JS, day) or []:
+        if cls == "Reservation":
+            reservations.append((title, day))
+            reservation_ids.append(elem_id)
+        else:
+            work.append((title, day))
+    return work, reservations, reservation_ids
+
+
+def _compute_week(
+    work: Iterable[Tuple[str, Optional[str]]],
+    reservations: Iterable[Tuple[str, Optional[str]]],
+) -> Tuple[List[Slot], List[str]]:
+    """Compute free slots from (title, date) pairs of work-time and reservation elements."""
+    week = _compute_week_intervals(work, reservations)
+    return week.free, week.dates
+
+
+def _compute_week_intervals(
+    work: Iterable[Tuple[str, Optional[str]]],
+    reservations: Iterable[Tuple[str, Optional[str]]],
+    calendar: Optional[str] = None,
+) -> WeekIntervals:
+    """Like _compute_week, keeping the merged work and occupied intervals as well."""
+    # Keyed by (date, doctor)
+    pot_map: Dict[Tuple[str, Optional[str]], List[Tuple[int, int]]] = {}
+    res_map: Dict[Tuple[str, Optional[str]], List[Tuple[int, int]]] = {}
+    # Reservations with no doctor parsed will be subtracted from all doctors on that date
+    res_unknown_by_date: Dict[str, List[Tuple[int, int]]] = {}
+
+    week_dates: set[str] = set()
+
+    # Collect potential intervals from WorkTimeNotEditable
+    for title, date in work:
+        start_s, end_s, doc = _parse_time_range_and_doctor_from_work(title)
+        if not (start_s and end_s and date):
+            continue
+        start_m, end_m = _to_minutes(start_s), _to_minutes(end_s)
+        if start_m is None or end_m is None or end_m <= start_m:
+            continue
+        doc = _intern((doc or "").strip() or None)
+        date = sys.intern(date)
+        week_dates.add(date)
+        pot_map.setdefault((date, doc), []).append((start_m, end_m))
+
+    # Collect occupied intervals from Reservation
+    for title, date in reservations:
+        start_s, end_s, doc = _parse_time_range_and_doctor_from_res(title)
+        if not (start_s and end_s and date):
+            continue
+        start_m, end_m = _to_minutes(start_s), _to_minutes(end_s)
+        if start_m is None or end_m is None or end_m <= start_m:
+            continue
+        date = sys.intern(date)
+        week_dates.add(date)
+        doc = _intern((doc or "").strip() or None)
+        if doc is None:
+            res_unknown_by_date.setdefault(date, []).append((start_m, end_m))
+        else:
+            res_map.setdefault((date, doc), []).append((start_m, end_m))
+
     # Infer base interval per (date, doctor) from raw potentials and reservations
     interval_map: Dict[Tuple[str, Optional[str]], Optional[int]] = {}
     for key, pots in pot_map.items():
@@ -145,7 +320,9 @@ def _scrape_week(driver, settings) -> Tuple[List[Dict[str, Any]], List[str]]:
         interval_map[key] = _infer_interval(pots, occ_for_doc + occ_unknown)
 
     # Compute free intervals per (date, doctor): union(potential) - union(reservations)
-    free_slots: List[Dict[str, Any]] = []
+    free_slots: List[Slot] = []
+    work_merged: Dict[Tuple[str, Optional[str]], List[Tuple[int, int]]] = {}
+    occ_merged: Dict[Tuple[str, Optional[str]], List[Tuple[int, int]]] = {}
     # Determine all doctor keys present in potentials
     for (date, doc) in sorted(pot_map.keys(), key=lambda k: (k[0], k[1] or "")):
         pot = _merge_intervals(pot_map.get((date, doc), []))
@@ -156,20 +333,13 @@ def _scrape_week(driver, settings) -> Tuple[List[Dict[str, Any]], List[str]]:
         # Merge both occupied sets
         occ = _merge_intervals(occ_for_doc + occ_unknown)
         free = _subtract_intervals(pot, occ)
+        work_merged[(date, doc)] = pot
+        occ_merged[(date, doc)] = occ
         inferred = interval_map.get((date, doc))
         for start_m, end_m in free:
-            slot = {
-                "date": date,
-                "start": _to_hhmm(start_m),
-                "end": _to_hhmm(end_m),
-                "doctor": doc,
-                "type": "free",
-            }
-            if inferred is not None:
-                slot["interval"] = str(inferred)
-            free_slots.append(slot)
+            free_slots.append(Slot(date, start_m, end_m, doc, inferred, calendar))
 
-    return free_slots, sorted(week_dates)
+    return WeekIntervals(sorted(week_dates), work_merged, occ_merged, free_slots, calendar)
 
 
 def _parse_time_range_and_doctor_from_work(title: str) -> Tuple[Optional[str], Optional[str], Optional[str]]:
@@ -223,6 +393,10 @@ def _closest_date_via_dom(driver, element) -> Optional[str]:
     except Exception:
         return None
 
+def _intern(value: Optional[str]) -> Optional[str]:
+    """Intern repeated strings (doctor names) so slots share one object each."""
+    return sys.intern(value) if value else value
+
 # ----- Interval utilities -----
 
 def _to_minutes(t: str) -> Optional[int]:
@@ -243,17 +417,6 @@ def _to_minutes(t: str) -> Optional[int]:
         return None
 
 
-def _to_hhmm(total_minutes: int) -> str:
-    """Convert minutes since midnight to HH:MM string. Supports 1440 -> 24:00."""
-    if total_minutes >= 24 * 60:
-        return "24:00"
-    if total_minutes < 0:
-        total_minutes = 0
-    h = total_minutes // 60
-    m = total_minutes % 60
-    return f"{h:02d}:{m:02d}"
-
-
 def _merge_intervals(intervals: List[Tuple[int, int]]) -> List[Tuple[int, int]]:
     """Merge overlapping or contiguous intervals.
     Intervals are (start, end) in minutes. Assumes end > start per interval.
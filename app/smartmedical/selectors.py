@@ -17,9 +17,10 @@ XPATH_POPUP_IFRAME = "//iframe[@id='_popup_1']"
 XPATH_LEFT_FRAME = "//frame[@name='_menu_frame' or contains(@src,'_menu_frame.php')]"
 XPATH_RIGHT_FRAME = "//frame[@name='_content_frame']"
 
-# Navigation: Timetable menu and Nr_10 item
+# Navigation: Timetable menu and a calendar's row (by row id, e.g. Nr_10 is item-77-0, or by label)
 XPATH_TIMETABLE_MENU_LINK = "//a[@id='sm-31']"
-XPATH_NR10_ROW = "//tr[@id='item-77-0']"
+XPATH_CALENDAR_ROW_BY_ID = "//tr[@id='{row_id}']"
+XPATH_CALENDAR_ROW_BY_NAME = "//tr[td[normalize-space(.)='{name}']]"
 
 # Generic/calendar heuristics
 XPATH_CALENDAR_CONTAINER_CANDIDATES = [
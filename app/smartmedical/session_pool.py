@@ -0,0 +1,310 @@
+"""Pool of logged-in portal sessions parked on the calendar.
+
+Login with TFA and navigation dominate a portal request, so up to
+PORTAL_SESSION_POOL_SIZE sessions are kept after use. A reused session is
+brought back to the current week of the wanted calendar by re-running the
+(cheap) navigation, preferring one already parked on that calendar; if that
+fails, e.g. because the portal logged it out, it is replaced by a fresh one.
+With a pool size of 0 every flow gets a new session, as before.
+
+Idle sessions are kept alive by a background thread (PORTAL_KEEPALIVE_SECONDS):
+it sends each one a single cheap script, which also resets the Selenium node's
+idle timer, and checks that the portal still shows its menu rather than the
+login form. A logged-out session is logged in again and put back on its
+calendar there, and a dead one replaced, so a request never pays for a login
+the pool could have done in advance.
+"""
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional
+
+from app.core.config import get_settings
+from app.infrastructure.metrics import PORTAL_KEEPALIVE, PORTAL_SESSION_ACQUIRE, PORTAL_SESSIONS_IDLE
+from app.infrastructure.selenium_client import close_browser, open_browser
+from app.smartmedical.auth import login as sm_login
+from app.smartmedical.calendars import Calendar, get_calendars, resolve_calendar
+from app.smartmedical import selectors as sm_sel
+from app.smartmedical.navigation import navigate_to_calendar
+
+logger = logging.getLogger(__name__)
+
+
+class PortalSession:
+    __slots__ = ("driver", "created_at", "last_used", "calendar", "on_calendar")
+
+    def __init__(self, driver, calendar: Calendar) -> None:
+        self.driver = driver
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+        # Calendar last navigated to
+        self.calendar = calendar
+        # True while the driver still shows that calendar's current week untouched
+        self.on_calendar = False
+
+
+def _open_session(calendar: Calendar) -> PortalSession:
+    driver = open_browser()
+    try:
+        sm_login(driver=driver)
+        navigate_to_calendar(driver, calendar)
+    except BaseException:
+        close_browser(driver)
+        raise
+    session = PortalSession(driver, calendar)
+    session.on_calendar = True
+    return session
+
+
+def _reset_to_calendar(session: PortalSession, calendar: Calendar) -> None:
+    driver = session.driver
+    driver.switch_to.default_content()
+    session.on_calendar = False
+    navigate_to_calendar(driver, calendar)
+    session.calendar = calendar
+    session.on_calendar = True
+
+
+# [menu link present, login form present] in the top-level document, whatever frame the driver is in
+_LOGIN_STATE_JS = """
+var doc;
+try { doc = window.top.document; } catch (e) { return null; }
+function has(xp) { return doc.evaluate(xp, doc, null, XPathResult.FIRST_ORDERED_NODE_TYPE, null).singleNodeValue !== null; }
+return [has(arguments[0]), has(arguments[1])];
+"""
+
+
+def _is_logged_in(driver) -> bool:
+    """One round trip; raises if the browser session itself is gone."""
+    state = driver.execute_script(_LOGIN_STATE_JS, sm_sel.XPATH_TIMETABLE_MENU_LINK, sm_sel.XPATH_USERNAME_INPUT)
+    if not state:
+        # Top document not readable: the command went through, assume still logged in
+        return True
+    menu, login_form = state
+    return bool(menu) and not login_form
+
+
+def _relogin(session: PortalSession) -> None:
+    driver = session.driver
+    driver.switch_to.default_content()
+    session.on_calendar = False
+    sm_login(driver=driver)
+    navigate_to_calendar(driver, session.calendar)
+    session.on_calendar = True
+
+
+class SessionPool:
+    """Thread-safe LIFO of idle sessions (the most recently used is the most likely still logged in)."""
+
+    def __init__(self, size: int, max_idle: float):
+        self.size = size
+        self.max_idle = max_idle
+        self._idle: List[PortalSession] = []
+        self._lock = threading.Lock()
+        self.in_use = 0
+        # Outcome of the most recent login attempt (None = none yet)
+        self.last_login_ok: Optional[bool] = None
+
+    def _take_idle(self, calendar: Calendar) -> Optional[PortalSession]:
+        # Newest session parked on `calendar`, else the newest one; caller holds the lock
+        for i in range(len(self._idle) - 1, -1, -1):
+            s = self._idle[i]
+            if s.on_calendar and s.calendar == calendar:
+                return self._idle.pop(i)
+        return self._idle.pop() if self._idle else None
+
+    def acquire(self, calendar: Optional[Calendar] = None) -> PortalSession:
+        """A logged-in session showing the current week of `calendar` (default calendar if None)."""
+        calendar = calendar or resolve_calendar(None)
+        while True:
+            with self._lock:
+                session = self._take_idle(calendar)
+                PORTAL_SESSIONS_IDLE.set(len(self._idle))
+                self.in_use += 1
+            if session is None:
+                break
+            if time.monotonic() - session.last_used > self.max_idle:
+                self._discard(session)
+                continue
+            try:
+                if not (session.on_calendar and session.calendar == calendar):
+                    _reset_to_calendar(session, calendar)
+                PORTAL_SESSION_ACQUIRE.inc(source="pooled")
+                return session
+            except Exception:
+                logger.info("Pooled portal session unusable; replacing it", exc_info=True)
+                self._discard(session)
+
+        session = self._create(calendar)
+        PORTAL_SESSION_ACQUIRE.inc(source="created")
+        return session
+
+    def _create(self, calendar: Calendar) -> PortalSession:
+        # Caller has already counted the session as in use
+        try:
+            session = _open_session(calendar)
+        except BaseException:
+            self.last_login_ok = False
+            with self._lock:
+                self.in_use -= 1
+            raise
+        self.last_login_ok = True
+        return session
+
+    def release(self, session: PortalSession, reusable: bool, on_calendar: bool = False) -> None:
+        """Return a session after a flow; it keeps its login but, by default, not its calendar position."""
+        session.last_used = time.monotonic()
+        session.on_calendar = on_calendar
+        with self._lock:
+            self.in_use -= 1
+            keep = reusable and len(self._idle) < self.size
+            if keep:
+                self._idle.append(session)
+            PORTAL_SESSIONS_IDLE.set(len(self._idle))
+        if not keep:
+            close_browser(session.driver)
+
+    def _discard(self, session: PortalSession) -> None:
+        with self._lock:
+            self.in_use -= 1
+        close_browser(session.driver)
+
+    def keepalive(self, min_idle: float) -> Dict[str, int]:
+        """Check every session idle for `min_idle` seconds: keep it alive, log it back in or replace it.
+
+        A session under check is taken out of the idle list, so flows never see it half-way.
+        """
+        now = time.monotonic()
+        with self._lock:
+            due = [s for s in self._idle if now - s.last_used >= min_idle]
+            self._idle = [s for s in self._idle if s not in due]
+            self.in_use += len(due)
+            PORTAL_SESSIONS_IDLE.set(len(self._idle))
+        outcomes: Dict[str, int] = {}
+        for session in due:
+            outcome = self._keep_alive(session)
+            PORTAL_KEEPALIVE.inc(outcome=outcome)
+            outcomes[outcome] = outcomes.get(outcome, 0) + 1
+        return outcomes
+
+    def _keep_alive(self, session: PortalSession) -> str:
+        # Caller has counted the session as in use; it is released or replaced here
+        try:
+            if _is_logged_in(session.driver):
+                outcome = "alive"
+            else:
+                logger.info("Pooled portal session logged out; logging in again")
+                _relogin(session)
+                outcome = "relogin"
+            self.release(session, reusable=True, on_calendar=session.on_calendar)
+            return outcome
+        except Exception:
+            logger.info("Pooled portal session lost; replacing it", exc_info=True)
+            self._discard(session)
+        try:
+            with self._lock:
+                self.in_use += 1
+            self.release(self._create(session.calendar), reusable=True, on_calendar=True)
+            return "replaced"
+        except Exception:
+            logger.warning("Replacing a pooled portal session failed", exc_info=True)
+            return "failed"
+
+    def prewarm(self) -> None:
+        """Open sessions up to the pool size, spread over the calendars; with no pool, one to validate driver and login."""
+        missing = self.size - self.idle_count() if self.size else 1
+        calendars = list(get_calendars().values())
+        for i in range(missing):
+            with self._lock:
+                self.in_use += 1
+            self.release(self._create(calendars[i % len(calendars)]), reusable=True, on_calendar=True)
+
+    def idle_count(self) -> int:
+        with self._lock:
+            return len(self._idle)
+
+    def has_session(self) -> bool:
+        with self._lock:
+            return bool(self._idle) or self.in_use > 0
+
+    def close(self) -> None:
+        with self._lock:
+            idle, self._idle = self._idle, []
+            PORTAL_SESSIONS_IDLE.set(0)
+        for session in idle:
+            close_browser(session.driver)
+
+
+_pool: SessionPool | None = None
+
+
+def get_session_pool() -> SessionPool:
+    global _pool
+    if _pool is None:
+        s = get_settings()
+        _pool = SessionPool(size=s.portal_session_pool_size, max_idle=s.portal_session_max_idle)
+    return _pool
+
+
+class SessionKeepalive:
+    """Runs `SessionPool.keepalive` from a daemon thread every `interval / 2` seconds."""
+
+    def __init__(self, pool: SessionPool, interval: float):
+        self.pool = pool
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._worker, name="portal-keepalive", daemon=True)
+        self._thread.start()
+
+    def _worker(self) -> None:
+        # Checks at half the interval, so no idle session goes much longer than `interval` unchecked
+        period = self.interval / 2
+        while not self._stop.wait(period):
+            try:
+                outcomes = self.pool.keepalive(period)
+            except Exception:
+                logger.warning("Portal keepalive failed", exc_info=True)
+                continue
+            if outcomes:
+                logger.debug("Portal keepalive", extra={"outcomes": outcomes})
+
+    def shutdown(self, timeout: float = 5.0) -> None:
+        self._stop.set()
+        self._thread.join(timeout)
+
+
+_keepalive: SessionKeepalive | None = None
+
+
+def start_keepalive() -> None:
+    """Start the keepalive thread when sessions are pooled and PORTAL_KEEPALIVE_SECONDS > 0."""
+    global _keepalive
+    s = get_settings()
+    if _keepalive is None and s.portal_session_pool_size > 0 and s.portal_keepalive_seconds > 0:
+        _keepalive = SessionKeepalive(get_session_pool(), s.portal_keepalive_seconds)
+
+
+def stop_keepalive() -> None:
+    global _keepalive
+    keepalive, _keepalive = _keepalive, None
+    if keepalive is not None:
+        keepalive.shutdown()
+
+
+@contextmanager
+def portal_session(calendar: Optional[Calendar] = None) -> Iterator:
+    """Yield a logged-in driver on the current week of `calendar`; pooled when enabled.
+
+    A flow that raises gives its session up, since its page state is unknown.
+    """
+    pool = get_session_pool()
+    session = pool.acquire(calendar)
+    ok = False
+    try:
+        yield session.driver
+        ok = True
+    finally:
+        pool.release(session, reusable=ok)
@@ -0,0 +1,202 @@
+"""In-memory index over the most recently scraped free slots.
+
+The index keeps one immutable view per scrape, keyed by date, doctor and start
+minute, so filtered `/timetable` queries are answered with a couple of bisects
+instead of a new browser run or a scan over the whole horizon.
+"""
+from __future__ import annotations
+
+import hashlib
+import logging
+import threading
+import time
+from bisect import bisect_left, bisect_right
+from dataclasses import replace
+from datetime import date
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from app.smartmedical.scrape_timetable import Slot, _earliest_slot, _to_minutes
+
+logger = logging.getLogger(__name__)
+
+
+def _doctor_key(doctor: Optional[str]) -> str:
+    return (doctor or "").strip().casefold()
+
+
+class _IndexView:
+    """Immutable arrays built once per scrape; readers never take a lock."""
+
+    __slots__ = ("rows", "dates", "by_doctor", "built_at", "digest")
+
+    def __init__(self, rows: Iterable[Slot], built_at: float):
+        # Global order matches fetch_timetable: (date, doctor, start)
+        self.rows = sorted(rows, key=lambda r: (r.date, r.doctor or "", r.start))
+        self.dates = [r.date for r in self.rows]
+        # Per doctor: parallel sorted arrays of (date, start) keys and rows
+        grouped: Dict[str, List[Slot]] = {}
+        for r in self.rows:
+            grouped.setdefault(_doctor_key(r.doctor), []).append(r)
+        self.by_doctor: Dict[str, Tuple[List[Tuple[str, int]], List[Slot]]] = {}
+        for key, doc_rows in grouped.items():
+            doc_rows.sort(key=lambda r: (r.date, r.start))
+            self.by_doctor[key] = ([(r.date, r.start) for r in doc_rows], doc_rows)
+        self.built_at = built_at
+        # Content hash: identical scrapes keep the same validator for conditional GETs
+        h = hashlib.blake2b(digest_size=8)
+        for r in self.rows:
+            h.update(f"{r.date}|{r.start}|{r.end}|{r.doctor}|{r.interval}|{r.calendar};".encode("utf-8"))
+        self.digest = h.hexdigest()
+
+
+# Called with (opened, taken, version) after each replace that changed anything
+ChangeListener = Callable[[List[Slot], List[Slot], int], None]
+
+
+class SlotIndex:
+    """Thread-safe holder of the latest slot view with filtered lookups."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._view: Optional[_IndexView] = None
+        self._listeners: List[ChangeListener] = []
+        self.version = 0
+
+    def add_listener(self, listener: ChangeListener) -> None:
+        with self._lock:
+            self._listeners.append(listener)
+
+    def replace(self, slots: Iterable[Slot], age: float = 0.0) -> None:
+        """Rebuild the index from fetch_timetable slots scraped `age` seconds ago."""
+        self._install(_IndexView(slots, time.monotonic() - age), None)
+
+    def patch_day(self, day: str, calendar: Optional[str], slots: Iterable[Slot]) -> bool:
+        """Swap in the free slots of one (date, calendar), e.g. re-read after a booking.
+
+        The rest of the view, and its age, stay as they are. Returns False when
+        the index is empty (a single day is no snapshot).
+        """
+        slots = list(slots)
+        while True:
+            current = self._view
+            if current is None:
+                return False
+            rows = [r for r in current.rows if r.date != day or r.calendar != calendar]
+            rows.extend(slots)
+            if self._install(_IndexView(rows, current.built_at), current):
+                return True
+
+    def _install(self, view: _IndexView, expected: Optional[_IndexView]) -> bool:
+        # With `expected`, only replaces that view (compare-and-swap for patches)
+        with self._lock:
+            if expected is not None and self._view is not expected:
+                return False
+            old, self._view = self._view, view
+            listeners = list(self._listeners)
+            if old is not None and old.digest == view.digest:
+                return True
+            self.version += 1
+            version = self.version
+        if listeners:
+            before = set(old.rows) if old is not None else set()
+            after = set(view.rows)
+            opened = sorted(after - before, key=lambda r: (r.date, r.doctor or "", r.start))
+            taken = sorted(before - after, key=lambda r: (r.date, r.doctor or "", r.start))
+            for listener in listeners:
+                # A failing listener must neither fail the scrape that updated the index nor starve the others
+                try:
+                    listener(opened, taken, version)
+                except Exception:
+                    logger.warning("Slot index listener failed", exc_info=True)
+        return True
+
+    def clear(self) -> None:
+        with self._lock:
+            self._view = None
+
+    def age(self) -> Optional[float]:
+        """Seconds since the index was last built, or None if empty."""
+        view = self._view
+        if view is None:
+            return None
+        return time.monotonic() - view.built_at
+
+    def digest(self) -> Optional[str]:
+        """Content hash of the current view, or None if empty."""
+        view = self._view
+        return view.digest if view is not None else None
+
+    def is_fresh(self, ttl: float) -> bool:
+        age = self.age()
+        return age is not None and age <= ttl
+
+    def query(
+        self,
+        *,
+        doctor: Optional[str] = None,
+        date_from: Optional[str] = None,
+        date_to: Optional[str] = None,
+        after_time: Optional[str] = None,
+        before_time: Optional[str] = None,
+        calendar: Optional[str] = None,
+    ) -> List[Slot]:
+        """Return free slots matching the filters, in fetch_timetable order.
+
+        Dates are inclusive ISO strings. Time-of-day bounds clip each free
+        interval to [after_time, before_time]; intervals left empty are dropped.
+        `calendar` keeps only slots of that calendar key.
+        """
+        view = self._view
+        if view is None:
+            return []
+
+        if doctor is not None:
+            entry = view.by_doctor.get(_doctor_key(doctor))
+            if entry is None:
+                return []
+            keys, rows = entry
+            lo = bisect_left(keys, (date_from, -1)) if date_from else 0
+            hi = bisect_right(keys, (date_to, 24 * 60 + 1)) if date_to else len(rows)
+        else:
+            rows = view.rows
+            lo = bisect_left(view.dates, date_from) if date_from else 0
+            hi = bisect_right(view.dates, date_to) if date_to else len(rows)
+
+        after_m = _to_minutes(after_time) if after_time else None
+        before_m = _to_minutes(before_time) if before_time else None
+
+        selected = rows[lo:hi]
+        if calendar is not None:
+            selected = [r for r in selected if r.calendar == calendar]
+        if after_m is None and before_m is None:
+            return selected
+
+        out: List[Slot] = []
+        for slot in selected:
+            start_m, end_m = slot.start, slot.end
+            if after_m is not None and after_m > start_m:
+                start_m = after_m
+            if before_m is not None and before_m < end_m:
+                end_m = before_m
+            if end_m <= start_m:
+                continue
+            if start_m != slot.start or end_m != slot.end:
+                slot = replace(slot, start=start_m, end=end_m)
+            out.append(slot)
+        return out
+
+    def earliest(self, doctor: Optional[str] = None, min_minutes: int = 0, calendar: Optional[str] = None) -> Optional[Slot]:
+        """Earliest non-past free slot in the index (see _earliest_slot)."""
+        candidates = self.query(doctor=doctor, date_from=date.today().isoformat(), calendar=calendar)
+        return _earliest_slot(candidates, doctor, min_minutes)
+
+
+# Singleton shared by the API layer
+_index: SlotIndex | None = None
+
+
+def get_slot_index() -> SlotIndex:
+    global _index
+    if _index is None:
+        _index = SlotIndex()
+    return _index
@@ -0,0 +1,102 @@
+"""Fan-out of slot index changes to streaming clients.
+
+Every change of the slot index (a scrape, a refresh) becomes one delta event
+with the free slots that opened and the ones that were taken. Each subscriber
+has a bounded queue; a client too slow to drain it loses its queued deltas and
+is sent a full snapshot instead, so memory per connection stays bounded and
+the client never ends up with a silently wrong view.
+"""
+from __future__ import annotations
+
+import asyncio
+import threading
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from app.smartmedical.scrape_timetable import Slot
+from app.smartmedical.slot_index import SlotIndex, get_slot_index
+
+# (opened, taken, index version); None in the queue means "resync with a snapshot"
+Delta = Tuple[List[Slot], List[Slot], int]
+
+
+class Subscriber:
+    __slots__ = ("queue", "loop", "doctor", "owner")
+
+    def __init__(
+        self, loop: asyncio.AbstractEventLoop, maxsize: int, doctor: Optional[str] = None, owner: Optional[str] = None
+    ):
+        self.queue: "asyncio.Queue[Optional[Delta]]" = asyncio.Queue(maxsize=maxsize)
+        self.loop = loop
+        self.doctor = (doctor or "").strip().casefold() or None
+        self.owner = owner
+
+    def _push(self, delta: Delta) -> None:
+        # Runs on the subscriber's loop
+        if self.doctor is not None:
+            opened, taken, version = delta
+            opened = [s for s in opened if (s.doctor or "").casefold() == self.doctor]
+            taken = [s for s in taken if (s.doctor or "").casefold() == self.doctor]
+            if not (opened or taken):
+                return
+            delta = (opened, taken, version)
+        try:
+            self.queue.put_nowait(delta)
+        except asyncio.QueueFull:
+            # Backpressure: drop what is queued and ask for a resync
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(None)
+
+
+class SlotStream:
+    def __init__(self, index: SlotIndex):
+        self.index = index
+        self._subscribers: Set[Subscriber] = set()
+        self._lock = threading.Lock()
+        index.add_listener(self._on_change)
+
+    def subscribe(self, maxsize: int = 100, doctor: Optional[str] = None, owner: Optional[str] = None) -> Subscriber:
+        sub = Subscriber(asyncio.get_running_loop(), maxsize, doctor, owner)
+        with self._lock:
+            self._subscribers.add(sub)
+        return sub
+
+    def unsubscribe(self, sub: Subscriber) -> None:
+        with self._lock:
+            self._subscribers.discard(sub)
+
+    def subscriber_count(self, owner: Optional[str] = None) -> int:
+        with self._lock:
+            if owner is None:
+                return len(self._subscribers)
+            return sum(1 for sub in self._subscribers if sub.owner == owner)
+
+    def _on_change(self, opened: List[Slot], taken: List[Slot], version: int) -> None:
+        # May be called from a worker thread
+        with self._lock:
+            subs = list(self._subscribers)
+        for sub in subs:
+            try:
+                sub.loop.call_soon_threadsafe(sub._push, (opened, taken, version))
+            except RuntimeError:
+                # Loop closed; the connection is gone
+                self.unsubscribe(sub)
+
+
+def delta_payload(delta: Delta) -> Dict[str, Any]:
+    opened, taken, version = delta
+    return {
+        "version": version,
+        "opened": [s.to_dict() for s in opened],
+        "taken": [s.to_dict() for s in taken],
+    }
+
+
+_stream: SlotStream | None = None
+
+
+def get_slot_stream() -> SlotStream:
+    global _stream
+    if _stream is None:
+        _stream = SlotStream(get_slot_index())
+    return _stream
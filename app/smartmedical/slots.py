@@ -0,0 +1,59 @@
+"""Scraped timetable data: free slots and whole scraped weeks.
+
+Kept apart from the scraper so stores and indexes can use them without
+importing the browser code.
+"""
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+
+@dataclass(slots=True, frozen=True)
+class Slot:
+    """A free interval as scraped: minutes since midnight, interned date/doctor."""
+
+    date: str
+    start: int
+    end: int
+    doctor: Optional[str] = None
+    interval: Optional[int] = None
+    # Calendar key (see calendars); None for slots not tied to a configured calendar
+    calendar: Optional[str] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Public JSON shape of a slot (HH:MM times, interval as string)."""
+        d: Dict[str, Any] = {
+            "date": self.date,
+            "start": _to_hhmm(self.start),
+            "end": _to_hhmm(self.end),
+            "doctor": self.doctor,
+            "type": "free",
+        }
+        if self.interval is not None:
+            d["interval"] = str(self.interval)
+        if self.calendar is not None:
+            d["calendar"] = self.calendar
+        return d
+
+
+@dataclass(slots=True)
+class WeekIntervals:
+    """One scraped week: merged work-time and occupied intervals and the free slots, per (date, doctor)."""
+
+    dates: List[str]
+    work: Dict[Tuple[str, Optional[str]], List[Tuple[int, int]]]
+    occupied: Dict[Tuple[str, Optional[str]], List[Tuple[int, int]]]
+    free: List[Slot]
+    calendar: Optional[str] = None
+
+
+def _to_hhmm(total_minutes: int) -> str:
+    """Convert minutes since midnight to HH:MM string. Supports 1440 -> 24:00."""
+    if total_minutes >= 24 * 60:
+        return "24:00"
+    if total_minutes < 0:
+        total_minutes = 0
+    h = total_minutes // 60
+    m = total_minutes % 60
+    return f"{h:02d}:{m:02d}"
@@ -0,0 +1,240 @@
+"""SQLite store of scraped calendar weeks.
+
+Each scraped week is recorded (`record_snapshot`) in one transaction: the merged
+work-time, occupied and free intervals per (date, doctor) of one calendar under the
+scrape's timestamp, plus one row per scraped date (so a day without any work
+time is still known to have been scraped). The latest scrape of each
+(calendar, date) is the current snapshot,
+which is loaded into the slot index at startup; older scrapes answer
+historical utilization queries without touching the portal.
+
+Stores written before calendars were configurable are migrated on open: their
+rows (calendar '') are assigned to the default calendar and scraped_days is
+rebuilt keyed by calendar.
+"""
+from __future__ import annotations
+
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.core.config import get_settings
+from app.smartmedical.calendars import default_calendar
+from app.smartmedical.slots import Slot, WeekIntervals
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS scraped_days ("
+    " date TEXT NOT NULL, scraped_at REAL NOT NULL, calendar TEXT NOT NULL DEFAULT '',"
+    " PRIMARY KEY (calendar, date, scraped_at))",
+    # kind: 'work' (bookable hours), 'occupied' (reservations), 'free' (work minus occupied)
+    "CREATE TABLE IF NOT EXISTS intervals ("
+    " date TEXT NOT NULL, scraped_at REAL NOT NULL, doctor TEXT NOT NULL, kind TEXT NOT NULL,"
+    " start INTEGER NOT NULL, end INTEGER NOT NULL, interval INTEGER, calendar TEXT NOT NULL DEFAULT '')",
+)
+_INDEXES = (
+    "CREATE INDEX IF NOT EXISTS intervals_by_day ON intervals (date, scraped_at, doctor)",
+    "CREATE INDEX IF NOT EXISTS intervals_by_calendar_day ON intervals (calendar, date, scraped_at)",
+)
+
+
+class SnapshotStore:
+    def __init__(self, path: str, retention_days: int = 90, default_calendar_key: Optional[str] = None):
+        self.path = path
+        self.retention_days = retention_days
+        # Weeks scraped without a calendar belong to the default one
+        self.default_calendar_key = default_calendar_key or default_calendar().key
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        conn = self._conn()
+        for stmt in _SCHEMA:
+            conn.execute(stmt)
+        self._migrate(conn)
+        for stmt in _INDEXES:
+            conn.execute(stmt)
+
+    def _migrate(self, conn: sqlite3.Connection) -> None:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            info = list(conn.execute("PRAGMA table_info(scraped_days)"))
+            if "calendar" not in {row[1] for row in info if row[5]}:
+                # Keyed (date, scraped_at): two calendars scraped at once would collide
+                source = "calendar" if "calendar" in {row[1] for row in info} else "''"
+                conn.execute("ALTER TABLE scraped_days RENAME TO scraped_days_old")
+                conn.execute(_SCHEMA[0])
+                conn.execute(
+                    f"INSERT OR IGNORE INTO scraped_days (date, scraped_at, calendar)"
+                    f" SELECT date, scraped_at, {source} FROM scraped_days_old"
+                )
+                conn.execute("DROP TABLE scraped_days_old")
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(intervals)")}
+            if "calendar" not in columns:
+                conn.execute("ALTER TABLE intervals ADD COLUMN calendar TEXT NOT NULL DEFAULT ''")
+            for table in ("scraped_days", "intervals"):
+                conn.execute(f"UPDATE OR IGNORE {table} SET calendar = ? WHERE calendar = ''", (self.default_calendar_key,))
+            # Left over only where the default calendar already has the same day and scrape
+            conn.execute("DELETE FROM scraped_days WHERE calendar = ''")
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    # ----- Writes -----
+
+    def record_week(self, week: WeekIntervals, scraped_at: Optional[float] = None) -> None:
+        """Append one scraped week in a single transaction."""
+        ts = time.time() if scraped_at is None else scraped_at
+        cal = week.calendar or self.default_calendar_key
+        rows: List[Tuple[Any, ...]] = []
+        for kind, by_key in (("work", week.work), ("occupied", week.occupied)):
+            for (d, doc), intervals in by_key.items():
+                rows.extend((d, ts, doc or "", kind, s, e, None, cal) for s, e in intervals)
+        rows.extend((s.date, ts, s.doctor or "", "free", s.start, s.end, s.interval, cal) for s in week.free)
+
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany(
+                "INSERT OR IGNORE INTO scraped_days (date, scraped_at, calendar) VALUES (?, ?, ?)",
+                [(d, ts, cal) for d in week.dates],
+            )
+            conn.executemany(
+                "INSERT INTO intervals (date, scraped_at, doctor, kind, start, end, interval, calendar)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+            if self.retention_days > 0:
+                cutoff = ts - self.retention_days * 86400
+                conn.execute("DELETE FROM intervals WHERE scraped_at < ?", (cutoff,))
+                conn.execute("DELETE FROM scraped_days WHERE scraped_at < ?", (cutoff,))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    # ----- Reads -----
+
+    def _latest_days(
+        self, date_from: Optional[str], date_to: Optional[str], as_of: Optional[float]
+    ) -> Dict[Tuple[str, str], float]:
+        """(calendar, date) -> timestamp of its most recent scrape (at or before `as_of`)."""
+        sql = "SELECT calendar, date, MAX(scraped_at) FROM scraped_days WHERE 1=1"
+        params: List[Any] = []
+        if date_from:
+            sql += " AND date >= ?"
+            params.append(date_from)
+        if date_to:
+            sql += " AND date <= ?"
+            params.append(date_to)
+        if as_of is not None:
+            sql += " AND scraped_at <= ?"
+            params.append(as_of)
+        sql += " GROUP BY calendar, date"
+        return {(cal, d): ts for cal, d, ts in self._conn().execute(sql, params)}
+
+    def latest_snapshot(self, date_from: Optional[str] = None) -> Tuple[List[Slot], Optional[float]]:
+        """Free slots of the latest scrape of every date from `date_from`, and the oldest of those scrape times."""
+        days = self._latest_days(date_from, None, None)
+        if not days:
+            return [], None
+        conn = self._conn()
+        slots: List[Slot] = []
+        for (cal, d), ts in sorted(days.items()):
+            for doc, s, e, interval in conn.execute(
+                "SELECT doctor, start, end, interval FROM intervals"
+                " WHERE calendar = ? AND date = ? AND scraped_at = ? AND kind = 'free' ORDER BY doctor, start",
+                (cal, d, ts),
+            ):
+                slots.append(Slot(d, s, e, doc or None, interval, cal or None))
+        return slots, min(days.values())
+
+    def utilization(
+        self,
+        date_from: Optional[str] = None,
+        date_to: Optional[str] = None,
+        doctor: Optional[str] = None,
+        as_of: Optional[float] = None,
+    ) -> List[Dict[str, Any]]:
+        """Work, occupied and free minutes per (date, calendar, doctor) from the latest scrape of each date.
+
+        With `as_of` (unix time), uses the latest scrape at or before it instead.
+        """
+        days = self._latest_days(date_from, date_to, as_of)
+        conn = self._conn()
+        want = (doctor or "").strip().casefold() or None
+        out: List[Dict[str, Any]] = []
+        for (cal, d), ts in sorted(days.items(), key=lambda item: (item[0][1], item[0][0])):
+            totals: Dict[str, Dict[str, int]] = {}
+            for doc, kind, minutes in conn.execute(
+                "SELECT doctor, kind, SUM(end - start) FROM intervals"
+                " WHERE calendar = ? AND date = ? AND scraped_at = ? GROUP BY doctor, kind",
+                (cal, d, ts),
+            ):
+                if want is not None and doc.casefold() != want:
+                    continue
+                totals.setdefault(doc, {"work": 0, "occupied": 0, "free": 0})[kind] = int(minutes or 0)
+            for doc, t in sorted(totals.items()):
+                booked = t["work"] - t["free"]
+                out.append({
+                    "date": d,
+                    "calendar": cal or None,
+                    "doctor": doc or None,
+                    "work_minutes": t["work"],
+                    "booked_minutes": booked,
+                    "free_minutes": t["free"],
+                    "utilization": round(booked / t["work"], 3) if t["work"] else None,
+                    "scraped_at": ts,
+                })
+        return out
+
+
+_store: SnapshotStore | None = None
+_store_lock = threading.Lock()
+
+
+def get_snapshot_store() -> Optional[SnapshotStore]:
+    """The configured store, or None when SNAPSHOT_DB_PATH is unset."""
+    global _store
+    s = get_settings()
+    if not s.snapshot_db_path:
+        return None
+    with _store_lock:
+        if _store is None or _store.path != s.snapshot_db_path:
+            _store = SnapshotStore(s.snapshot_db_path, retention_days=s.snapshot_retention_days)
+        return _store
+
+
+def record_snapshot(week: WeekIntervals) -> None:
+    """Append a scraped week to the configured store, if any. A failed write is logged, never raised."""
+    store = get_snapshot_store()
+    if store is None:
+        return
+    try:
+        store.record_week(week)
+    except Exception:
+        logger.warning("Snapshot write failed", exc_info=True)
+
+
+def load_latest_into(index, date_from: Optional[str] = None) -> int:
+    """Seed a SlotIndex from the latest snapshot, aged by its scrape time. Returns slot count."""
+    store = get_snapshot_store()
+    if store is None:
+        return 0
+    slots, scraped_at = store.latest_snapshot(date_from)
+    if scraped_at is None:
+        return 0
+    index.replace(slots, age=max(0.0, time.time() - scraped_at))
+    return len(slots)
@@ -0,0 +1,292 @@
+"""Waitlist: book automatically as soon as a matching slot opens.
+
+An entry is a booking template (patient details) plus what is acceptable:
+dates, a time-of-day window, doctors and a minimum length. Every change of the
+slot index (and every new entry, against the current index) is matched against
+the waiting entries, tenants taking turns and each tenant's entries in its own
+priority order; each winning entry is claimed and its
+booking started right away through the portal session pool, so with pooled
+sessions the booking begins on a browser that is already on the calendar.
+
+Booking is at most once per entry: an entry is claimed under the lock before
+its booking starts and only goes back to waiting when the portal reported the
+slot unavailable, i.e. nothing was submitted. Any other failure leaves it
+`failed` for staff to look at rather than risking a double booking.
+
+Bookings run as the entry's owner: at most `max_browser_ops` of a tenant's
+entries are claimed at once, and a booking rejected by the tenant's browser
+quota (its API requests hold the sessions) goes back to waiting.
+"""
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import logging
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+from datetime import date
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+from fastapi import HTTPException
+
+from app.core.config import get_settings
+from app.infrastructure.metrics import WAITLIST_BOOKINGS
+from app.infrastructure.portal_jobs import run_portal_job
+from app.infrastructure.security import Tenant, _current_tenant, current_tenant
+from app.smartmedical.booking_locks import SlotBusy, SlotLease, booking_interval, get_booking_locks
+from app.smartmedical.create_booking import create_booking
+from app.smartmedical.calendars import resolve_calendar
+from app.smartmedical.circuit_breaker import PortalUnavailable
+from app.smartmedical.slot_index import SlotIndex, _doctor_key, get_slot_index
+from app.smartmedical.slots import Slot, _to_hhmm
+from app.smartmedical.watches import clip_slot
+
+logger = logging.getLogger(__name__)
+
+WAITING, BOOKING, BOOKED, FAILED = "waiting", "booking", "booked", "failed"
+
+
+@dataclass(slots=True, eq=False)
+class WaitlistEntry:
+    id: str
+    owner: str
+    first_name: str
+    last_name: str
+    phone: str
+    notes: Optional[str] = None
+    # Acceptable dates (empty = any date from today)
+    dates: List[str] = field(default_factory=list)
+    # Acceptable doctors (empty = any doctor)
+    doctors: List[str] = field(default_factory=list)
+    after_time: Optional[str] = None
+    before_time: Optional[str] = None
+    min_duration: int = 0
+    # Higher goes first; ties by registration time
+    priority: int = 0
+    created_at: float = field(default_factory=time.time)
+    status: str = WAITING
+    attempts: int = 0
+    booked_slot: Optional[Slot] = None
+    result: Optional[Dict[str, Any]] = None
+    # The owner's limits; its browser quota applies to this entry's bookings
+    tenant: Optional[Tenant] = field(default=None, repr=False)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "dates": self.dates,
+            "doctors": self.doctors,
+            "after_time": self.after_time,
+            "before_time": self.before_time,
+            "min_duration": self.min_duration,
+            "priority": self.priority,
+            "created_at": self.created_at,
+            "status": self.status,
+            "attempts": self.attempts,
+            "slot": self.booked_slot.to_dict() if self.booked_slot is not None else None,
+            "result": self.result,
+        }
+
+    def accepts(self, slot: Slot) -> Optional[Slot]:
+        """The part of `slot` this entry would book, if any."""
+        if self.dates and slot.date not in self.dates:
+            return None
+        if self.doctors and _doctor_key(slot.doctor) not in {_doctor_key(d) for d in self.doctors}:
+            return None
+        return clip_slot(slot, self.after_time, self.before_time, self.min_duration)
+
+
+class Waitlist:
+    def __init__(self, index: Optional[SlotIndex] = None, book: Callable[..., Dict[str, Any]] = create_booking):
+        self.index = index
+        self._book = book
+        self._lock = threading.Lock()
+        self._entries: Dict[str, WaitlistEntry] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._tasks: Set[asyncio.Task] = set()
+        if index is not None:
+            index.add_listener(self.on_change)
+
+    # ----- Registration -----
+
+    def add(self, owner: str, **fields: Any) -> WaitlistEntry:
+        """Register an entry and try it against the current index. Must be called on the event loop."""
+        self._loop = asyncio.get_running_loop()
+        fields.setdefault("tenant", current_tenant())
+        entry = WaitlistEntry(id=uuid.uuid4().hex, owner=owner, **fields)
+        with self._lock:
+            self._entries[entry.id] = entry
+        if self.index is not None:
+            self.dispatch(self.index.query(date_from=date.today().isoformat()))
+        return entry
+
+    def cancel(self, entry_id: str, owner: str) -> Optional[bool]:
+        """Remove a waiting (or finished) entry. None if unknown, False while its booking runs."""
+        with self._lock:
+            entry = self._entries.get(entry_id)
+            if entry is None or entry.owner != owner:
+                return None
+            if entry.status == BOOKING:
+                return False
+            del self._entries[entry_id]
+            return True
+
+    def get(self, entry_id: str, owner: str) -> Optional[WaitlistEntry]:
+        entry = self._entries.get(entry_id)
+        return entry if entry is not None and entry.owner == owner else None
+
+    def for_owner(self, owner: str) -> List[WaitlistEntry]:
+        with self._lock:
+            return sorted((e for e in self._entries.values() if e.owner == owner), key=lambda e: (-e.priority, e.created_at))
+
+    def count(self, owner: str) -> int:
+        with self._lock:
+            return sum(1 for e in self._entries.values() if e.owner == owner)
+
+    # ----- Matching -----
+
+    def claim(self, slots: List[Slot]) -> List[Tuple[WaitlistEntry, Slot]]:
+        """Assign slots to waiting entries, one slot per entry and entry per slot.
+
+        Owners take turns: every owner's best entry (by its own priority, then
+        age) comes before any owner's second one, and within a turn older
+        entries go first. Priority thus never lets one tenant outbid another.
+        Claimed entries move to `booking`; this is what makes booking at most once.
+        An owner never has more entries booking than its `max_browser_ops`.
+        """
+        by_date: Dict[str, List[Slot]] = {}
+        for s in slots:
+            by_date.setdefault(s.date, []).append(s)
+        for day in by_date.values():
+            day.sort(key=lambda s: s.start)
+        days = sorted(by_date)
+
+        out: List[Tuple[WaitlistEntry, Slot]] = []
+        taken: Set[Tuple[Optional[str], str, str, int]] = set()
+        with self._lock:
+            turn: Dict[str, int] = {}
+            ranked: List[Tuple[int, float, WaitlistEntry]] = []
+            for e in sorted(
+                (e for e in self._entries.values() if e.status == WAITING),
+                key=lambda e: (-e.priority, e.created_at),
+            ):
+                n = turn.get(e.owner, 0)
+                turn[e.owner] = n + 1
+                ranked.append((n, e.created_at, e))
+            waiting = [e for _, _, e in sorted(ranked, key=lambda r: r[:2])]
+            booking: Dict[str, int] = {}
+            for e in self._entries.values():
+                if e.status == BOOKING:
+                    booking[e.owner] = booking.get(e.owner, 0) + 1
+            for entry in waiting:
+                limit = entry.tenant.max_browser_ops if entry.tenant is not None else None
+                if limit is not None and booking.get(entry.owner, 0) >= limit:
+                    continue
+                for day in (sorted(d for d in entry.dates if d in by_date) if entry.dates else days):
+                    chosen = None
+                    for slot in by_date[day]:
+                        if (slot.calendar, slot.date, _doctor_key(slot.doctor), slot.start) in taken:
+                            continue
+                        chosen = entry.accepts(slot)
+                        if chosen is not None:
+                            taken.add((slot.calendar, slot.date, _doctor_key(slot.doctor), slot.start))
+                            break
+                    if chosen is not None:
+                        entry.status = BOOKING
+                        entry.attempts += 1
+                        booking[entry.owner] = booking.get(entry.owner, 0) + 1
+                        out.append((entry, chosen))
+                        break
+        return out
+
+    def on_change(self, opened: List[Slot], taken: List[Slot], version: int) -> None:
+        """SlotIndex listener: book newly opened slots for waiting entries."""
+        if opened:
+            self.dispatch(opened)
+
+    def dispatch(self, slots: List[Slot]) -> int:
+        """Claim matching entries and start their bookings; safe from any thread."""
+        loop = self._loop
+        if loop is None or loop.is_closed():
+            return 0
+        claims = self.claim(slots)
+        for entry, slot in claims:
+            loop.call_soon_threadsafe(self._start, entry, slot)
+        return len(claims)
+
+    def _start(self, entry: WaitlistEntry, slot: Slot) -> None:
+        # Detached from whatever request or refresh produced the slot, running as the entry's owner
+        context = contextvars.Context()
+        context.run(_current_tenant.set, entry.tenant)
+        task = asyncio.get_running_loop().create_task(self._run(entry, slot), context=context)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, entry: WaitlistEntry, slot: Slot) -> None:
+        logger.info("Waitlist booking started", extra={"waitlist_id": entry.id, "date": slot.date, "time": _to_hhmm(slot.start)})
+        try:
+            calendar = resolve_calendar(slot.calendar).key
+            lease = get_booking_locks().acquire(calendar, slot.date, *booking_interval(calendar, slot.date, _to_hhmm(slot.start)))
+        except SlotBusy as e:
+            # A /book request holds the slot; nothing was submitted for this entry
+            result = {"status": "unavailable", "message": str(e)}
+        except ValueError as e:
+            result = {"status": "error", "message": str(e)}
+        else:
+            result = await self._book_slot(entry, slot, lease)
+
+        outcome = result.get("status")
+        with self._lock:
+            entry.result = result
+            if outcome == "ok":
+                entry.status = BOOKED
+                entry.booked_slot = slot
+            elif outcome == "unavailable":
+                entry.status = WAITING
+            else:
+                entry.status = FAILED
+        WAITLIST_BOOKINGS.inc(outcome=entry.status)
+        logger.info("Waitlist booking finished", extra={"waitlist_id": entry.id, "status": entry.status})
+
+    async def _book_slot(self, entry: WaitlistEntry, slot: Slot, lease: SlotLease) -> Dict[str, Any]:
+        try:
+            async with asyncio.timeout(get_settings().request_timeout):
+                result = await run_portal_job(
+                    lease.guard(self._book),
+                    date=slot.date,
+                    time=_to_hhmm(slot.start),
+                    first_name=entry.first_name,
+                    last_name=entry.last_name,
+                    phone=entry.phone,
+                    notes=entry.notes,
+                    calendar=slot.calendar,
+                )
+        except PortalUnavailable as e:
+            # Rejected by a circuit breaker before anything was submitted
+            result = {"status": "unavailable", "message": str(e)}
+        except HTTPException as e:
+            # Rejected by the owner's browser quota, also before anything was submitted
+            result = {"status": "unavailable", "message": e.detail}
+        except Exception as e:
+            # Unknown whether the form was submitted: do not try again
+            result = {"status": "error", "message": f"Booking attempt failed: {type(e).__name__}"}
+        finally:
+            lease.release()
+        return result
+
+    async def drain(self) -> None:
+        """Wait for running bookings (tests, shutdown)."""
+        while self._tasks:
+            await asyncio.gather(*list(self._tasks), return_exceptions=True)
+
+
+_waitlist: Waitlist | None = None
+
+
+def get_waitlist() -> Waitlist:
+    global _waitlist
+    if _waitlist is None:
+        _waitlist = Waitlist(get_slot_index())
+    return _waitlist
@@ -0,0 +1,127 @@
+"""Adaptive WebDriver waits: each wait point's timeout follows its observed latency.
+
+Every wait in the portal flows is a named wait point ("tfa_input",
+"reservation_iframe", ...). Successful waits record how long they took; the
+timeout of a point is a high percentile of its recent durations times a
+headroom factor, clamped to [ADAPTIVE_TIMEOUT_FLOOR, ceiling]. The ceiling is
+ADAPTIVE_TIMEOUT_CEILING (default REQUEST_TIMEOUT), or what the caller passes.
+A point with too few samples waits up to the ceiling, as before.
+
+A wait that times out is recorded at its timeout, so a portal that has become
+slower (but still answers) pushes the percentile, and with it the timeout, up
+towards the ceiling instead of failing every time.
+"""
+from __future__ import annotations
+
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Optional
+
+from selenium.common.exceptions import TimeoutException
+from selenium.webdriver.support.ui import WebDriverWait
+
+from app.core.config import get_settings
+from app.infrastructure.metrics import PORTAL_WAIT_DURATION, PORTAL_WAIT_TIMEOUTS
+
+# Samples a point needs before its timeout is derived from them
+MIN_SAMPLES = 20
+
+
+class LatencyTracker:
+    def __init__(
+        self,
+        window: int = 200,
+        percentile: float = 0.99,
+        multiplier: float = 3.0,
+        floor: float = 5.0,
+        ceiling: float = 60.0,
+        min_samples: int = MIN_SAMPLES,
+    ):
+        self.window = window
+        self.percentile = percentile
+        self.multiplier = multiplier
+        self.floor = floor
+        self.ceiling = ceiling
+        self.min_samples = min_samples
+        self._lock = threading.Lock()
+        self._samples: Dict[str, Deque[float]] = {}
+        # Derived timeout per point (before clamping), refreshed on record
+        self._derived: Dict[str, float] = {}
+
+    def record(self, point: str, seconds: float) -> None:
+        with self._lock:
+            samples = self._samples.get(point)
+            if samples is None:
+                samples = self._samples[point] = deque(maxlen=self.window)
+            samples.append(seconds)
+            if len(samples) >= self.min_samples:
+                ordered = sorted(samples)
+                rank = min(len(ordered) - 1, int(self.percentile * len(ordered)))
+                self._derived[point] = ordered[rank] * self.multiplier
+            else:
+                self._derived.pop(point, None)
+
+    def timeout(self, point: str, ceiling: Optional[float] = None) -> float:
+        """Seconds to wait at `point`; never above `ceiling` (default: the configured ceiling)."""
+        ceiling = self.ceiling if ceiling is None else ceiling
+        derived = self._derived.get(point)
+        if derived is None:
+            return ceiling
+        return min(ceiling, max(self.floor, derived))
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """Per point: sample count and current (unclamped-by-caller) timeout, for debugging."""
+        with self._lock:
+            points = {p: len(s) for p, s in self._samples.items()}
+        return {p: {"samples": n, "timeout_s": round(self.timeout(p), 2)} for p, n in sorted(points.items())}
+
+
+_cache: Optional[tuple] = None
+
+
+def get_latency_tracker() -> LatencyTracker:
+    """The process-wide tracker (rebuilt, i.e. relearned, when settings change)."""
+    global _cache
+    s = get_settings()
+    if _cache is None or _cache[0] is not s:
+        tracker = LatencyTracker(
+            window=s.adaptive_timeout_window,
+            percentile=s.adaptive_timeout_percentile,
+            multiplier=s.adaptive_timeout_multiplier,
+            floor=s.adaptive_timeout_floor,
+            ceiling=s.adaptive_timeout_ceiling or float(s.request_timeout),
+        )
+        _cache = (s, tracker)
+    return _cache[1]
+
+
+def wait_timeout(point: str, ceiling: Optional[float] = None) -> float:
+    """Timeout for `point`: adaptive, or just the ceiling when ADAPTIVE_TIMEOUTS_ENABLED is off."""
+    s = get_settings()
+    if not s.adaptive_timeouts_enabled:
+        return ceiling if ceiling is not None else float(s.request_timeout)
+    return get_latency_tracker().timeout(point, ceiling)
+
+
+def observe_wait(point: str, seconds: float, timed_out: bool = False) -> None:
+    """Record one wait at `point` (for waits not done through `wait_until`)."""
+    if timed_out:
+        PORTAL_WAIT_TIMEOUTS.inc(point=point)
+    else:
+        PORTAL_WAIT_DURATION.observe(seconds, point=point)
+    if get_settings().adaptive_timeouts_enabled:
+        get_latency_tracker().record(point, seconds)
+
+
+def wait_until(driver, point: str, condition: Callable[[Any], Any], ceiling: Optional[float] = None) -> Any:
+    """`WebDriverWait(driver, <adaptive timeout>).until(condition)`, recording the wait under `point`."""
+    timeout = wait_timeout(point, ceiling)
+    started = time.monotonic()
+    try:
+        result = WebDriverWait(driver, timeout).until(condition)
+    except TimeoutException:
+        observe_wait(point, timeout, timed_out=True)
+        raise
+    observe_wait(point, time.monotonic() - started)
+    return result
@@ -0,0 +1,275 @@
+"""Slot watches: notify clients when a matching free slot opens.
+
+A watch is a set of criteria (doctor, date range, time-of-day window, minimum
+duration) plus a delivery channel: a webhook URL, or an inbox drained by the
+long-poll endpoint. Watches are matched against the slots each scrape opens.
+The matcher never scans every watch: watches with a bounded date range are
+indexed by (doctor, date), open-ended ones by doctor and sorted by start date,
+so a new slot only meets the watches that can contain its date. Watches whose
+`date_to` has passed, and index days before today, are dropped by a sweep on
+the first use of the registry each day.
+"""
+from __future__ import annotations
+
+import asyncio
+import threading
+import time
+import uuid
+from bisect import bisect_right, insort
+from collections import deque
+from dataclasses import dataclass, field, replace
+from datetime import date, timedelta
+from typing import Any, Deque, Dict, List, Optional, Set, Tuple
+
+from app.infrastructure.webhooks import get_webhook_dispatcher
+from app.smartmedical.scrape_timetable import Slot, _to_minutes
+from app.smartmedical.slot_index import SlotIndex, _doctor_key, get_slot_index
+
+# Undelivered long-poll events kept per watch (oldest dropped first)
+INBOX_SIZE = 1000
+
+
+@dataclass(slots=True, eq=False)
+class Watch:
+    id: str
+    owner: str
+    doctor: Optional[str] = None
+    date_from: Optional[str] = None
+    date_to: Optional[str] = None
+    after_time: Optional[str] = None
+    before_time: Optional[str] = None
+    min_duration: int = 0
+    callback_url: Optional[str] = None
+    created_at: float = field(default_factory=time.time)
+    inbox: Deque[Dict[str, Any]] = field(default_factory=lambda: deque(maxlen=INBOX_SIZE))
+    waiters: List[Tuple[asyncio.AbstractEventLoop, asyncio.Event]] = field(default_factory=list)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "doctor": self.doctor,
+            "date_from": self.date_from,
+            "date_to": self.date_to,
+            "after_time": self.after_time,
+            "before_time": self.before_time,
+            "min_duration": self.min_duration,
+            "callback_url": self.callback_url,
+            "created_at": self.created_at,
+        }
+
+    def clip(self, slot: Slot) -> Optional[Slot]:
+        return clip_slot(slot, self.after_time, self.before_time, self.min_duration)
+
+
+def clip_slot(slot: Slot, after_time: Optional[str], before_time: Optional[str], min_duration: int = 0) -> Optional[Slot]:
+    """The part of `slot` inside [after_time, before_time], if at least `min_duration` minutes long.
+
+    A bound that does not parse matches nothing (this runs inside SlotIndex listeners).
+    """
+    start, end = slot.start, slot.end
+    if after_time:
+        after = _to_minutes(after_time)
+        if after is None:
+            return None
+        start = max(start, after)
+    if before_time:
+        before = _to_minutes(before_time)
+        if before is None:
+            return None
+        end = min(end, before)
+    if end - start < max(min_duration, 1):
+        return None
+    return slot if (start, end) == (slot.start, slot.end) else replace(slot, start=start, end=end)
+
+
+def _dates(date_from: str, date_to: str) -> List[str]:
+    d, last = date.fromisoformat(date_from), date.fromisoformat(date_to)
+    out = []
+    while d <= last:
+        out.append(d.isoformat())
+        d += timedelta(days=1)
+    return out
+
+
+class WatchRegistry:
+    """Watches of all tenants, their match index and long-poll inboxes."""
+
+    def __init__(self, index: Optional[SlotIndex] = None):
+        self._lock = threading.Lock()
+        self._by_id: Dict[str, Watch] = {}
+        # doctor key ("" = any doctor) -> date -> watches covering that date
+        self._dated: Dict[str, Dict[str, List[Watch]]] = {}
+        # doctor key -> watches without an end date, sorted by (date_from, id)
+        self._open: Dict[str, List[Tuple[str, str]]] = {}
+        # Day of the last sweep of expired watches (see _expire)
+        self._swept_on: Optional[str] = None
+        if index is not None:
+            index.add_listener(self.on_change)
+
+    # ----- Registration -----
+
+    def add(self, owner: str, **criteria: Any) -> Watch:
+        watch = Watch(id=uuid.uuid4().hex, owner=owner, **criteria)
+        key = _doctor_key(watch.doctor)
+        with self._lock:
+            self._by_id[watch.id] = watch
+            if watch.date_to:
+                by_date = self._dated.setdefault(key, {})
+                start = max(watch.date_from or "", date.today().isoformat())
+                for d in _dates(start, watch.date_to):
+                    by_date.setdefault(d, []).append(watch)
+            else:
+                insort(self._open.setdefault(key, []), (watch.date_from or "", watch.id))
+        return watch
+
+    def remove(self, watch_id: str, owner: str) -> bool:
+        with self._lock:
+            watch = self._by_id.get(watch_id)
+            if watch is None or watch.owner != owner:
+                return False
+            del self._by_id[watch_id]
+            key = _doctor_key(watch.doctor)
+            if watch.date_to:
+                by_date = self._dated.get(key, {})
+                for d, watches in list(by_date.items()):
+                    if watch in watches:
+                        watches.remove(watch)
+                        if not watches:
+                            del by_date[d]
+            else:
+                self._open[key].remove((watch.date_from or "", watch.id))
+            waiters = list(watch.waiters)
+        # Wake long-polls so they notice the watch is gone
+        for loop, event in waiters:
+            loop.call_soon_threadsafe(event.set)
+        return True
+
+    def get(self, watch_id: str, owner: str) -> Optional[Watch]:
+        with self._lock:
+            self._expire()
+            watch = self._by_id.get(watch_id)
+        return watch if watch is not None and watch.owner == owner else None
+
+    def for_owner(self, owner: str) -> List[Watch]:
+        with self._lock:
+            self._expire()
+            return sorted((w for w in self._by_id.values() if w.owner == owner), key=lambda w: w.created_at)
+
+    def count(self, owner: Optional[str] = None) -> int:
+        with self._lock:
+            self._expire()
+            if owner is None:
+                return len(self._by_id)
+            return sum(1 for w in self._by_id.values() if w.owner == owner)
+
+    def callback_urls(self, owner: str) -> Set[str]:
+        """Distinct callback URLs of an owner's watches."""
+        with self._lock:
+            self._expire()
+            return {w.callback_url for w in self._by_id.values() if w.owner == owner and w.callback_url}
+
+    def _expire(self) -> None:
+        """Drop watches whose `date_to` has passed and index days before today. Caller holds the lock.
+
+        Runs once per day: the first call after midnight sweeps, the rest return at once.
+        """
+        today = date.today().isoformat()
+        if today == self._swept_on:
+            return
+        self._swept_on = today
+        for key, by_date in list(self._dated.items()):
+            for d in [d for d in by_date if d < today]:
+                del by_date[d]
+            if not by_date:
+                del self._dated[key]
+        for watch in [w for w in self._by_id.values() if w.date_to and w.date_to < today]:
+            del self._by_id[watch.id]
+            # Wake long-polls so they notice the watch is gone
+            for loop, event in watch.waiters:
+                try:
+                    loop.call_soon_threadsafe(event.set)
+                except RuntimeError:
+                    pass
+
+    # ----- Matching -----
+
+    def _candidates(self, key: str, day: str) -> List[Watch]:
+        out = list(self._dated.get(key, {}).get(day, ()))
+        open_ = self._open.get(key)
+        if open_:
+            hi = bisect_right(open_, (day, "\uffff"))
+            out.extend(self._by_id[wid] for _, wid in open_[:hi])
+        return out
+
+    def match(self, slots: List[Slot]) -> List[Tuple[Watch, Slot]]:
+        """(watch, clipped slot) for every watch each slot satisfies."""
+        out: List[Tuple[Watch, Slot]] = []
+        with self._lock:
+            self._expire()
+            if not self._by_id:
+                return out
+            for slot in slots:
+                key = _doctor_key(slot.doctor)
+                candidates = self._candidates(key, slot.date)
+                if key:
+                    candidates.extend(self._candidates("", slot.date))
+                for watch in candidates:
+                    clipped = watch.clip(slot)
+                    if clipped is not None:
+                        out.append((watch, clipped))
+        return out
+
+    # ----- Delivery -----
+
+    def on_change(self, opened: List[Slot], taken: List[Slot], version: int) -> None:
+        """SlotIndex listener: deliver newly opened slots to matching watches."""
+        matches = self.match(opened)
+        if not matches:
+            return
+        wake: List[Tuple[asyncio.AbstractEventLoop, asyncio.Event]] = []
+        for watch, slot in matches:
+            event = {"watch_id": watch.id, "version": version, "slot": slot.to_dict()}
+            if watch.callback_url:
+                get_webhook_dispatcher().enqueue(watch.callback_url, event)
+            else:
+                with self._lock:
+                    watch.inbox.append(event)
+                    wake.extend(watch.waiters)
+        for loop, ev in wake:
+            try:
+                loop.call_soon_threadsafe(ev.set)
+            except RuntimeError:
+                pass  # Loop closed; the poll is gone
+
+    def drain(self, watch: Watch) -> List[Dict[str, Any]]:
+        with self._lock:
+            events = list(watch.inbox)
+            watch.inbox.clear()
+        return events
+
+    async def poll(self, watch: Watch, timeout: float) -> List[Dict[str, Any]]:
+        """Events queued for `watch`, waiting up to `timeout` seconds for the first."""
+        events = self.drain(watch)
+        if events or timeout <= 0:
+            return events
+        waiter = (asyncio.get_running_loop(), asyncio.Event())
+        with self._lock:
+            watch.waiters.append(waiter)
+        try:
+            await asyncio.wait_for(waiter[1].wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            with self._lock:
+                watch.waiters.remove(waiter)
+        return self.drain(watch)
+
+
+_registry: WatchRegistry | None = None
+
+
+def get_watch_registry() -> WatchRegistry:
+    global _registry
+    if _registry is None:
+        _registry = WatchRegistry(get_slot_index())
+    return _registry
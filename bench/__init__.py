@@ -0,0 +1 @@
+"""Offline performance tooling (benchmarks, calendar fixtures)."""
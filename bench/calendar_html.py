@@ -0,0 +1,209 @@
+"""Generate SmartMedical-like calendar week HTML.
+
+The markup mirrors what `app.smartmedical.selectors` targets on the portal's
+calendar page: a `#calendar` container, one `td` per day whose id carries the
+ISO date, `WorkTimeNotEditable` divs titled "08:00 - 08:20 Doctor Name",
+`Reservation` divs titled "PATIENT [17] 08:00- 08:20 Tips: Doctor Name" (no
+"Tips:" for reservations without a doctor) and the `MoveCalendar('week', ±1)`
+arrows.
+
+Regenerate the committed fixtures with:
+
+    python -m bench.calendar_html --out bench/fixtures
+"""
+from __future__ import annotations
+
+import argparse
+import html
+import random
+from dataclasses import dataclass
+from datetime import date, timedelta
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+DOCTORS = [
+    "Sandra Milta",
+    "Jānis Bērziņš",
+    "Ilze Kalniņa",
+    "Andris Ozols",
+    "Līga Liepiņa",
+    "Māris Krūmiņš",
+    "Dace Vītola",
+    "Edgars Zariņš",
+    "Inese Sproģe",
+    "Kārlis Eglītis",
+]
+
+PATIENTS = [
+    "PĒTERIS OLIŅŠ",
+    "ANNA BĒRZIŅA",
+    "RŪDOLFS KALNIŅŠ",
+    "MĀRA OZOLA",
+    "GUNTIS LAPIŅŠ",
+    "ZANE JANSONE",
+    "AIVARS PUMPURS",
+    "LAURA ĀBOLIŅA",
+]
+
+
+@dataclass(frozen=True)
+class WorkBlock:
+    date: str
+    start: int
+    end: int
+    doctor: str
+
+
+@dataclass(frozen=True)
+class ReservationBlock:
+    date: str
+    start: int
+    end: int
+    doctor: Optional[str]
+    patient: str
+    reservation_id: int
+
+
+def hhmm(minutes: int) -> str:
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+
+def week_start_for(day: date) -> date:
+    return day - timedelta(days=day.weekday())
+
+
+def generate_week(
+    week_start: date,
+    doctors: Sequence[str],
+    *,
+    slot_minutes: int = 20,
+    day_start: int = 8 * 60,
+    day_end: int = 18 * 60,
+    occupancy: float = 0.4,
+    unknown_ratio: float = 0.1,
+    days: int = 5,
+    seed: int = 0,
+) -> Tuple[List[WorkBlock], List[ReservationBlock]]:
+    """Generate work-time blocks and reservations for one week.
+
+    Each doctor works one contiguous shift per day split into `slot_minutes`
+    blocks. Roughly `occupancy` of the blocks are reserved (some spanning two
+    blocks); `unknown_ratio` of reservations carry no doctor.
+    """
+    rng = random.Random(seed)
+    work: List[WorkBlock] = []
+    reservations: List[ReservationBlock] = []
+    next_res_id = 1000 + seed * 100000
+
+    for offset in range(days):
+        d = (week_start + timedelta(days=offset)).isoformat()
+        for doctor in doctors:
+            span = day_end - day_start
+            shift_len = rng.choice([4, 6, 8]) * 60
+            shift_len = min(shift_len, span)
+            shift_start = day_start + rng.randrange(0, span - shift_len + 1, slot_minutes)
+            t = shift_start
+            while t + slot_minutes <= shift_start + shift_len:
+                work.append(WorkBlock(d, t, t + slot_minutes, doctor))
+                t += slot_minutes
+
+            t = shift_start
+            while t + slot_minutes <= shift_start + shift_len:
+                if rng.random() < occupancy:
+                    length = slot_minutes * (2 if rng.random() < 0.2 else 1)
+                    end = min(t + length, shift_start + shift_len)
+                    res_doctor = None if rng.random() < unknown_ratio else doctor
+                    reservations.append(
+                        ReservationBlock(d, t, end, res_doctor, rng.choice(PATIENTS), next_res_id)
+                    )
+                    next_res_id += 1
+                    t = end
+                else:
+                    t += slot_minutes
+    return work, reservations
+
+
+def render_week(
+    week_start: date,
+    work: Sequence[WorkBlock],
+    reservations: Sequence[ReservationBlock],
+    *,
+    days: int = 5,
+    slot_onclick: bool = False,
+) -> str:
+    """Render a calendar week page. With `slot_onclick`, work-time divs call
+    `OpenReservation(date, time)` like the live portal does on click.
+    """
+    by_day: Dict[str, List[str]] = {}
+    for i, w in enumerate(work):
+        title = html.escape(f"{hhmm(w.start)} - {hhmm(w.end)} {w.doctor}")
+        onclick = f' onclick="OpenReservation(\'{w.date}\', \'{hhmm(w.start)}\')"' if slot_onclick else ""
+        by_day.setdefault(w.date, []).append(
+            f'<div class="WorkTimeNotEditable" id="wt_{w.date}_{i}" title="{title}"'
+            f' style="top:{w.start - 8 * 60}px"{onclick}></div>'
+        )
+    for r in reservations:
+        tips = f" Tips: {r.doctor}" if r.doctor else ""
+        title = html.escape(f"{r.patient} [17] {hhmm(r.start)}- {hhmm(r.end)}{tips}")
+        by_day.setdefault(r.date, []).append(
+            f'<div class="Reservation" id="res_{r.reservation_id}" title="{title}"'
+            f' style="top:{r.start - 8 * 60}px"><span>{html.escape(r.patient)}</span></div>'
+        )
+
+    cells = []
+    for offset in range(days):
+        d = (week_start + timedelta(days=offset)).isoformat()
+        body = "\n".join(by_day.get(d, []))
+        cells.append(
+            f'<td id="day_{d}" class="CalendarDay"><div class="DayHeader">{d}</div>'
+            f'<div class="DayBody">\n{body}\n</div></td>'
+        )
+
+    return (
+        "<!DOCTYPE html>\n<html><head><meta charset=\"utf-8\"><title>Calendar</title></head><body>\n"
+        '<div id="calendar">\n'
+        '<img src="/img/btt-left.gif" onclick="MoveCalendar(\'week\', -1)">\n'
+        '<img src="/img/btt-right.gif" onclick="MoveCalendar(\'week\', 1)">\n'
+        f'<table class="CalendarWeek"><tr>\n{chr(10).join(cells)}\n</tr></table>\n'
+        "</div>\n</body></html>\n"
+    )
+
+
+# name -> (doctor count, occupancy, unknown-doctor ratio, seed)
+FIXTURES = {
+    "week_quiet": (2, 0.15, 0.0, 1),
+    "week_typical": (4, 0.4, 0.05, 2),
+    "week_busy": (10, 0.7, 0.1, 3),
+    "week_unknown_doctors": (6, 0.5, 0.6, 4),
+}
+
+FIXTURE_WEEK_START = date(2025, 10, 6)
+
+
+def write_fixtures(out_dir: Path) -> List[Path]:
+    out_dir.mkdir(parents=True, exist_ok=True)
+    written = []
+    for name, (n_doctors, occupancy, unknown_ratio, seed) in FIXTURES.items():
+        work, res = generate_week(
+            FIXTURE_WEEK_START,
+            DOCTORS[:n_doctors],
+            occupancy=occupancy,
+            unknown_ratio=unknown_ratio,
+            seed=seed,
+        )
+        path = out_dir / f"{name}.html"
+        path.write_text(render_week(FIXTURE_WEEK_START, work, res), encoding="utf-8")
+        written.append(path)
+    return written
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--out", type=Path, default=Path(__file__).parent / "fixtures")
+    args = parser.parse_args()
+    for path in write_fixtures(args.out):
+        print(path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""Extract scraper inputs from recorded calendar HTML without a browser.
+
+Produces the same (title, date) pairs `_read_week_elements` reads through
+WebDriver: the date comes from the element id, else from the closest ancestor
+(up to 10 levels) whose id contains an ISO date.
+"""
+from __future__ import annotations
+
+import re
+from html.parser import HTMLParser
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+_DATE_RE = re.compile(r"(\d{4}-\d{2}-\d{2})")
+_VOID = {"area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "source", "track", "wbr"}
+
+Pair = Tuple[str, Optional[str]]
+
+
+class _CalendarParser(HTMLParser):
+    def __init__(self) -> None:
+        super().__init__(convert_charrefs=True)
+        self._stack: List[str] = []  # element ids, innermost last
+        self.work: List[Pair] = []
+        self.reservations: List[Pair] = []
+
+    def _closest_date(self, own_id: str) -> Optional[str]:
+        for elem_id in [own_id, *reversed(self._stack[-9:])]:
+            m = _DATE_RE.search(elem_id)
+            if m:
+                return m.group(1)
+        return None
+
+    def handle_starttag(self, tag, attrs):
+        a = dict(attrs)
+        elem_id = a.get("id") or ""
+        if tag == "div":
+            cls = a.get("class")
+            if cls == "WorkTimeNotEditable":
+                self.work.append((a.get("title") or "", self._closest_date(elem_id)))
+            elif cls == "Reservation":
+                self.reservations.append((a.get("title") or "", self._closest_date(elem_id)))
+        if tag not in _VOID:
+            self._stack.append(elem_id)
+
+    def handle_endtag(self, tag):
+        if tag not in _VOID and self._stack:
+            self._stack.pop()
+
+
+def parse_calendar_html(markup: str) -> Tuple[List[Pair], List[Pair]]:
+    """Return (work, reservations) (title, date) pairs for a calendar page."""
+    parser = _CalendarParser()
+    parser.feed(markup)
+    parser.close()
+    return parser.work, parser.reservations
+
+
+def load_fixture(path: Path) -> Tuple[List[Pair], List[Pair]]:
+    return parse_calendar_html(path.read_text(encoding="utf-8"))
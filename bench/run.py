@@ -0,0 +1,172 @@
+"""Benchmark the pure parts of `app.smartmedical.scrape_timetable` offline.
+
+Runs each benchmark against the recorded calendar-week fixtures, reports
+ops/sec and peak bytes allocated per op, and compares both against
+`bench/baseline.json`. Exits non-zero when a benchmark regresses past the
+tolerance, so it can gate changes to the scraper hot path.
+
+    python -m bench.run                     # compare against the baseline
+    python -m bench.run --update-baseline   # record a new baseline
+    python -m bench.run --filter pipeline   # run a subset
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+import time
+import tracemalloc
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+from app.smartmedical.scrape_timetable import (
+    _compute_week,
+    _infer_interval,
+    _merge_intervals,
+    _parse_time_range_and_doctor_from_res,
+    _parse_time_range_and_doctor_from_work,
+    _subtract_intervals,
+    _to_minutes,
+)
+from bench.fixture_parser import load_fixture
+
+BENCH_DIR = Path(__file__).parent
+FIXTURES_DIR = BENCH_DIR / "fixtures"
+BASELINE_PATH = BENCH_DIR / "baseline.json"
+
+
+@dataclass
+class Result:
+    name: str
+    ops_per_sec: float
+    alloc_peak_bytes: int
+
+
+def _measure(name: str, fn: Callable[[], object], min_time: float, repeat: int) -> Result:
+    # Warm up, then keep the best of `repeat` rounds (least disturbed by noise)
+    fn()
+    best = 0.0
+    for _ in range(repeat):
+        calls = 0
+        batch = 1
+        start = time.perf_counter()
+        elapsed = 0.0
+        while elapsed < min_time:
+            for _ in range(batch):
+                fn()
+            calls += batch
+            batch *= 2
+            elapsed = time.perf_counter() - start
+        best = max(best, calls / elapsed)
+
+    # Allocation peak of a single op, measured separately so tracing does not skew timing
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    base, _ = tracemalloc.get_traced_memory()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return Result(name, best, max(0, peak - base))
+
+
+def _interval_inputs(work, reservations) -> List[Tuple[List[Tuple[int, int]], List[Tuple[int, int]]]]:
+    """Group parsed intervals per (date, doctor) the way _compute_week does."""
+    pots: Dict[Tuple[Optional[str], Optional[str]], List[Tuple[int, int]]] = {}
+    occ: Dict[Tuple[Optional[str], Optional[str]], List[Tuple[int, int]]] = {}
+    for title, d in work:
+        s, e, doc = _parse_time_range_and_doctor_from_work(title)
+        pots.setdefault((d, doc or None), []).append((_to_minutes(s), _to_minutes(e)))
+    for title, d in reservations:
+        s, e, doc = _parse_time_range_and_doctor_from_res(title)
+        occ.setdefault((d, doc), []).append((_to_minutes(s), _to_minutes(e)))
+    return [(p, occ.get(k, [])) for k, p in pots.items()]
+
+
+def build_benchmarks() -> Dict[str, Callable[[], object]]:
+    benches: Dict[str, Callable[[], object]] = {}
+    for path in sorted(FIXTURES_DIR.glob("*.html")):
+        fixture = path.stem
+        work, reservations = load_fixture(path)
+        work_titles = [t for t, _ in work]
+        res_titles = [t for t, _ in reservations]
+        times = [
+            t
+            for title in work_titles
+            for t in (_parse_time_range_and_doctor_from_work(title)[:2])
+            if t
+        ]
+        groups = _interval_inputs(work, reservations)
+        merged = [(_merge_intervals(p), _merge_intervals(o)) for p, o in groups]
+
+        benches[f"{fixture}/parse_work"] = lambda titles=work_titles: [
+            _parse_time_range_and_doctor_from_work(t) for t in titles
+        ]
+        benches[f"{fixture}/parse_res"] = lambda titles=res_titles: [
+            _parse_time_range_and_doctor_from_res(t) for t in titles
+        ]
+        benches[f"{fixture}/to_minutes"] = lambda ts=times: [_to_minutes(t) for t in ts]
+        benches[f"{fixture}/merge_intervals"] = lambda gs=groups: [
+            (_merge_intervals(p), _merge_intervals(o)) for p, o in gs
+        ]
+        benches[f"{fixture}/subtract_intervals"] = lambda ms=merged: [_subtract_intervals(p, o) for p, o in ms]
+        benches[f"{fixture}/infer_interval"] = lambda gs=groups: [_infer_interval(p, o) for p, o in gs]
+        benches[f"{fixture}/pipeline"] = lambda w=work, r=reservations: _compute_week(w, r)
+    return benches
+
+
+def compare(results: List[Result], baseline: Dict[str, Dict[str, float]], tolerance: float) -> List[str]:
+    """Return a description of every result that regressed beyond `tolerance`."""
+    regressions = []
+    for r in results:
+        base = baseline.get(r.name)
+        if not base:
+            continue
+        if r.ops_per_sec < base["ops_per_sec"] * (1 - tolerance):
+            regressions.append(f"{r.name}: ops/sec {r.ops_per_sec:,.0f} < baseline {base['ops_per_sec']:,.0f}")
+        if r.alloc_peak_bytes > base["alloc_peak_bytes"] * (1 + tolerance) + 1024:
+            regressions.append(
+                f"{r.name}: alloc peak {r.alloc_peak_bytes:,} B > baseline {int(base['alloc_peak_bytes']):,} B"
+            )
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Offline calendar-parsing benchmarks")
+    parser.add_argument("--filter", default="", help="only run benchmarks whose name contains this")
+    parser.add_argument("--min-time", type=float, default=0.1, help="seconds per timing round")
+    parser.add_argument("--repeat", type=int, default=5, help="timing rounds; the best one is reported")
+    parser.add_argument("--tolerance", type=float, default=0.3, help="allowed relative regression")
+    parser.add_argument("--baseline", type=Path, default=BASELINE_PATH)
+    parser.add_argument("--update-baseline", action="store_true")
+    args = parser.parse_args(argv)
+
+    benches = {k: v for k, v in build_benchmarks().items() if args.filter in k}
+    baseline: Dict[str, Dict[str, float]] = {}
+    if args.baseline.exists():
+        baseline = json.loads(args.baseline.read_text(encoding="utf-8"))
+
+    results = []
+    print(f"{'benchmark':<40} {'ops/sec':>14} {'alloc peak':>12} {'vs baseline':>12}")
+    for name, fn in benches.items():
+        r = _measure(name, fn, args.min_time, args.repeat)
+        results.append(r)
+        base = baseline.get(name)
+        delta = f"{(r.ops_per_sec / base['ops_per_sec'] - 1) * 100:+.1f}%" if base else "n/a"
+        print(f"{name:<40} {r.ops_per_sec:>14,.0f} {r.alloc_peak_bytes:>10,} B {delta:>12}")
+
+    if args.update_baseline:
+        baseline.update({r.name: {"ops_per_sec": round(r.ops_per_sec, 1), "alloc_peak_bytes": r.alloc_peak_bytes} for r in results})
+        args.baseline.write_text(json.dumps(baseline, indent=2, sort_keys=True) + "\n", encoding="utf-8")
+        print(f"Baseline written to {args.baseline}")
+        return 0
+
+    regressions = compare(results, baseline, args.tolerance)
+    for line in regressions:
+        print(f"REGRESSION {line}", file=sys.stderr)
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,316 @@
+"""Local SmartMedical portal simulator for end-to-end latency and load testing.
+
+Serves the DOM that `app.smartmedical.selectors` targets, so the real
+login -> TFA -> frames -> calendar -> reservation iframe flow can run against
+it with headless Chrome:
+
+- `/` login form (`username`, `MainContent_password`, `sendpost`)
+- TFA form (`tfa_code`, `continueTfa`) verified against a TOTP secret
+- post-login page with the hidden `sm-31` menu link and the `_center` iframe
+- `main.php` frameset with `_menu_frame` / `_content_frame`
+- calendar list rows (`item-77-0`, ...) opening a calendar week with
+  `WorkTimeNotEditable` / `Reservation` divs and `MoveCalendar('week', ±1)`
+- `/MAIN/f_reservations/` reservation iframe whose `save` persists the booking
+
+Run it and point the service at it:
+
+    python -m bench.simulator --port 8090 --latency-ms 150 --doctors 6
+    SMARTMEDICAL_BASE_URL=http://localhost:8090/ SMARTMEDICAL_USERNAME=sim \\
+    SMARTMEDICAL_PASSWORD=sim SMARTMEDICAL_OTP_SECRET=JBSWY3DPEHPK3PXP uvicorn app.main:app
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import hmac
+import html
+import random
+import secrets
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import date, timedelta
+from typing import Dict, List, Optional, Set
+from urllib.parse import parse_qs, quote
+
+from fastapi import FastAPI, Request
+from fastapi.responses import HTMLResponse, RedirectResponse, Response
+
+from app.smartmedical.otp import generate_otp
+from bench.calendar_html import (
+    DOCTORS,
+    ReservationBlock,
+    generate_week,
+    hhmm,
+    render_week,
+    week_start_for,
+)
+
+SESSION_COOKIE = "sm_session"
+
+
+@dataclass
+class SimulatorConfig:
+    username: str = "sim"
+    password: str = "sim"
+    otp_secret: str = "JBSWY3DPEHPK3PXP"
+    # Per-request latency: latency_ms +/- jitter_ms
+    latency_ms: int = 0
+    jitter_ms: int = 0
+    # Calendar density
+    doctors: int = 4
+    occupancy: float = 0.4
+    unknown_ratio: float = 0.05
+    slot_minutes: int = 20
+    # Calendar rows shown in the content frame: row id suffix -> label
+    calendars: Dict[str, str] = field(default_factory=lambda: {"item-77-0": "Nr_10"})
+    seed: int = 0
+
+
+class PortalState:
+    """Sessions and reservations saved through the simulator."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.pending_tfa: Set[str] = set()
+        self.sessions: Set[str] = set()
+        self.saved: Dict[str, List[ReservationBlock]] = {}
+        self._next_id = 900000
+
+    def save_reservation(self, calendar: str, d: str, start: int, end: int, doctor: Optional[str], patient: str) -> int:
+        with self._lock:
+            self._next_id += 1
+            self.saved.setdefault(calendar, []).append(
+                ReservationBlock(d, start, end, doctor, patient, self._next_id)
+            )
+            return self._next_id
+
+
+def _page(title: str, body: str, head: str = "") -> str:
+    return (
+        f"<!DOCTYPE html>\n<html><head><meta charset=\"utf-8\"><title>{html.escape(title)}</title>"
+        f"{head}</head><body>\n{body}\n</body></html>\n"
+    )
+
+
+def _minutes(t: str) -> int:
+    h, m = t.split(":", 1)
+    return int(h) * 60 + int(m)
+
+
+def create_simulator(config: Optional[SimulatorConfig] = None) -> FastAPI:
+    cfg = config or SimulatorConfig()
+    state = PortalState()
+    rng = random.Random(cfg.seed)
+    app = FastAPI(title="SmartMedical portal simulator", docs_url=None, redoc_url=None)
+    app.state.config = cfg
+    app.state.portal = state
+
+    @app.middleware("http")
+    async def simulated_latency(request: Request, call_next):
+        if cfg.latency_ms or cfg.jitter_ms:
+            delay = max(0, cfg.latency_ms + rng.randint(-cfg.jitter_ms, cfg.jitter_ms))
+            await asyncio.sleep(delay / 1000.0)
+        return await call_next(request)
+
+    def _authenticated(request: Request) -> bool:
+        return request.cookies.get(SESSION_COOKIE) in state.sessions
+
+    async def _form(request: Request) -> Dict[str, str]:
+        raw = parse_qs((await request.body()).decode("utf-8"), keep_blank_values=True)
+        return {k: v[-1] for k, v in raw.items()}
+
+    def _week_blocks(calendar: str, week: int):
+        start = week_start_for(date.today()) + timedelta(weeks=week)
+        # Stable per (calendar, week) so repeated scrapes see the same calendar
+        seed = cfg.seed * 10007 + week * 101 + sum(map(ord, calendar))
+        n_doctors = max(1, min(cfg.doctors, len(DOCTORS)))
+        work, res = generate_week(
+            start,
+            DOCTORS[:n_doctors],
+            slot_minutes=cfg.slot_minutes,
+            occupancy=cfg.occupancy,
+            unknown_ratio=cfg.unknown_ratio,
+            seed=seed,
+        )
+        end = (start + timedelta(days=7)).isoformat()
+        res = res + [r for r in state.saved.get(calendar, []) if start.isoformat() <= r.date < end]
+        return start, work, res
+
+    @app.get("/", response_class=HTMLResponse)
+    async def login_page(error: str = ""):
+        msg = f'<p class="error">{html.escape(error)}</p>' if error else ""
+        return _page("Login", f"""{msg}
+<form method="post" action="/login">
+  <input type="text" id="username" name="username">
+  <input type="password" id="MainContent_password" name="password">
+  <input type="submit" name="sendpost" value="Ienākt">
+</form>""")
+
+    @app.post("/login")
+    async def login_submit(request: Request):
+        form = await _form(request)
+        ok = hmac.compare_digest(form.get("username", ""), cfg.username) and hmac.compare_digest(
+            form.get("password", ""), cfg.password
+        )
+        if not ok:
+            return RedirectResponse("/?error=invalid", status_code=303)
+        token = secrets.token_hex(16)
+        state.pending_tfa.add(token)
+        resp = HTMLResponse(_page("TFA", """
+<form method="post" action="/tfa">
+  <input type="text" id="tfa_code" name="tfa_code" autocomplete="one-time-code">
+  <input type="submit" id="continueTfa" value="Turpināt">
+</form>"""))
+        resp.set_cookie(SESSION_COOKIE, token, httponly=True)
+        return resp
+
+    @app.post("/tfa")
+    async def tfa_submit(request: Request):
+        token = request.cookies.get(SESSION_COOKIE, "")
+        code = (await _form(request)).get("tfa_code", "")
+        now = int(time.time())
+        # Accept the current and previous TOTP step, like most portals
+        valid = any(hmac.compare_digest(code, generate_otp(cfg.otp_secret, now - drift)) for drift in (0, 30))
+        if token not in state.pending_tfa or not valid:
+            return RedirectResponse("/?error=tfa", status_code=303)
+        state.pending_tfa.discard(token)
+        state.sessions.add(token)
+        return RedirectResponse("/main", status_code=303)
+
+    @app.get("/main", response_class=HTMLResponse)
+    async def main_page(request: Request):
+        if not _authenticated(request):
+            return RedirectResponse("/", status_code=303)
+        return _page("SmartMedical", """
+<table><tr><td id="header-container">SmartMedical
+  <a id="sm-31" href="/main.php" target="_center" style="display:none">Pieraksts</a>
+  <a id="logout" href="/logout">Iziet</a>
+</td></tr></table>
+<iframe name="_center" src="about:blank" style="width:100%;height:900px;border:0"></iframe>""")
+
+    @app.get("/logout")
+    async def logout(request: Request):
+        state.sessions.discard(request.cookies.get(SESSION_COOKIE, ""))
+        return RedirectResponse("/", status_code=303)
+
+    @app.get("/main.php", response_class=HTMLResponse)
+    async def main_frameset(request: Request):
+        if not _authenticated(request):
+            return RedirectResponse("/", status_code=303)
+        return HTMLResponse("""<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>main</title></head>
+<frameset cols="220,*">
+  <frame name="_menu_frame" src="/_menu_frame.php">
+  <frame name="_content_frame" src="/content.php">
+</frameset></html>
+""")
+
+    @app.get("/_menu_frame.php", response_class=HTMLResponse)
+    async def menu_frame():
+        return _page("menu", "<ul><li>Pieraksts</li></ul>")
+
+    @app.get("/content.php", response_class=HTMLResponse)
+    async def content_frame(request: Request):
+        if not _authenticated(request):
+            return RedirectResponse("/", status_code=303)
+        rows = "\n".join(
+            f'<tr id="{html.escape(row_id)}" onclick="location.href=\'/calendar?cal={quote(row_id)}&week=0\'">'
+            f"<td>{html.escape(label)}</td></tr>"
+            for row_id, label in cfg.calendars.items()
+        )
+        return _page("content", f'<table class="list">\n{rows}\n</table>')
+
+    @app.get("/calendar", response_class=HTMLResponse)
+    async def calendar(request: Request, cal: str = "item-77-0", week: int = 0):
+        if not _authenticated(request):
+            return RedirectResponse("/", status_code=303)
+        start, work, res = _week_blocks(cal, week)
+        markup = render_week(start, work, res, slot_onclick=True)
+        script = f"""<script>
+function MoveCalendar(unit, n) {{
+  location.href = '/calendar?cal={quote(cal)}&week=' + ({week} + n);
+}}
+function OpenReservation(d, t) {{
+  var doc = window.top.document;
+  var old = doc.getElementById('reservation_popup');
+  if (old) old.parentNode.removeChild(old);
+  var f = doc.createElement('iframe');
+  f.id = 'reservation_popup';
+  f.src = '/MAIN/f_reservations/?cal={quote(cal)}&date=' + d + '&time=' + t;
+  f.style.width = '600px'; f.style.height = '400px';
+  doc.body.appendChild(f);
+}}
+</script>"""
+        return HTMLResponse(markup.replace("</head>", script + "</head>", 1))
+
+    @app.get("/MAIN/f_reservations/", response_class=HTMLResponse)
+    async def reservation_form(request: Request, cal: str, date: str, time: str):
+        if not _authenticated(request):
+            return RedirectResponse("/", status_code=303)
+        e = html.escape
+        return _page("Reservation", f"""
+<form method="post" action="/MAIN/f_reservations/save">
+  <input type="hidden" name="cal" value="{e(cal)}">
+  <input type="hidden" name="date" value="{e(date)}">
+  <input type="text" id="time_from" name="time_from" value="{e(time)}">
+  <input type="text" id="pacient[name]" name="name">
+  <input type="text" id="pacient[surname]" name="surname">
+  <input type="text" id="pacient[phone]" name="phone">
+  <textarea id="notes" name="notes"></textarea>
+  <input type="submit" id="save" value="Saglabāt">
+</form>""")
+
+    @app.post("/MAIN/f_reservations/save")
+    async def reservation_save(request: Request):
+        if not _authenticated(request):
+            return Response(status_code=403)
+        form = await _form(request)
+        start = _minutes(form["time_from"])
+        patient = f"{form.get('name', '')} {form.get('surname', '')}".strip().upper() or "PACIENTS"
+        # Attribute the booking to the doctor whose work time covers it
+        cal = form.get("cal", "item-77-0")
+        day = date.fromisoformat(form["date"])
+        week = (week_start_for(day) - week_start_for(date.today())).days // 7
+        _, work, _ = _week_blocks(cal, week)
+        doctor = next((w.doctor for w in work if w.date == form["date"] and w.start <= start < w.end), None)
+        res_id = state.save_reservation(cal, form["date"], start, start + cfg.slot_minutes, doctor, patient)
+        return HTMLResponse(_page("Saved", f'<p id="saved" data-reservation-id="{res_id}">'
+                                           f"Saglabāts {hhmm(start)}</p>"))
+
+    return app
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="SmartMedical portal simulator")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--username", default="sim")
+    parser.add_argument("--password", default="sim")
+    parser.add_argument("--otp-secret", default="JBSWY3DPEHPK3PXP")
+    parser.add_argument("--latency-ms", type=int, default=0)
+    parser.add_argument("--jitter-ms", type=int, default=0)
+    parser.add_argument("--doctors", type=int, default=4)
+    parser.add_argument("--occupancy", type=float, default=0.4)
+    parser.add_argument("--unknown-ratio", type=float, default=0.05)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    import uvicorn
+
+    cfg = SimulatorConfig(
+        username=args.username,
+        password=args.password,
+        otp_secret=args.otp_secret,
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        doctors=args.doctors,
+        occupancy=args.occupancy,
+        unknown_ratio=args.unknown_ratio,
+        seed=args.seed,
+    )
+    uvicorn.run(create_simulator(cfg), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,74 @@
 import os
 import sys
 
+import pytest
+from fastapi.testclient import TestClient
+
 # Ensure repository root is on sys.path so 'app' package can be imported in tests
 ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
 if ROOT_DIR not in sys.path:
     sys.path.insert(0, ROOT_DIR)
+
+
+def _reset_settings_state():
+    """Drop singletons built from settings, so the next use sees the current environment."""
+    import app.core.config as cfg
+    import app.infrastructure.rate_limit as rl
+    import app.smartmedical.session_pool as sp
+    import app.smartmedical.snapshot_store as snapshot_store
+    from app.smartmedical.circuit_breaker import reset_breakers
+
+    cfg.get_settings.cache_clear()
+    rl._limiter = None
+    sp._pool = None
+    snapshot_store._store = None
+    reset_breakers()
+
+
+def _reset_app_state():
+    """Fresh slot index (dropping its listeners), watches, waitlist, stream, locks and quotas."""
+    import app.infrastructure.portal_jobs as portal_jobs
+    import app.smartmedical.booking_locks as booking_locks
+    import app.smartmedical.slot_index as slot_index
+    import app.smartmedical.slot_stream as slot_stream
+    import app.smartmedical.waitlist as waitlist
+    import app.smartmedical.watches as watches
+
+    slot_index._index = None
+    slot_stream._stream = None
+    watches._registry = None
+    waitlist._waitlist = None
+    booking_locks._locks = booking_locks.BookingLocks()
+    portal_jobs._quota = portal_jobs.TenantQuota()
+    _reset_settings_state()
+
+
+@pytest.fixture
+def make_client(monkeypatch):
+    """
+    Build a test client on fresh application state.
+
+    Defaults: API_KEY=test-key sent with every request, rate limits high enough
+    not to interfere, no portal credentials. `env` is applied on top (None
+    removes a variable); `api_key=None` sends no key. The slot index, watches,
+    waitlist, booking locks, session pool and circuit breakers are reset before
+    and after the test.
+    """
+    _reset_app_state()
+
+    def make(env=None, api_key="test-key", credentials=False):
+        values = {"API_KEY": "test-key", "RATE_LIMIT_PER_MIN": "600", "RATE_LIMIT_BURST": "600"}
+        values["SMARTMEDICAL_USERNAME"] = "user" if credentials else None
+        values["SMARTMEDICAL_PASSWORD"] = "pass" if credentials else None
+        values.update(env or {})
+        for name, value in values.items():
+            if value is None:
+                monkeypatch.delenv(name, raising=False)
+            else:
+                monkeypatch.setenv(name, value)
+        _reset_settings_state()
+        from app.main import app
+        return TestClient(app, headers={"X-API-Key": api_key} if api_key else None)
+
+    yield make
+    _reset_app_state()
@@ -0,0 +1,73 @@
+import pytest
+
+from app.core.schemas import BookingRequest
+from app.smartmedical import create_booking
+from app.smartmedical.booking_locks import BookingLocks, SlotBusy, get_booking_locks
+from app.smartmedical.circuit_breaker import _Call
+
+BOOKING = {"date": "2030-01-07", "time": "10:00", "first_name": "Anna", "last_name": "Ozola", "phone": "+37100000000"}
+
+
+def test_overlapping_bookings_conflict_until_released():
+    locks = BookingLocks()
+    lease = locks.acquire("nr10", "2030-01-07", 10 * 60, 10 * 60 + 20)
+    with pytest.raises(SlotBusy):
+        locks.acquire("nr10", "2030-01-07", 10 * 60 + 10, 10 * 60 + 30)
+    # Adjacent slot, other date, other calendar
+    locks.acquire("nr10", "2030-01-07", 10 * 60 + 20, 10 * 60 + 40).release()
+    locks.acquire("nr10", "2030-01-08", 10 * 60, 10 * 60 + 20).release()
+    locks.acquire("other", "2030-01-07", 10 * 60, 10 * 60 + 20).release()
+
+    # A job still running in its worker thread keeps the lease past the request
+    def job():
+        lease.release()  # the request gave up (timeout) while the job runs
+        return locks.held("nr10", "2030-01-07")
+
+    assert lease.guard(job)() == [(10 * 60, 10 * 60 + 20)]
+    assert locks.held("nr10", "2030-01-07") == []
+    other = locks.acquire("nr10", "2030-01-07", 10 * 60 + 10, 10 * 60 + 30)
+
+    # A job dequeued after its request released the lease does not run
+    ran = []
+    assert lease.guard(lambda: ran.append(True))()["status"] == "unavailable"
+    assert ran == []
+    other.release()
+
+
+@pytest.fixture
+def client(make_client):
+    return make_client(credentials=True)
+
+
+def test_book_rejects_slot_already_being_booked(client, monkeypatch):
+    import app.api.routes.booking as booking
+    calls = []
+    monkeypatch.setattr(booking, "sm_create_booking", lambda **kw: calls.append(kw) or {"status": "ok", "confirmed": True})
+
+    lease = get_booking_locks().acquire("nr10", "2030-01-07", 9 * 60 + 50, 10 * 60 + 10)
+    try:
+        r = client.post("/book", json=BOOKING)
+        assert r.status_code == 409
+        assert calls == []
+    finally:
+        lease.release()
+
+    r = client.post("/book", json=BOOKING)
+    assert r.status_code == 200 and r.json()["confirmed"] is True
+    assert len(calls) == 1
+    assert get_booking_locks().held("nr10", "2030-01-07") == []
+
+
+def test_booking_time_is_validated_and_zero_padded():
+    assert BookingRequest(**{**BOOKING, "time": "9:00"}).time == "09:00"
+    for bad in ("25:00", "9:60", "0900"):
+        with pytest.raises(ValueError):
+            BookingRequest(**{**BOOKING, "time": bad})
+
+
+def test_missing_timeslot_is_not_a_portal_failure(monkeypatch):
+    monkeypatch.setattr(create_booking, "_find_clickable_timeslot_for", lambda driver, date, time: None)
+    call = _Call()
+    error = create_booking._submit_reservation(object(), call, "2030-01-07", "10:00", "Anna", "Ozola", "+37100000000", None)
+    assert error["status"] == "error"
+    assert call.ok
@@ -0,0 +1,66 @@
+import json
+import os
+import stat
+import sys
+import types
+
+import pytest
+
+from app.infrastructure import chromedriver
+
+
+class _Settings:
+    def __init__(self, cache_path, chromedriver_path=None):
+        self.chromedriver_path = chromedriver_path
+        self.chromedriver_cache_path = str(cache_path)
+
+
+def _fake_binary(path):
+    path.write_text("#!/bin/sh\n")
+    path.chmod(path.stat().st_mode | stat.S_IXUSR)
+    return str(path)
+
+
+def _fake_manager(monkeypatch, install):
+    module = types.ModuleType("webdriver_manager.chrome")
+    module.ChromeDriverManager = lambda: types.SimpleNamespace(install=install)
+    monkeypatch.setitem(sys.modules, "webdriver_manager.chrome", module)
+
+
+def test_resolved_path_is_cached_for_offline_restarts(tmp_path, monkeypatch):
+    binary = _fake_binary(tmp_path / "chromedriver")
+    cache = tmp_path / "cache" / "chromedriver.json"
+    _fake_manager(monkeypatch, lambda: binary)
+    assert chromedriver.resolve_chromedriver(_Settings(cache)) == binary
+    assert json.loads(cache.read_text()) == {"path": binary}
+
+    # Offline: webdriver-manager fails, the cached path is used
+    def offline():
+        raise ConnectionError("no network")
+
+    _fake_manager(monkeypatch, offline)
+    assert chromedriver.resolve_chromedriver(_Settings(cache)) == binary
+
+
+def test_stale_cache_falls_back_to_download(tmp_path, monkeypatch):
+    binary = _fake_binary(tmp_path / "chromedriver")
+    cache = tmp_path / "chromedriver.json"
+    cache.write_text(json.dumps({"path": str(tmp_path / "gone")}))
+    _fake_manager(monkeypatch, lambda: binary)
+    assert chromedriver.resolve_chromedriver(_Settings(cache)) == binary
+
+
+def test_driver_follows_chrome_upgrades(tmp_path, monkeypatch):
+    old = _fake_binary(tmp_path / "chromedriver-old")
+    new = _fake_binary(tmp_path / "chromedriver-new")
+    cache = tmp_path / "chromedriver.json"
+    cache.write_text(json.dumps({"path": old}))
+    # Chrome was upgraded: webdriver-manager resolves a newer driver than the cached one
+    _fake_manager(monkeypatch, lambda: new)
+    assert chromedriver.resolve_chromedriver(_Settings(cache)) == new
+    assert json.loads(cache.read_text()) == {"path": new}
+
+
+def test_explicit_path_must_be_executable(tmp_path):
+    with pytest.raises(RuntimeError):
+        chromedriver.resolve_chromedriver(_Settings(tmp_path / "c.json", os.fspath(tmp_path / "missing")))
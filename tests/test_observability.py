@@ -0,0 +1,183 @@
+import asyncio
+
+import pytest
+
+from app.infrastructure.timing import phase, start_timer
+from app.smartmedical.scrape_timetable import Slot
+from app.smartmedical.slot_index import get_slot_index
+
+
+@pytest.fixture
+def client(make_client):
+    """
+    A test client with portal credentials and an empty slot index.
+    """
+    return make_client(credentials=True)
+
+
+def _fake_fetch_timetable():
+    with phase("login"):
+        pass
+    with phase("scrape_week_0"):
+        pass
+    return {"doctor": None, "date": None, "slots": [Slot("2030-01-07", 540, 600, "Sandra Milta")], "source": "smartmedical"}
+
+
+def test_phase_timer_follows_context_into_threads():
+    async def run():
+        timer = start_timer()
+
+        def work():
+            with phase("in_thread"):
+                pass
+
+        await asyncio.to_thread(work)
+        return timer
+
+    timer = asyncio.run(run())
+    assert list(timer.as_dict()) == ["in_thread"]
+
+
+def test_server_timing_header_lists_portal_phases(client, monkeypatch):
+    import app.api.routes.timetable as timetable_routes
+    monkeypatch.setattr(timetable_routes, "fetch_timetable", _fake_fetch_timetable)
+
+    r = client.get("/timetable")
+    assert r.status_code == 200
+    header = r.headers["server-timing"]
+    assert header.startswith("login;dur=")
+    assert "scrape_week_0;dur=" in header and "total;dur=" in header
+
+    # Served from the index: no portal phases, no header
+    assert "server-timing" not in client.get("/timetable").headers
+
+
+def test_metrics_endpoint_exposes_request_and_limiter_series(client):
+    get_slot_index().replace(_fake_fetch_timetable()["slots"])
+    client.get("/timetable/next-available", params={"min_duration": 5})
+    client.get("/timetable", headers={"X-API-Key": "wrong"})
+
+    assert client.get("/metrics", headers={"X-API-Key": "wrong"}).status_code == 401
+    r = client.get("/metrics")
+    assert r.status_code == 200
+    assert r.headers["content-type"].startswith("text/plain; version=0.0.4")
+    text = r.text
+    assert "# TYPE smartmedical_http_request_duration_seconds histogram" in text
+    assert 'route="/timetable/next-available",method="GET",status="200"' in text
+    assert 'route="/timetable",method="GET",status="401"' in text
+    assert 'smartmedical_rate_limit_decisions_total{decision="accept"}' in text
+    assert "smartmedical_portal_jobs_queued 0" in text
+
+
+def test_metrics_accepts_scrape_token(client, monkeypatch):
+    import app.core.config as cfg
+    monkeypatch.setenv("METRICS_TOKEN", "scrape-token")
+    cfg.get_settings.cache_clear()
+    assert client.get("/metrics", headers={"X-API-Key": "", "Authorization": "Bearer scrape-token"}).status_code == 200
+    assert client.get("/metrics", headers={"X-API-Key": "", "Authorization": "Bearer nope"}).status_code == 401
+
+
+class _FakeDriver:
+    def execute(self, driver_command, params=None):
+        return {"value": []}
+
+    def find_elements(self, by, value):
+        return self.execute("findElements", {"using": by, "value": value})["value"]
+
+
+def _profiled_fetch_timetable():
+    from app.infrastructure.webdriver_profiler import instrument_driver
+    from app.smartmedical.scrape_timetable import _read_week_elements
+
+    _read_week_elements(instrument_driver(_FakeDriver()))
+    return _fake_fetch_timetable()
+
+
+def test_webdriver_profile_by_command_and_call_site(client, monkeypatch):
+    import app.api.routes.timetable as timetable_routes
+    monkeypatch.setenv("WEBDRIVER_PROFILE", "true")
+    import app.core.config as cfg
+    cfg.get_settings.cache_clear()
+    monkeypatch.setattr(timetable_routes, "fetch_timetable", _profiled_fetch_timetable)
+
+    r = client.get("/timetable", headers={"X-Request-ID": "req-123"})
+    assert r.headers["x-request-id"] == "req-123"
+    assert r.headers["x-webdriver-profile"].startswith("commands=2;")
+
+    profile = client.get("/debug/profile/req-123").json()
+    assert profile["by_command"]["findElements"]["count"] == 2
+    sites = profile["by_call_site"]
+    assert len(sites) == 2  # one per find_elements line
+    assert all(site.startswith("scrape_timetable._read_week_elements:") for site in sites)
+    assert client.get("/debug/profile/unknown").status_code == 404
+    # Stored under the caller: another tenant asking for the same request id gets nothing
+    from app.infrastructure.webdriver_profiler import get_profile
+    assert get_profile("req-123", "other-tenant") is None
+
+
+def test_trace_spans_are_exported_with_thread_parentage(client, monkeypatch, tmp_path):
+    import json
+
+    import app.api.routes.timetable as timetable_routes
+    from app.core.config import get_settings
+    from app.infrastructure import tracing
+
+    path = tmp_path / "traces.jsonl"
+    monkeypatch.setenv("TRACING_ENABLED", "true")
+    monkeypatch.setenv("TRACE_EXPORT_PATH", str(path))
+    get_settings.cache_clear()
+    tracing.configure_tracing(get_settings())
+    monkeypatch.setattr(timetable_routes, "fetch_timetable", _fake_fetch_timetable)
+    trace_id = "4bf92f3577b34da6a3ce929d0e0e4736"
+    try:
+        r = client.get("/timetable", headers={"X-Trace-Id": trace_id})
+    finally:
+        tracing.shutdown_tracing()
+
+    assert r.status_code == 200
+    assert r.headers["X-Trace-Id"] == trace_id
+    spans = {s["name"]: s for s in map(json.loads, path.read_text().splitlines())}
+    assert {s["trace_id"] for s in spans.values()} == {trace_id}
+    root = spans["GET /timetable"]
+    assert root["parent_id"] is None
+    assert spans["auth"]["parent_id"] == root["span_id"]
+    assert spans["executor.queue"]["parent_id"] == root["span_id"]
+    job = spans["portal_job _fake_fetch_timetable"]
+    assert spans["login"]["parent_id"] == job["span_id"]
+
+
+def test_json_logs_carry_extra_fields_redacted_and_sample_debug(monkeypatch, capsys):
+    import json
+    import logging
+
+    import app.core.config as cfg
+    from app.infrastructure import logging_config
+
+    monkeypatch.setenv("LOG_JSON", "true")
+    monkeypatch.setenv("LOG_LEVEL", "DEBUG")
+    monkeypatch.setenv("LOG_DEBUG_SAMPLE_RATE", "0")
+    cfg.get_settings.cache_clear()
+    logging_config.configure_logging()
+    log = logging.getLogger("test.logging")
+    try:
+        log.info("Booking requested", extra={"route": "/book", "phone": "+37120000000", "payload": {"first_name": "Anna", "date": "2030-01-07"}, "attempt": 2})
+        log.debug("Noisy detail")
+        try:
+            raise ValueError("boom")
+        except ValueError:
+            log.exception("Booking failed", extra={"last_name": "Ozola"})
+    finally:
+        logging_config.shutdown_logging()
+        for h in list(logging.getLogger().handlers):
+            logging.getLogger().removeHandler(h)
+        cfg.get_settings.cache_clear()
+
+    lines = [json.loads(line) for line in capsys.readouterr().out.splitlines() if line.startswith("{")]
+    assert [r["message"] for r in lines] == ["Booking requested", "Booking failed"]
+    first, failed = lines
+    assert first["route"] == "/book" and first["attempt"] == 2
+    assert first["phone"] == "***"
+    assert first["payload"] == {"first_name": "***", "date": "2030-01-07"}
+    assert "trace_id" not in first
+    assert failed["last_name"] == "***"
+    assert "ValueError: boom" in failed["exc_info"]
@@ -0,0 +1,111 @@
+import multiprocessing
+import sqlite3
+
+import pytest
+
+from app.infrastructure.rate_limit import InMemoryRateLimiter, RateLimiterUnavailable, SqliteRateLimiter
+
+
+def _take_all(path: str, attempts: int, results) -> None:
+    limiter = SqliteRateLimiter(path, capacity=10, per_minute=1, busy_timeout=5.0)
+    results.put(sum(limiter.allow("client") for _ in range(attempts)))
+
+
+def test_in_memory_limiter_enforces_burst():
+    limiter = InMemoryRateLimiter(capacity=3, per_minute=1)
+    assert [limiter.allow("a") for _ in range(4)] == [True, True, True, False]
+    assert limiter.allow("b")
+
+
+def test_sqlite_limiter_shares_buckets_between_instances(tmp_path):
+    path = str(tmp_path / "rl.sqlite3")
+    first = SqliteRateLimiter(path, capacity=2, per_minute=1)
+    second = SqliteRateLimiter(path, capacity=2, per_minute=1)
+    assert first.allow("k")
+    assert second.allow("k")
+    assert not first.allow("k")
+    assert second.allow("other", cost=2)
+
+
+def test_sqlite_limiter_upgrades_old_bucket_table(tmp_path):
+    path = str(tmp_path / "rl.sqlite3")
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE buckets (key TEXT PRIMARY KEY, tokens REAL NOT NULL, last_refill REAL NOT NULL)")
+    conn.execute("INSERT INTO buckets VALUES ('old', 0.0, 1e12)")
+    conn.commit()
+    conn.close()
+    limiter = SqliteRateLimiter(path, capacity=2, per_minute=1)
+    assert not limiter.allow("old")
+    assert limiter.allow("new")
+
+
+def test_sqlite_limiter_fails_closed_when_locked_unless_fail_open(tmp_path):
+    path = str(tmp_path / "rl.sqlite3")
+    limiter = SqliteRateLimiter(path, capacity=1, per_minute=1, busy_timeout=0.01)
+    lenient = SqliteRateLimiter(path, capacity=1, per_minute=1, busy_timeout=0.01, fail_open=True)
+    assert limiter.allow("k")
+    other = sqlite3.connect(path, isolation_level=None)
+    other.execute("BEGIN IMMEDIATE")
+    try:
+        with pytest.raises(RateLimiterUnavailable):
+            limiter.allow("k")
+        # Empty bucket, but the lock is held elsewhere: let through when configured to
+        assert lenient.allow("k")
+    finally:
+        other.execute("ROLLBACK")
+    assert not limiter.allow("k")
+
+
+def test_locked_shared_limiter_answers_503(make_client, tmp_path):
+    path = str(tmp_path / "rl.sqlite3")
+    client = make_client({"RATE_LIMIT_BACKEND": "sqlite", "RATE_LIMIT_DB_PATH": path, "RATE_LIMIT_DB_BUSY_TIMEOUT": "0.01"})
+    assert client.get("/watches").status_code == 200
+    other = sqlite3.connect(path, isolation_level=None)
+    other.execute("BEGIN IMMEDIATE")
+    try:
+        r = client.get("/watches")
+    finally:
+        other.execute("ROLLBACK")
+    assert r.status_code == 503
+    assert r.headers["Retry-After"] == "1"
+
+
+def test_sqlite_limiter_is_atomic_across_processes(tmp_path):
+    path = str(tmp_path / "rl.sqlite3")
+    SqliteRateLimiter(path, capacity=10, per_minute=1)
+    ctx = multiprocessing.get_context("spawn")
+    results = ctx.Queue()
+    procs = [ctx.Process(target=_take_all, args=(path, 10, results)) for _ in range(4)]
+    for p in procs:
+        p.start()
+    total = sum(results.get(timeout=30) for _ in procs)
+    for p in procs:
+        p.join(timeout=30)
+    assert total == 10
+
+
+def test_decision_headers_and_retry_after():
+    limiter = InMemoryRateLimiter(capacity=10, per_minute=60)
+    assert limiter.acquire("a", cost=8).allowed
+    decision = limiter.acquire("a", cost=5)
+    assert not decision.allowed
+    headers = decision.headers()
+    assert headers["X-RateLimit-Limit"] == "10"
+    assert headers["X-RateLimit-Remaining"] == "2"
+    assert headers["Retry-After"] == "3"
+    assert headers["X-RateLimit-Reset"] == "8"
+
+
+def test_idle_full_buckets_are_evicted(monkeypatch):
+    import app.infrastructure.rate_limit as rl
+
+    now = [1000.0]
+    monkeypatch.setattr(rl.time, "monotonic", lambda: now[0])
+    limiter = InMemoryRateLimiter(capacity=2, per_minute=60)
+    for key in ("a", "b", "c"):
+        limiter.acquire(key)
+    assert len(limiter) == 3
+    # Long enough for every bucket to refill; the next call sweeps them
+    now[0] += 5
+    limiter.acquire("d")
+    assert len(limiter) == 1
@@ -0,0 +1,41 @@
+from pathlib import Path
+
+from app.smartmedical.scrape_timetable import Slot, _compute_week
+from bench.fixture_parser import load_fixture, parse_calendar_html
+
+FIXTURES = Path(__file__).resolve().parents[1] / "bench" / "fixtures"
+
+
+def test_compute_week_subtracts_doctor_and_unknown_reservations():
+    work = [
+        ("09:00 - 09:20 Sandra Milta", "2030-01-07"),
+        ("09:20 - 09:40 Sandra Milta", "2030-01-07"),
+        ("09:40 - 10:00 Sandra Milta", "2030-01-07"),
+        ("09:00 - 09:20 Jānis Bērziņš", "2030-01-07"),
+    ]
+    reservations = [
+        ("PĒTERIS OLIŅŠ [17] 09:20- 09:40 Tips: Sandra Milta", "2030-01-07"),
+        # No doctor: blocks everybody that day
+        ("ANNA BĒRZIŅA [17] 09:00- 09:20", "2030-01-07"),
+    ]
+    slots, dates = _compute_week(work, reservations)
+    assert dates == ["2030-01-07"]
+    assert slots == [Slot("2030-01-07", 9 * 60 + 40, 10 * 60, "Sandra Milta", 20)]
+
+
+def test_fixture_parser_resolves_dates_from_ancestors():
+    markup = (
+        '<table><tr><td id="day_2030-01-07"><div>'
+        '<div class="Reservation" id="res_1" title="X [1] 09:00- 09:20"></div>'
+        '<img src="a.gif"></div></td></tr></table>'
+    )
+    work, reservations = parse_calendar_html(markup)
+    assert work == []
+    assert reservations == [("X [1] 09:00- 09:20", "2030-01-07")]
+
+
+def test_recorded_busy_week_pipeline():
+    work, reservations = load_fixture(FIXTURES / "week_busy.html")
+    slots, dates = _compute_week(work, reservations)
+    assert len(dates) == 5
+    assert slots and all(s.end > s.start for s in slots)
@@ -0,0 +1,144 @@
+import pytest
+
+from app.smartmedical import session_pool as sp
+
+
+class _FakeDriver:
+    def __init__(self, n):
+        self.n = n
+        self.quit = False
+
+
+@pytest.fixture
+def fake_portal(monkeypatch):
+    """Sessions without a browser: counts logins, resets and quits."""
+    calls = {"login": 0, "reset": 0, "closed": []}
+
+    def open_session(calendar):
+        calls["login"] += 1
+        session = sp.PortalSession(_FakeDriver(calls["login"]), calendar)
+        session.on_calendar = True
+        return session
+
+    def reset(session, calendar):
+        calls["reset"] += 1
+        if getattr(session.driver, "logged_out", False):
+            raise RuntimeError("menu link missing")
+        session.calendar = calendar
+        session.on_calendar = True
+
+    monkeypatch.setattr(sp, "_open_session", open_session)
+    monkeypatch.setattr(sp, "_reset_to_calendar", reset)
+    monkeypatch.setattr(sp, "close_browser", lambda d: calls["closed"].append(d.n))
+    return calls
+
+
+def test_pool_reuses_logged_in_sessions(fake_portal):
+    pool = sp.SessionPool(size=1, max_idle=300)
+    first = pool.acquire()
+    pool.release(first, reusable=True)
+    second = pool.acquire()
+    assert second is first
+    assert fake_portal == {"login": 1, "reset": 1, "closed": []}
+    # A failed flow gives its session up
+    pool.release(second, reusable=False)
+    assert fake_portal["closed"] == [1]
+    assert not pool.has_session()
+
+
+def test_logged_out_session_is_replaced(fake_portal):
+    pool = sp.SessionPool(size=1, max_idle=300)
+    session = pool.acquire()
+    pool.release(session, reusable=True)
+    session.driver.logged_out = True
+    replacement = pool.acquire()
+    assert replacement.driver.n == 2
+    assert fake_portal["closed"] == [1]
+    assert pool.in_use == 1
+
+
+def test_prewarmed_session_skips_navigation(fake_portal):
+    pool = sp.SessionPool(size=2, max_idle=300)
+    pool.prewarm()
+    assert pool.idle_count() == 2
+    pool.acquire()
+    assert fake_portal["reset"] == 0
+
+
+def test_pool_prefers_session_parked_on_wanted_calendar(fake_portal):
+    from app.smartmedical.calendars import Calendar
+
+    room1, room2 = Calendar("room1", row_id="item-77-0"), Calendar("room2", row_id="item-77-1")
+    pool = sp.SessionPool(size=2, max_idle=300)
+    a, b = pool.acquire(room1), pool.acquire(room2)
+    pool.release(a, reusable=True, on_calendar=True)
+    pool.release(b, reusable=True, on_calendar=True)
+    assert pool.acquire(room1) is a
+    assert fake_portal["reset"] == 0
+    # Only the other calendar's session is left: it is navigated over
+    assert pool.acquire(room1) is b
+    assert fake_portal["reset"] == 1 and b.calendar == room1
+
+
+@pytest.fixture
+def client(make_client):
+    return make_client(credentials=True)
+
+
+def test_readiness_reflects_driver_and_session(client, monkeypatch, fake_portal):
+    import app.api.routes.health as health
+
+    monkeypatch.setattr(health, "driver_endpoint_ready", lambda s: False)
+    r = client.get("/health/ready")
+    assert r.status_code == 503
+    assert r.json()["checks"]["driver"] is False
+    assert client.get("/health").status_code == 200
+
+    monkeypatch.setattr(health, "driver_endpoint_ready", lambda s: True)
+    sp.get_session_pool().last_login_ok = False
+    assert client.get("/health/ready").json()["checks"]["session"] is False
+    sp.get_session_pool().prewarm()
+    r = client.get("/health/ready")
+    assert r.status_code == 200
+    assert r.json()["status"] == "ready"
+
+    # No credentials configured: nothing to log in to, so the session does not gate readiness
+    monkeypatch.delenv("SMARTMEDICAL_USERNAME")
+    monkeypatch.delenv("SMARTMEDICAL_PASSWORD")
+    import app.core.config as cfg
+    cfg.get_settings.cache_clear()
+    r = client.get("/health/ready")
+    assert r.status_code == 200
+    assert r.json()["checks"]["session"] == "not_applicable"
+
+
+def test_keepalive_relogs_logged_out_and_replaces_dead_sessions(fake_portal, monkeypatch):
+    logins = []
+    monkeypatch.setattr(sp, "sm_login", lambda driver: logins.append(driver.n))
+    monkeypatch.setattr(sp, "navigate_to_calendar", lambda driver, calendar: None)
+
+    class _SwitchTo:
+        def default_content(self):
+            pass
+
+    def probe(driver):
+        # [menu link present, login form present]
+        if driver.n == 3:
+            raise RuntimeError("invalid session id")  # reaped by the Selenium node
+        return [driver.n != 2, driver.n == 2]
+
+    pool = sp.SessionPool(size=3, max_idle=300)
+    sessions = [pool.acquire() for _ in range(3)]
+    for session in sessions:
+        session.driver.execute_script = lambda js, *args, d=session.driver: probe(d)
+        session.driver.switch_to = _SwitchTo()
+        pool.release(session, reusable=True, on_calendar=True)
+
+    assert pool.keepalive(min_idle=0) == {"alive": 1, "relogin": 1, "replaced": 1}
+    assert logins == [2]
+    assert fake_portal["closed"] == [3]
+    assert sorted(s.driver.n for s in pool._idle) == [1, 2, 4]
+    assert all(s.on_calendar for s in pool._idle)
+    assert pool.in_use == 0
+    # Recently checked sessions are left alone
+    assert pool.keepalive(min_idle=60) == {}
@@ -0,0 +1,47 @@
+import re
+
+from fastapi.testclient import TestClient
+
+from app.smartmedical.otp import generate_otp
+from app.smartmedical.scrape_timetable import _compute_week
+from bench.fixture_parser import parse_calendar_html
+from bench.simulator import SimulatorConfig, create_simulator
+
+
+def _logged_in_client() -> TestClient:
+    cfg = SimulatorConfig(doctors=3)
+    client = TestClient(create_simulator(cfg))
+    r = client.post("/login", data={"username": "sim", "password": "sim"})
+    assert 'id="tfa_code"' in r.text
+    r = client.post("/tfa", data={"tfa_code": generate_otp(cfg.otp_secret)})
+    assert 'id="sm-31"' in r.text
+    return client
+
+
+def test_simulator_rejects_wrong_otp():
+    client = TestClient(create_simulator())
+    client.post("/login", data={"username": "sim", "password": "sim"})
+    r = client.post("/tfa", data={"tfa_code": "000000"}, follow_redirects=False)
+    assert r.status_code == 303 and r.headers["location"].startswith("/?error")
+
+
+def test_simulator_calendar_parses_and_saved_booking_appears():
+    client = _logged_in_client()
+    assert 'id="item-77-0"' in client.get("/content.php").text
+
+    markup = client.get("/calendar", params={"week": 1}).text
+    assert "MoveCalendar('week', 1)" in markup
+    slots, dates = _compute_week(*parse_calendar_html(markup))
+    assert len(dates) == 5 and slots
+
+    free = slots[0]
+    t = f"{free.start // 60:02d}:{free.start % 60:02d}"
+    form = client.get("/MAIN/f_reservations/", params={"cal": "item-77-0", "date": free.date, "time": t}).text
+    assert re.search(r'id="time_from"[^>]*value="%s"' % t, form)
+    r = client.post("/MAIN/f_reservations/save", data={
+        "cal": "item-77-0", "date": free.date, "time_from": t, "name": "Test", "surname": "User",
+    })
+    assert "data-reservation-id" in r.text
+
+    after, _ = _compute_week(*parse_calendar_html(client.get("/calendar", params={"week": 1}).text))
+    assert not any(s.date == free.date and s.doctor == free.doctor and s.start <= free.start < s.end for s in after)
@@ -0,0 +1,82 @@
+import asyncio
+import json
+
+from app.api.routes.stream import sse_events
+from app.smartmedical.scrape_timetable import Slot
+from app.smartmedical.slot_index import SlotIndex
+from app.smartmedical.slot_stream import SlotStream
+
+MORNING = Slot("2030-01-07", 9 * 60, 10 * 60, "Sandra Milta")
+NOON = Slot("2030-01-07", 12 * 60, 13 * 60, "Sandra Milta")
+OTHER = Slot("2030-01-07", 9 * 60, 10 * 60, "Jānis Bērziņš")
+
+
+def _parse(chunk: bytes):
+    fields = dict(line.split(": ", 1) for line in chunk.decode("utf-8").strip().splitlines() if not line.startswith(":"))
+    return fields.get("event"), json.loads(fields["data"]) if "data" in fields else None
+
+
+def test_stream_sends_snapshot_deltas_and_heartbeats():
+    async def run():
+        index = SlotIndex()
+        index.replace([MORNING, OTHER])
+        stream = SlotStream(index)
+        sub = stream.subscribe(doctor="Sandra Milta")
+        stop = asyncio.Event()
+
+        async def disconnected():
+            return stop.is_set()
+
+        events = sse_events(stream, sub, doctor="Sandra Milta", heartbeat=0.05, ttl=3600, is_disconnected=disconnected)
+        out = [_parse(await events.__anext__())]
+        # Morning slot taken, noon opened; the other doctor's change is filtered out
+        index.replace([NOON])
+        out.append(_parse(await events.__anext__()))
+        out.append(await events.__anext__())
+        stop.set()
+        await events.aclose()
+        return out, stream.subscriber_count()
+
+    (snapshot, delta, heartbeat), remaining = asyncio.run(run())
+    assert snapshot[0] == "snapshot"
+    assert [s["start"] for s in snapshot[1]["slots"]] == ["09:00"]
+    assert delta[0] == "delta"
+    assert [s["start"] for s in delta[1]["opened"]] == ["12:00"]
+    assert [s["doctor"] for s in delta[1]["taken"]] == ["Sandra Milta"]
+    assert heartbeat == b": heartbeat\n\n"
+    assert remaining == 0
+
+
+def test_slow_subscriber_is_resynced():
+    async def run():
+        index = SlotIndex()
+        stream = SlotStream(index)
+        sub = stream.subscribe(maxsize=2)
+        for i in range(5):
+            index.replace([Slot("2030-01-07", 540 + i, 600)])
+        await asyncio.sleep(0)
+        return [sub.queue.get_nowait() for _ in range(sub.queue.qsize())]
+
+    queued = asyncio.run(run())
+    # Overflow dropped the backlog in favour of a resync marker
+    assert None in queued
+    assert len(queued) <= 2
+
+
+def test_stream_connections_are_capped_per_tenant(make_client):
+    from app.infrastructure.security import get_key_registry
+    from app.smartmedical.slot_stream import Subscriber, get_slot_stream
+
+    client = make_client({"STREAM_MAX_PER_TENANT": "1"})
+    stream = get_slot_stream()
+    loop = asyncio.new_event_loop()
+    try:
+        # An open stream of this tenant, and one of another tenant that does not count
+        held = Subscriber(loop, 1, owner=get_key_registry().lookup("test-key").id)
+        stream._subscribers.update({held, Subscriber(loop, 1, owner="other")})
+        r = client.get("/timetable/stream")
+        assert r.status_code == 429
+        assert r.json()["error"] == "Too many open streams"
+        assert stream.subscriber_count() == 2
+    finally:
+        loop.close()
@@ -0,0 +1,87 @@
+import asyncio
+import hashlib
+import json
+import threading
+
+import pytest
+from fastapi import HTTPException
+
+from app.infrastructure import security
+from app.infrastructure.portal_jobs import get_tenant_quota, run_portal_job
+
+
+def _sha(key: str) -> str:
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+
+@pytest.fixture
+def client(make_client):
+    """
+    A test client with two tenants: a default one and a tightly limited one.
+    """
+    return make_client({"API_KEYS": json.dumps([
+        {"id": "clinic-a", "key_sha256": [_sha("a-old"), _sha("a-new")]},
+        {"id": "clinic-b", "key_sha256": _sha("b-key"), "rate_limit_per_min": 1, "rate_limit_burst": 2},
+    ])}, api_key=None)
+
+
+def test_registry_accepts_every_key_of_a_tenant(client):
+    registry = security.get_key_registry()
+    assert registry.lookup("a-old").id == "clinic-a"
+    assert registry.lookup("a-new").id == "clinic-a"
+    assert registry.lookup("dev-api-key") is None  # API_KEY is ignored once API_KEYS is set
+    assert client.get("/timetable", headers={"X-API-Key": "nope"}).status_code == 401
+
+
+def test_tenant_rate_limits_are_independent(client):
+    # A scrape costs more than clinic-b's whole burst, so one attempt empties its bucket
+    r = client.get("/timetable/next-available", headers={"X-API-Key": "b-key"})
+    assert r.headers["X-RateLimit-Limit"] == "2"
+    r = client.get("/timetable/next-available", headers={"X-API-Key": "b-key"})
+    assert r.status_code == 429
+    r = client.get("/timetable/next-available", headers={"X-API-Key": "a-new"})
+    assert r.headers["X-RateLimit-Limit"] == "600"
+
+
+def test_browser_concurrency_quota_rejects_extra_jobs():
+    tenant = security.Tenant(id="busy", max_browser_ops=1)
+    release = threading.Event()
+
+    async def run():
+        security._current_tenant.set(tenant)
+        first = asyncio.create_task(run_portal_job(release.wait, 5))
+        await asyncio.sleep(0.05)
+        assert get_tenant_quota().in_flight("busy") == 1
+        with pytest.raises(HTTPException) as exc:
+            await run_portal_job(lambda: None)
+        release.set()
+        await first
+        return exc.value
+
+    exc = asyncio.run(run())
+    assert exc.status_code == 429
+    assert get_tenant_quota().in_flight("busy") == 0
+
+
+def test_quota_is_held_until_a_cancelled_job_finishes():
+    tenant = security.Tenant(id="slow", max_browser_ops=1)
+    release = threading.Event()
+
+    async def run():
+        security._current_tenant.set(tenant)
+        job = asyncio.create_task(run_portal_job(release.wait, 5))
+        await asyncio.sleep(0.05)
+        job.cancel()  # the request timed out; the worker still drives the browser
+        with pytest.raises(asyncio.CancelledError):
+            await job
+        assert get_tenant_quota().in_flight("slow") == 1
+        with pytest.raises(HTTPException):
+            await run_portal_job(lambda: None)
+        release.set()
+        for _ in range(100):
+            if not get_tenant_quota().in_flight("slow"):
+                break
+            await asyncio.sleep(0.01)
+        return get_tenant_quota().in_flight("slow")
+
+    assert asyncio.run(run()) == 0
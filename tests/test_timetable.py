@@ -0,0 +1,309 @@
+import pytest
+
+from app.smartmedical.scrape_timetable import Slot
+from app.smartmedical.slot_index import SlotIndex, get_slot_index
+
+SLOTS = [
+    Slot("2030-01-07", 9 * 60, 12 * 60, "Sandra Milta", 20),
+    Slot("2030-01-07", 10 * 60, 11 * 60, "Jānis Bērziņš"),
+    Slot("2030-01-08", 14 * 60, 15 * 60, "Sandra Milta", 20),
+    Slot("2030-01-09", 8 * 60, 9 * 60),
+]
+
+
+@pytest.fixture
+def client(make_client):
+    """
+    A test client with a pre-populated slot index.
+    """
+    get_slot_index().replace(SLOTS)
+    return make_client()
+
+
+def test_index_filters_by_doctor_and_date_range():
+    index = SlotIndex()
+    index.replace(SLOTS)
+    result = index.query(doctor="sandra milta", date_from="2030-01-08", date_to="2030-01-31")
+    assert [(s.date, s.start, s.end) for s in result] == [("2030-01-08", 14 * 60, 15 * 60)]
+    assert result[0].to_dict()["interval"] == "20"
+
+
+def test_index_clips_to_time_of_day_window():
+    index = SlotIndex()
+    index.replace(SLOTS)
+    result = index.query(date_to="2030-01-07", after_time="10:30", before_time="11:30")
+    assert [(s.doctor, s.start, s.end) for s in result] == [
+        ("Jānis Bērziņš", 10 * 60 + 30, 11 * 60),
+        ("Sandra Milta", 10 * 60 + 30, 11 * 60 + 30),
+    ]
+
+
+def test_index_unknown_doctor_is_empty():
+    index = SlotIndex()
+    index.replace(SLOTS)
+    assert index.query(doctor="Nobody") == []
+
+
+def test_patch_day_replaces_one_day_and_notifies():
+    index = SlotIndex()
+    index.replace(SLOTS, age=30)
+    changes = []
+    index.add_listener(lambda opened, taken, version: changes.append((opened, taken)))
+
+    # 10:00-10:20 of Sandra Milta's morning got booked
+    patched = [Slot("2030-01-07", 9 * 60, 10 * 60, "Sandra Milta", 20), Slot("2030-01-07", 10 * 60 + 20, 12 * 60, "Sandra Milta", 20)]
+    assert index.patch_day("2030-01-07", None, patched)
+    assert [(s.doctor, s.start) for s in index.query(date_to="2030-01-07")] == [("Sandra Milta", 9 * 60), ("Sandra Milta", 10 * 60 + 20)]
+    assert [s.date for s in index.query(date_from="2030-01-08")] == ["2030-01-08", "2030-01-09"]
+    # A patch is not a fresh scrape
+    assert index.age() >= 30
+    [(opened, taken)] = changes
+    assert {s.doctor for s in taken} == {"Sandra Milta", "Jānis Bērziņš"} and len(opened) == 2
+
+    assert not SlotIndex().patch_day("2030-01-07", None, patched)
+
+
+def test_failing_listener_does_not_break_replace():
+    index = SlotIndex()
+    seen = []
+
+    def broken(opened, taken, version):
+        raise TypeError("bad watch")
+
+    index.add_listener(broken)
+    index.add_listener(lambda opened, taken, version: seen.append(version))
+    index.replace(SLOTS)
+    assert seen == [1] and len(index.query()) == len(SLOTS)
+
+
+def test_booking_confirmation_matches_reservation():
+    from app.smartmedical.create_booking import _booking_id, _match_reservation
+    reservations = [
+        ("ANNA KALNIŅA [12] 10:00- 10:20 Tips: Sandra Milta", "2030-01-07"),
+        ("TEST USER [17] 10:00- 10:20 Tips: Jānis Bērziņš", "2030-01-07"),
+    ]
+    ids = ["res_100", "res_101000"]
+    assert _booking_id(_match_reservation(reservations, ids, 10 * 60, "User")) == "101000"
+    # Someone else's reservation at the same minute does not confirm this booking
+    assert _match_reservation(reservations, ids, 10 * 60, "Other") is None
+    assert _match_reservation(reservations, ids, 11 * 60, "User") is None
+
+
+def test_timetable_served_from_fresh_index_without_scrape(client):
+    r = client.get("/timetable", params={"doctor": "Sandra Milta", "from": "2030-01-07", "to": "2030-01-07"})
+    assert r.status_code == 200
+    body = r.json()
+    assert body["doctor"] == "Sandra Milta"
+    assert [s["start"] for s in body["slots"]] == ["09:00"]
+
+
+def test_timetable_rejects_malformed_filters(client):
+    r = client.get("/timetable", params={"from": "07.01.2030"})
+    assert r.status_code == 422
+    for bad in ("25:99", "24:30", "7:75"):
+        assert client.get("/timetable", params={"after_time": bad}).status_code == 422
+    assert client.get("/timetable", params={"after_time": "9:30"}).status_code == 200
+
+
+def test_next_available_from_fresh_index(client):
+    r = client.get("/timetable/next-available", params={"doctor": "Sandra Milta", "min_duration": 90})
+    assert r.status_code == 200
+    assert r.json()["slot"]["start"] == "09:00"
+    # Nothing that long for this doctor
+    r = client.get("/timetable/next-available", params={"doctor": "Jānis Bērziņš", "min_duration": 90})
+    assert r.json()["slot"] is None
+
+
+def test_timetable_columnar_format(client):
+    r = client.get("/timetable", params={"format": "columnar", "to": "2030-01-07"})
+    assert r.status_code == 200
+    assert "charset=utf-8" in r.headers.get("content-type", "").lower()
+    cols = r.json()["columns"]
+    assert cols["doctor"] == ["Jānis Bērziņš", "Sandra Milta"]
+    assert cols["start"] == ["10:00", "09:00"]
+    assert cols["interval"] == [None, "20"]
+    # The documented shape matches what is served
+    from app.core.schemas import ColumnarTimetableResponse
+    assert ColumnarTimetableResponse.model_validate(r.json()).columns.model_dump() == cols
+
+
+def test_timetable_revalidation_is_cheap(client):
+    r = client.get("/timetable", params={"doctor": "Sandra Milta"})
+    etag = r.headers["ETag"]
+    remaining = float(r.headers["X-RateLimit-Remaining"])
+    assert r.headers["X-RateLimit-Limit"] == "600"
+
+    r = client.get("/timetable", params={"doctor": "Sandra Milta"}, headers={"If-None-Match": etag})
+    assert r.status_code == 304
+    # A 304 is charged a fraction of a cached read
+    assert float(r.headers["X-RateLimit-Remaining"]) >= remaining - 1
+    # Another filter is another representation
+    r = client.get("/timetable", params={"doctor": "Jānis Bērziņš"}, headers={"If-None-Match": etag})
+    assert r.status_code == 200
+
+
+def test_snapshot_store_round_trip_and_utilization(tmp_path):
+    from app.smartmedical.scrape_timetable import _compute_week_intervals
+    from app.smartmedical.slot_index import SlotIndex
+    from app.smartmedical.snapshot_store import SnapshotStore
+
+    store = SnapshotStore(str(tmp_path / "snap.sqlite3"))
+    work = [("09:00 - 12:00 Sandra Milta", "2030-01-07"), ("09:00 - 10:00 Sandra Milta", "2030-01-08")]
+    before = _compute_week_intervals(work, [])
+    after = _compute_week_intervals(work, [("PĒTERIS OLIŅŠ [17] 09:00- 10:30 Tips: Sandra Milta", "2030-01-07")])
+    store.record_week(before, scraped_at=1000.0)
+    store.record_week(after, scraped_at=2000.0)
+
+    slots, scraped_at = store.latest_snapshot()
+    assert scraped_at == 2000.0
+    assert [(s.date, s.start, s.end) for s in slots] == [("2030-01-07", 630, 720), ("2030-01-08", 540, 600)]
+    index = SlotIndex()
+    index.replace(slots, age=120)
+    assert not index.is_fresh(60) and index.is_fresh(3600)
+
+    now = {d["date"]: d for d in store.utilization(doctor="sandra milta")}
+    assert now["2030-01-07"]["booked_minutes"] == 90
+    assert now["2030-01-07"]["utilization"] == 0.5
+    then = store.utilization(date_to="2030-01-07", as_of=1500.0)
+    assert then[0]["booked_minutes"] == 0
+
+
+def test_stale_index_is_served_while_refreshing(client, monkeypatch):
+    import app.smartmedical.refresh as refresh
+
+    refreshed = []
+
+    async def fake_refresh():
+        refreshed.append(True)
+
+    monkeypatch.setenv("SMARTMEDICAL_USERNAME", "user")
+    monkeypatch.setenv("SMARTMEDICAL_PASSWORD", "pass")
+    monkeypatch.setenv("TIMETABLE_CACHE_TTL", "60")
+    monkeypatch.setenv("TIMETABLE_MAX_STALE", "3600")
+    from app.core.config import get_settings
+    get_settings.cache_clear()
+    monkeypatch.setattr(refresh, "refresh_timetable", fake_refresh)
+    get_slot_index().replace(SLOTS, age=600)
+
+    r = client.get("/timetable", params={"doctor": "Sandra Milta"})
+    assert r.status_code == 200
+    assert r.json()["stale"] is True
+    assert int(r.headers["Age"]) >= 600
+    assert refreshed == [True]
+
+
+def test_calendars_scraped_concurrently_into_one_snapshot(client, monkeypatch, tmp_path):
+    import threading
+
+    import app.smartmedical.scrape_timetable as st
+    from app.core.config import get_settings
+    from app.smartmedical.scrape_timetable import _compute_week_intervals
+    from app.smartmedical.snapshot_store import SnapshotStore
+
+    monkeypatch.setenv("SMARTMEDICAL_USERNAME", "user")
+    monkeypatch.setenv("SMARTMEDICAL_PASSWORD", "pass")
+    monkeypatch.setenv("CALENDARS", '{"room1": "item-77-0", "room2": {"name": "Nr_11"}}')
+    monkeypatch.setenv("CALENDAR_SCRAPE_CONCURRENCY", "2")
+    get_settings.cache_clear()
+    both_running = threading.Barrier(2, timeout=5)
+
+    def fake_fetch(calendar, settings):
+        # Fails (BrokenBarrierError) unless both calendars are scraped at the same time
+        both_running.wait()
+        return [Slot("2030-01-07", 9 * 60, 10 * 60, "Sandra Milta", None, calendar.key)]
+
+    monkeypatch.setattr(st, "_fetch_calendar", fake_fetch)
+    get_slot_index().replace(st.fetch_timetable()["slots"])
+
+    rows = client.get("/timetable", params={"calendar": "room2"}).json()["slots"]
+    assert [r["calendar"] for r in rows] == ["room2"]
+    assert len(client.get("/timetable").json()["slots"]) == 2
+    columns = client.get("/timetable", params={"format": "columnar"}).json()["columns"]
+    assert sorted(columns["calendar"]) == ["room1", "room2"]
+    assert client.get("/timetable", params={"calendar": "nope"}).status_code == 422
+
+    # The snapshot store keeps calendars apart
+    store = SnapshotStore(str(tmp_path / "snap.sqlite3"))
+    work = [("09:00 - 10:00 Sandra Milta", "2030-01-07")]
+    store.record_week(_compute_week_intervals(work, [], "room1"), scraped_at=1000.0)
+    store.record_week(_compute_week_intervals(work, [("X [1] 09:00- 10:00 Tips: Sandra Milta", "2030-01-07")], "room2"), scraped_at=1001.0)
+    slots, _ = store.latest_snapshot()
+    assert [(s.calendar, s.start) for s in slots] == [("room1", 540)]
+    assert {(d["calendar"], d["booked_minutes"]) for d in store.utilization()} == {("room1", 0), ("room2", 60)}
+
+
+def test_snapshot_store_migrates_rows_without_calendar(tmp_path):
+    import sqlite3
+
+    from app.smartmedical.snapshot_store import SnapshotStore
+
+    path = str(tmp_path / "old.sqlite3")
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE scraped_days (date TEXT NOT NULL, scraped_at REAL NOT NULL, PRIMARY KEY (date, scraped_at))")
+    conn.execute(
+        "CREATE TABLE intervals (date TEXT NOT NULL, scraped_at REAL NOT NULL, doctor TEXT NOT NULL, kind TEXT NOT NULL,"
+        " start INTEGER NOT NULL, end INTEGER NOT NULL, interval INTEGER)"
+    )
+    conn.execute("INSERT INTO scraped_days VALUES ('2030-01-07', 1000.0)")
+    conn.execute("INSERT INTO intervals VALUES ('2030-01-07', 1000.0, 'Sandra Milta', 'free', 540, 600, 20)")
+    conn.commit()
+    conn.close()
+
+    store = SnapshotStore(path, default_calendar_key="nr10")
+    slots, _ = store.latest_snapshot()
+    assert [(s.calendar, s.start) for s in slots] == [("nr10", 540)]
+    # Keyed by calendar now: another calendar scraped at the same moment is kept
+    store._conn().execute("INSERT INTO scraped_days (date, scraped_at, calendar) VALUES ('2030-01-07', 1000.0, 'room2')")
+    pk = [row[1] for row in store._conn().execute("PRAGMA table_info(scraped_days)") if row[5]]
+    assert "calendar" in pk
+
+
+def test_circuit_breaker_opens_probes_and_closes():
+    from app.smartmedical.circuit_breaker import CircuitBreaker, PortalUnavailable
+    breaker = CircuitBreaker("scrape", failure_threshold=2, reset_timeout=0.05, slow_call=1.0)
+    for _ in range(2):
+        with pytest.raises(RuntimeError), breaker.call():
+            raise RuntimeError("portal down")
+    assert breaker.state == "open" and breaker.retry_after() is not None
+    with pytest.raises(PortalUnavailable):
+        breaker.allow()
+
+    import time
+    time.sleep(0.06)
+    # Half-open: one probe at a time; a failed probe opens it again at once
+    with breaker.call() as call:
+        with pytest.raises(PortalUnavailable):
+            breaker.allow()
+        call.failed()
+    assert breaker.state == "open"
+    time.sleep(0.06)
+    with breaker.call():
+        pass
+    assert breaker.state == "closed"
+    breaker.record(True, 2.0)  # slower than slow_call counts as a failure
+    assert breaker.failures == 1
+
+
+def test_timetable_serves_old_snapshot_while_portal_circuit_is_open(client, monkeypatch):
+    import app.core.config as cfg
+    from app.smartmedical.circuit_breaker import get_breaker, reset_breakers
+    monkeypatch.setenv("SMARTMEDICAL_USERNAME", "user")
+    monkeypatch.setenv("SMARTMEDICAL_PASSWORD", "secret")
+    monkeypatch.setenv("CIRCUIT_FAILURE_THRESHOLD", "1")
+    cfg.get_settings.cache_clear()
+    reset_breakers()
+    try:
+        get_breaker("login").record(False, 0.0)
+        # Older than TIMETABLE_MAX_STALE: normally a scrape, now the snapshot marked stale
+        get_slot_index().replace(SLOTS, age=10 ** 6)
+        r = client.get("/timetable")
+        assert r.status_code == 200
+        assert r.json()["stale"] is True and len(r.json()["slots"]) == len(SLOTS)
+
+        get_slot_index().clear()
+        r = client.get("/timetable")
+        assert r.status_code == 503 and r.json()["error"] == "portal_unavailable"
+        assert int(r.headers["Retry-After"]) >= 1
+        assert client.post("/book", json={"date": "2030-01-07", "time": "10:00", "first_name": "A", "last_name": "B", "phone": "1"}).status_code == 503
+    finally:
+        reset_breakers()
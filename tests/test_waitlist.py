@@ -0,0 +1,127 @@
+import asyncio
+
+from app.infrastructure import security
+from app.infrastructure.portal_jobs import get_tenant_quota
+from app.smartmedical.scrape_timetable import Slot
+from app.smartmedical.slot_index import SlotIndex
+from app.smartmedical.waitlist import Waitlist
+
+PATIENT = {"first_name": "Anna", "last_name": "Ozola", "phone": "+37100000000"}
+
+
+def _fake_portal(outcomes):
+    """A create_booking stand-in returning the queued statuses in turn."""
+    calls = []
+
+    def book(**kwargs):
+        calls.append(kwargs)
+        return {"status": outcomes.pop(0) if outcomes else "ok"}
+
+    return book, calls
+
+
+def test_waitlist_books_by_priority_at_most_once():
+    async def run():
+        index = SlotIndex()
+        book, calls = _fake_portal(["ok"])
+        waitlist = Waitlist(index, book=book)
+        low = waitlist.add("a", **PATIENT, doctors=["Sandra Milta"])
+        high = waitlist.add("a", **PATIENT, dates=["2030-01-07"], after_time="10:00", priority=5)
+
+        # One slot both accept: the higher priority entry gets it, booked at its window start
+        index.replace([Slot("2030-01-07", 9 * 60, 11 * 60, "Sandra Milta")])
+        await asyncio.sleep(0)
+        await waitlist.drain()
+        # The same slot reappearing (e.g. the scrape raced the booking) is not booked again for `high`
+        index.replace([])
+        index.replace([Slot("2030-01-07", 9 * 60, 11 * 60, "Sandra Milta")])
+        await asyncio.sleep(0)
+        await waitlist.drain()
+        return calls, low, high
+
+    calls, low, high = asyncio.run(run())
+    assert [(c["date"], c["time"]) for c in calls] == [("2030-01-07", "10:00"), ("2030-01-07", "09:00")]
+    assert high.status == "booked" and high.attempts == 1
+    assert low.status == "booked" and low.attempts == 1
+
+
+def test_waitlist_shares_slots_between_tenants_regardless_of_priority():
+    async def run():
+        index = SlotIndex()
+        book, calls = _fake_portal([])
+        waitlist = Waitlist(index, book=book)
+        a1 = waitlist.add("a", **PATIENT, priority=100)
+        a2 = waitlist.add("a", **PATIENT, priority=1000)
+        b1 = waitlist.add("b", **PATIENT)
+        # Two slots for three entries: one each, a's own higher priority first
+        index.replace([Slot("2030-01-07", 9 * 60, 10 * 60), Slot("2030-01-07", 11 * 60, 12 * 60)])
+        await asyncio.sleep(0)
+        await waitlist.drain()
+        return a1, a2, b1
+
+    a1, a2, b1 = asyncio.run(run())
+    assert (a2.status, b1.status, a1.status) == ("booked", "booked", "waiting")
+
+
+def test_waitlist_unavailable_returns_to_waiting_and_errors_stop():
+    async def run():
+        index = SlotIndex()
+        book, calls = _fake_portal(["unavailable", "error"])
+        waitlist = Waitlist(index, book=book)
+        entry = waitlist.add("a", **PATIENT, min_duration=30)
+        index.replace([Slot("2030-01-07", 9 * 60, 9 * 60 + 20)])  # too short
+        index.replace([Slot("2030-01-07", 9 * 60, 10 * 60)])
+        await asyncio.sleep(0)
+        await waitlist.drain()
+        first = entry.status
+        index.replace([Slot("2030-01-08", 9 * 60, 10 * 60)])
+        await asyncio.sleep(0)
+        await waitlist.drain()
+        index.replace([Slot("2030-01-09", 9 * 60, 10 * 60)])
+        await asyncio.sleep(0)
+        await waitlist.drain()
+        return first, entry, calls
+
+    first, entry, calls = asyncio.run(run())
+    assert first == "waiting"
+    assert entry.status == "failed"
+    assert [c["date"] for c in calls] == ["2030-01-07", "2030-01-08"]
+
+
+def test_waitlist_request_rejects_out_of_range_times():
+    import pytest
+    from pydantic import ValidationError
+    from app.core.schemas import WaitlistRequest
+
+    for bad in ({"before_time": "7:75"}, {"after_time": "24:00"}):
+        with pytest.raises(ValidationError):
+            WaitlistRequest(**PATIENT, **bad)
+    assert WaitlistRequest(**PATIENT, after_time="7:05").after_time == "7:05"
+
+
+def test_waitlist_books_as_owner_within_its_browser_quota():
+    tenant = security.Tenant(id="clinic", max_browser_ops=1)
+    seen = []
+
+    def book(**kwargs):
+        seen.append((security.current_tenant(), get_tenant_quota().in_flight("clinic")))
+        return {"status": "ok"}
+
+    async def run():
+        index = SlotIndex()
+        waitlist = Waitlist(index, book=book)
+        security._current_tenant.set(tenant)
+        first = waitlist.add("clinic", **PATIENT, dates=["2030-01-07"])
+        second = waitlist.add("clinic", **PATIENT, dates=["2030-01-08"])
+        security._current_tenant.set(None)
+        index.replace([Slot("2030-01-07", 9 * 60, 10 * 60), Slot("2030-01-08", 9 * 60, 10 * 60)])
+        # Only one of the owner's entries is claimed while its quota allows one
+        statuses = sorted([first.status, second.status])
+        await asyncio.sleep(0)
+        await waitlist.drain()
+        return statuses, first, second
+
+    statuses, first, second = asyncio.run(run())
+    assert statuses == ["booking", "waiting"]
+    assert seen == [(tenant, 1)]
+    assert sorted([first.status, second.status]) == ["booked", "waiting"]
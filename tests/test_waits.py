@@ -0,0 +1,32 @@
+import pytest
+from selenium.common.exceptions import TimeoutException
+
+from app.smartmedical import waits
+
+
+class _FakeDriver:
+    n = 1
+
+
+def test_wait_timeouts_follow_observed_latency(monkeypatch):
+    tracker = waits.LatencyTracker(window=50, percentile=0.9, multiplier=2.0, floor=0.5, ceiling=30.0, min_samples=10)
+    assert tracker.timeout("tfa_input") == 30.0  # no history yet: the ceiling
+    for i in range(10):
+        tracker.record("tfa_input", 1.0 + i / 10)
+    assert tracker.timeout("tfa_input") == pytest.approx(3.8)
+    assert tracker.timeout("tfa_input", ceiling=2.0) == 2.0
+    for _ in range(10):
+        tracker.record("quick", 0.01)
+    assert tracker.timeout("quick") == 0.5  # the floor
+
+    # A point that keeps timing out is recorded at its timeout, so the timeout grows
+    tracker = waits.LatencyTracker(percentile=0.9, multiplier=2.0, floor=0.1, ceiling=30.0, min_samples=10)
+    monkeypatch.setattr(waits, "get_latency_tracker", lambda: tracker)
+    for _ in range(10):
+        tracker.record("stuck", 0.05)
+    assert tracker.timeout("stuck") == pytest.approx(0.1)
+    for _ in range(2):
+        with pytest.raises(TimeoutException):
+            waits.wait_until(_FakeDriver(), "stuck", lambda d: False)
+    assert tracker.timeout("stuck") == pytest.approx(0.2)
+    assert waits.wait_until(_FakeDriver(), "stuck", lambda d: d.n) == 1
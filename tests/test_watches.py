@@ -0,0 +1,184 @@
+import json
+import socket
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from app.infrastructure.webhooks import UnsafeWebhookTarget, WebhookDispatcher, post_json, sign_body
+from app.smartmedical.scrape_timetable import Slot
+from app.smartmedical.slot_index import get_slot_index
+from app.smartmedical.watches import WatchRegistry
+
+
+@pytest.fixture
+def receiver():
+    """A local webhook receiver that fails its first `fail` requests with 500."""
+    received, state = [], {"fail": 0, "headers": []}
+    got = threading.Event()
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            raw = self.rfile.read(int(self.headers["Content-Length"]))
+            body = json.loads(raw)
+            state["headers"].append((dict(self.headers), raw))
+            if state["fail"] > 0:
+                state["fail"] -= 1
+                self.send_response(500)
+            else:
+                received.append(body)
+                got.set()
+                self.send_response(204)
+            self.end_headers()
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}/hook", received, state, got
+    server.shutdown()
+
+
+def test_matcher_uses_doctor_date_window_and_duration():
+    reg = WatchRegistry()
+    morning = reg.add("a", doctor="Sandra Milta", date_from="2030-01-07", date_to="2030-01-08", before_time="12:00", min_duration=30)
+    anyone = reg.add("a", date_from="2030-01-08")
+    reg.add("b", doctor="Jānis Bērziņš", date_to="2030-01-31")
+
+    matches = reg.match([
+        Slot("2030-01-07", 11 * 60 + 45, 13 * 60, "Sandra Milta"),  # 15 min before noon: too short
+        Slot("2030-01-08", 10 * 60, 13 * 60, "sandra milta"),
+        Slot("2030-01-09", 9 * 60, 10 * 60, "Sandra Milta"),
+    ])
+    got = [(w.id, s.date, s.start, s.end) for w, s in matches]
+    assert (morning.id, "2030-01-08", 10 * 60, 12 * 60) in got
+    assert (anyone.id, "2030-01-08", 10 * 60, 13 * 60) in got
+    assert (anyone.id, "2030-01-09", 9 * 60, 10 * 60) in got
+    assert len(got) == 3
+
+    assert reg.remove(morning.id, "a")
+    assert not reg.remove(anyone.id, "b")
+    assert [w for w, _ in reg.match([Slot("2030-01-08", 10 * 60, 11 * 60, "Sandra Milta")])] == [anyone]
+
+
+def test_watches_past_their_end_date_are_dropped():
+    from datetime import date, timedelta
+
+    reg = WatchRegistry()
+    yesterday = (date.today() - timedelta(days=1)).isoformat()
+    today = date.today().isoformat()
+    current = reg.add("a", date_from="2020-01-01", date_to=today)
+    # As if registered for yesterday only, before midnight
+    expired = reg.add("a", date_from="2020-01-01", date_to=today)
+    reg._dated[""][today].remove(expired)
+    reg._dated[""][yesterday] = [expired]
+    expired.date_to = yesterday
+
+    reg._swept_on = yesterday  # the day turns over
+    assert reg.count("a") == 1
+    assert reg.get(expired.id, "a") is None
+    assert list(reg._dated[""]) == [today]
+    assert [w for w, _ in reg.match([Slot(today, 9 * 60, 10 * 60)])] == [current]
+
+
+def test_webhook_batches_and_retries(receiver):
+    url, received, state, got = receiver
+    state["fail"] = 1
+    dispatcher = WebhookDispatcher(interval=0.05, backoff=0.05, timeout=2.0, secret="s3cret", allow_private=True)
+    try:
+        dispatcher.enqueue(url, {"n": 1})
+        dispatcher.enqueue(url, {"n": 2})
+        assert got.wait(5)
+    finally:
+        dispatcher.shutdown()
+    # One batch for both events, delivered on the retry
+    assert received == [{"events": [{"n": 1}, {"n": 2}]}]
+    headers, raw = state["headers"][-1]
+    assert headers["X-Webhook-Signature"] == sign_body("s3cret", headers["X-Webhook-Timestamp"], raw)
+
+
+def test_slow_webhook_target_does_not_delay_others(receiver):
+    url, received, _, got = receiver
+    # Accepts connections but never answers: every POST to it hangs until the timeout
+    hanging = socket.socket()
+    hanging.bind(("127.0.0.1", 0))
+    hanging.listen()
+    dispatcher = WebhookDispatcher(interval=0.05, timeout=3.0, max_attempts=1, allow_private=True, workers=2)
+    try:
+        dispatcher.enqueue(f"http://127.0.0.1:{hanging.getsockname()[1]}/hook", {"n": 0})
+        dispatcher.enqueue(url, {"n": 1})
+        assert got.wait(1.5)
+    finally:
+        dispatcher.shutdown(timeout=0.1)
+        hanging.close()
+    assert received == [{"events": [{"n": 1}]}]
+
+
+def test_webhook_refuses_private_targets(receiver, monkeypatch):
+    url, received, state, _ = receiver
+    with pytest.raises(UnsafeWebhookTarget):
+        post_json(url, {"events": []}, 2.0)
+    with pytest.raises(UnsafeWebhookTarget):
+        post_json("http://169.254.169.254/latest/meta-data/", {"events": []}, 2.0)
+
+    # A public-looking name that resolves to loopback is caught at connect time
+    getaddrinfo = socket.getaddrinfo
+    monkeypatch.setattr(socket, "getaddrinfo", lambda host, *a, **kw: getaddrinfo("127.0.0.1" if host == "hooks.example.com" else host, *a, **kw))
+    with pytest.raises(UnsafeWebhookTarget):
+        post_json(url.replace("127.0.0.1", "hooks.example.com"), {"events": []}, 2.0)
+    assert state["headers"] == []
+
+
+@pytest.fixture
+def client(make_client):
+    get_slot_index().replace([])
+    return make_client()
+
+
+def test_watch_long_poll_receives_opened_slot(client):
+    r = client.post("/watches", json={"doctor": "Sandra Milta", "after_time": "09:00", "min_duration": 20})
+    assert r.status_code == 201
+    watch_id = r.json()["id"]
+    assert [w["id"] for w in client.get("/watches").json()] == [watch_id]
+
+    get_slot_index().replace([
+        Slot("2030-01-07", 8 * 60, 9 * 60 + 30, "Sandra Milta"),
+        Slot("2030-01-07", 8 * 60, 9 * 60 + 30, "Jānis Bērziņš"),
+    ])
+    events = client.get(f"/watches/{watch_id}/events", params={"timeout": 0}).json()["events"]
+    assert [(e["slot"]["start"], e["slot"]["end"]) for e in events] == [("09:00", "09:30")]
+    assert client.get(f"/watches/{watch_id}/events", params={"timeout": 0}).json()["events"] == []
+
+    assert client.delete(f"/watches/{watch_id}").status_code == 204
+    assert client.get(f"/watches/{watch_id}").status_code == 404
+
+
+def test_watch_rejects_bad_range_and_callback(client):
+    assert client.post("/watches", json={"date_from": "2030-02-01", "date_to": "2030-01-01"}).status_code == 422
+    assert client.post("/watches", json={"callback_url": "ftp://example.com"}).status_code == 422
+    assert client.post("/watches", json={"after_time": "24:30"}).status_code == 422
+
+
+def test_clip_slot_ignores_unparsable_bounds():
+    from app.smartmedical.watches import clip_slot
+    slot = Slot("2030-01-07", 9 * 60, 10 * 60)
+    assert clip_slot(slot, "24:30", None) is None
+    assert clip_slot(slot, None, "7:75") is None
+    assert clip_slot(slot, "9:30", None).start == 9 * 60 + 30
+
+
+def test_watch_rejects_private_callback_url(client):
+    r = client.post("/watches", json={"callback_url": "http://169.254.169.254/latest/meta-data/"})
+    assert r.status_code == 422
+    r = client.post("/watches", json={"callback_url": "http://localhost:8080/hook"})
+    assert r.status_code == 422
+
+
+def test_watch_callback_urls_are_capped_per_tenant(make_client):
+    client = make_client({"WATCH_MAX_CALLBACK_URLS_PER_TENANT": "2"})
+    for n in (1, 2, 2):
+        assert client.post("/watches", json={"callback_url": f"https://hooks{n}.example.com/x"}).status_code == 201
+    r = client.post("/watches", json={"callback_url": "https://hooks3.example.com/x"})
+    assert r.status_code == 409
+    assert client.post("/watches", json={}).status_code == 201